@@ -0,0 +1,172 @@
+"""
+Benchmark the loaders, the efficiency calculation, its bootstrap and CSV export.
+
+Synthetic studies are written to a temporary directory in every file format
+the loaders read, then each loader, the efficiency calculation, the
+bootstrap confidence intervals, the spindle and camera analysis and the CSV
+export are timed for every study size.
+
+Usage:
+    python benchmarks/core.py [--sizes 250 2500 250000] [--repeat N]
+                              [--output FILE] [--baseline FILE]
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import numpy as np
+
+# harness puts the repository root on sys.path, so it is imported first.
+from harness import add_report_arguments, report, time_call
+from knapp.efficiency import calculate_efficiency, calculate_efficiency_batch
+from knapp.export import write_results_csv
+from knapp.generate import (
+    SPINDLES,
+    generate_cameras,
+    generate_study,
+    run_xml,
+    write_study,
+)
+from knapp.loaders import (
+    load_fqv,
+    load_machine_file,
+    load_machine_results,
+    load_manual_inspection_data,
+)
+from knapp.stations import SampleTable, analyse_stations, parse_run_samples
+from knapp.stats import bootstrap_efficiency
+from knapp.storage import read_study_file, write_study_file
+from knapp.study import INSPECTORS, empty_results
+
+DEFAULT_SIZES = [250, 2500, 250000]
+CAMERAS = 4
+# Larger studies are only written as a single KnappRun file instead of one
+# file per run, so setting up the benchmark stays quick.
+MAX_RUN_FILES = 200
+
+
+def write_study_files(directory, size, seed=0):
+    """
+    Write a synthetic study of the given size in every supported format.
+
+    Parameters:
+        directory (str): Directory for the files.
+        size (int): Number of containers.
+        seed (int): Seed of the random results.
+
+    Returns:
+        tuple: The Study and a dictionary of the paths written.
+    """
+    study = generate_study(size, seed=seed)
+    formats = ["pkl", "xml", "csv", "kfqv"]
+    if -(-size // SPINDLES) <= MAX_RUN_FILES:
+        formats.append("runs")
+    paths = write_study(directory, study, formats, seed=seed)
+    paths["single_run"] = os.path.join(directory, "KnappRun_1_single.xml")
+    with open(paths["single_run"], "w") as fp:
+        fp.writelines(run_xml(study.machine))
+    paths["stations_run"] = os.path.join(directory, "KnappRun_1_stations.xml")
+    with open(paths["stations_run"], "w") as fp:
+        fp.writelines(
+            run_xml(
+                study.machine, cameras=generate_cameras(study.machine, CAMERAS, seed)
+            )
+        )
+    return study, paths
+
+
+def benchmark_size(size, repeat):
+    """
+    Time every benchmark on a synthetic study of one size.
+
+    Parameters:
+        size (int): Number of containers.
+        repeat (int): Number of timed runs of each benchmark.
+
+    Returns:
+        dict: Timings keyed by "benchmark/size".
+    """
+    results = {}
+    with tempfile.TemporaryDirectory() as directory:
+        study, paths = write_study_files(directory, size)
+        export_path = os.path.join(directory, "export.csv")
+        stack = np.tile(study.manual, (100, 1))
+        samples = SampleTable.from_studies(
+            [("", [paths["stations_run"]])], max_workers=1
+        )
+
+        cases = {
+            "load_fqv_pkl": lambda: load_fqv(paths["pkl"]),
+            "load_fqv_xml": lambda: load_fqv(paths["xml"]),
+            "load_fqv_csv": lambda: load_fqv(paths["csv"]),
+            "load_machine_results_single_file": lambda: load_machine_results(
+                [paths["single_run"]]
+            ),
+            "load_results_single_file": lambda: load_machine_file(
+                paths["single_run"], empty_results(size)
+            ),
+            "load_manual_inspection_pkl": lambda: load_manual_inspection_data(
+                paths["inspections_pkl"]
+            ),
+            "load_manual_inspection_csv": lambda: load_manual_inspection_data(
+                paths["csv"]
+            ),
+            "read_study_file": lambda: read_study_file(paths["kfqv"], mmap=False),
+            "write_study_file": lambda: write_study_file(paths["kfqv"], study),
+            "calculate_efficiency": lambda: calculate_efficiency(
+                study.manual, study.machine
+            ),
+            "calculate_efficiency_batch_100": lambda: calculate_efficiency_batch(
+                stack, stack
+            ),
+            "bootstrap_efficiency": lambda: bootstrap_efficiency(
+                study.manual, study.machine, seed=0
+            ),
+            "bootstrap_efficiency_inspectors": lambda: bootstrap_efficiency(
+                study.manual, study.machine, study.inspections, seed=0
+            ),
+            "parse_run_samples": lambda: parse_run_samples(paths["stations_run"]),
+            "analyse_stations": lambda: analyse_stations(samples, drift_by="run"),
+            "export_compare_csv": lambda: write_results_csv(
+                export_path, ["Manual", "Machine"], [study.manual, study.machine]
+            ),
+            "export_inspections_csv": lambda: write_results_csv(
+                export_path,
+                [f"Inspector {i}" for i in range(1, INSPECTORS + 1)],
+                list(study.inspections.T),
+            ),
+        }
+        if "runs" in paths:
+            cases["load_machine_results_runs"] = lambda: load_machine_results(
+                paths["runs"]
+            )
+
+        for name, function in cases.items():
+            results[f"{name}/{size}"] = time_call(function, repeat)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument(
+        "--sizes",
+        type=int,
+        nargs="+",
+        default=DEFAULT_SIZES,
+        help="numbers of containers in the synthetic studies",
+    )
+    parser.add_argument(
+        "--repeat", type=int, default=5, help="timed runs of each benchmark"
+    )
+    add_report_arguments(parser)
+    args = parser.parse_args()
+
+    results = {}
+    for size in args.sizes:
+        results.update(benchmark_size(size, args.repeat))
+    return report(args, results, {"sizes": args.sizes, "repeat": args.repeat})
+
+
+if __name__ == "__main__":
+    sys.exit(main())
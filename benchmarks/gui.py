@@ -0,0 +1,167 @@
+"""
+Benchmark building and painting the result windows.
+
+Runs on Qt's offscreen platform unless QT_QPA_PLATFORM is set, so it works
+on a headless machine. For every study size it times building the result
+tables and the compare window, their first paint, repainting while
+scrolling and drawing the efficiency chart.
+
+Usage:
+    python benchmarks/gui.py [--sizes 250 2500 250000] [--repeat N]
+                             [--output FILE] [--baseline FILE]
+"""
+
+import argparse
+import os
+import sys
+
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+
+# harness puts the repository root on sys.path, so it is imported first.
+from harness import add_report_arguments, report, time_call
+from PyQt6.QtCore import QThreadPool
+from PyQt6.QtWidgets import QApplication, QTableView
+
+DEFAULT_SIZES = [250, 2500, 250000]
+SCROLL_STEPS = 50
+
+
+def close(widget):
+    widget.close()
+    widget.deleteLater()
+    QApplication.processEvents()
+
+
+def scroll_table(table, steps=SCROLL_STEPS):
+    """
+    Scroll a table from top to bottom, painting it after every step.
+
+    Parameters:
+        table (QTableView): The table to scroll.
+        steps (int): Number of scroll positions.
+    """
+    scroll_bar = table.verticalScrollBar()
+    for step in range(steps + 1):
+        scroll_bar.setValue(scroll_bar.maximum() * step // steps)
+        table.viewport().grab()
+
+
+def benchmark_size(size, repeat):
+    """
+    Time every GUI benchmark on a random study of one size.
+
+    Parameters:
+        size (int): Number of containers.
+        repeat (int): Number of timed runs of each benchmark.
+
+    Returns:
+        dict: Timings keyed by "benchmark/size".
+    """
+    from knapp.generate import generate_study
+    from knapp.export import inspector_headers
+    from utils import ResultsTableModel, setup_results_table
+    from widgets.compare_results import CompareResults, EfficiencyWindow
+
+    study = generate_study(size, seed=0)
+    results = {}
+
+    def timed(name, function, setup=None):
+        results[f"{name}/{size}"] = time_call(function, repeat, setup)
+
+    def build_results_table():
+        table, _ = setup_results_table(study.manual, "Manual")
+        table.resize(300, 600)
+        return table
+
+    timed("setup_results_table", lambda: close(build_results_table()))
+
+    def build_inspection_table():
+        table = QTableView()
+        table.setModel(
+            ResultsTableModel(
+                list(study.inspections.T), inspector_headers(study.inspections)
+            )
+        )
+        table.resize(600, 600)
+        return table
+
+    timed("inspection_table", lambda: close(build_inspection_table()))
+
+    def build_compare_window():
+        window = CompareResults(study)
+        window.resize(300, 600)
+        return window
+
+    timed("compare_results_window", lambda: close(build_compare_window()))
+
+    # The windows below are built once, only painting them is timed.
+    compare_window = build_compare_window()
+    compare_window.show()
+    timed("compare_results_first_paint", compare_window.grab)
+    timed(
+        "compare_results_scroll_repaint",
+        lambda: scroll_table(compare_window.table),
+        setup=compare_window.table.scrollToTop,
+    )
+    close(compare_window)
+
+    inspection_table = build_inspection_table()
+    inspection_table.show()
+    timed("inspection_table_first_paint", inspection_table.grab)
+    timed(
+        "inspection_table_scroll_repaint",
+        lambda: scroll_table(inspection_table),
+        setup=inspection_table.scrollToTop,
+    )
+    close(inspection_table)
+
+    # Import matplotlib once, so the window timing does not include it.
+    close(EfficiencyWindow(study))
+    timed("efficiency_window", lambda: close(EfficiencyWindow(study)))
+    efficiency_window = EfficiencyWindow(study)
+
+    def plot_bar_chart():
+        efficiency_window.efficiency_canvas.figure.clear()
+        efficiency_window.plot_bar_chart()
+        efficiency_window.efficiency_canvas.draw()
+
+    timed("efficiency_chart_draw", plot_bar_chart)
+    close(efficiency_window)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument(
+        "--sizes",
+        type=int,
+        nargs="+",
+        default=DEFAULT_SIZES,
+        help="numbers of containers in the random studies",
+    )
+    parser.add_argument(
+        "--repeat", type=int, default=5, help="timed runs of each benchmark"
+    )
+    add_report_arguments(parser)
+    args = parser.parse_args()
+
+    app = QApplication(sys.argv[:1])
+    results = {}
+    for size in args.sizes:
+        results.update(benchmark_size(size, args.repeat))
+    # The efficiency windows bootstrap their intervals on the thread pool.
+    QThreadPool.globalInstance().waitForDone()
+    app.quit()
+    return report(
+        args,
+        results,
+        {
+            "sizes": args.sizes,
+            "repeat": args.repeat,
+            "qt_platform": app.platformName(),
+        },
+    )
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,165 @@
+"""
+Shared timing, JSON output and baseline comparison for the benchmarks.
+"""
+
+import json
+import os
+import platform
+import statistics
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+
+def time_call(function, repeat=5, setup=None):
+    """
+    Time repeated calls of a function.
+
+    Parameters:
+        function (function): The function to time, called without arguments.
+        repeat (int): Number of timed calls.
+        setup (function): Called before every timed call, not timed.
+
+    Returns:
+        dict: Median, min and max seconds and the number of runs.
+    """
+    times = []
+    for _ in range(repeat):
+        if setup:
+            setup()
+        start = time.perf_counter()
+        function()
+        times.append(time.perf_counter() - start)
+    return {
+        "median": statistics.median(times),
+        "min": min(times),
+        "max": max(times),
+        "runs": repeat,
+    }
+
+
+def environment():
+    """
+    Describe the machine and library versions the benchmarks ran with.
+
+    Returns:
+        dict: Python, platform and NumPy details.
+    """
+    import numpy
+
+    return {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "machine": platform.machine(),
+        "cpus": os.cpu_count(),
+        "numpy": numpy.__version__,
+        "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+    }
+
+
+def write_report(file_path, results, extra=None):
+    """
+    Write benchmark results to a JSON file.
+
+    Parameters:
+        file_path (str): Path to the JSON file.
+        results (dict): Timings keyed by benchmark name.
+        extra (dict): More details of the environment to record.
+    """
+    report = {"environment": {**environment(), **(extra or {})}, "results": results}
+    with open(file_path, "w") as fp:
+        json.dump(report, fp, indent=2, sort_keys=True)
+
+
+def read_report(file_path):
+    """
+    Read the results of an earlier run from a JSON file.
+
+    Parameters:
+        file_path (str): Path to the JSON file.
+
+    Returns:
+        dict: Timings keyed by benchmark name.
+    """
+    with open(file_path) as fp:
+        return json.load(fp)["results"]
+
+
+def compare_reports(results, baseline, threshold):
+    """
+    Print each timing next to its baseline and find the regressions.
+
+    Parameters:
+        results (dict): Timings of this run keyed by benchmark name.
+        baseline (dict): Timings of the baseline run keyed by benchmark name.
+        threshold (float): Ratio of median times counted as a regression,
+            e.g. 1.25 for 25% slower.
+
+    Returns:
+        list: Names of the benchmarks slower than the threshold.
+    """
+    regressions = []
+    for name, timing in results.items():
+        if name not in baseline:
+            print(f"{name:<45} {timing['median']:>10.4f}s {'(new)':>18}")
+            continue
+        before = baseline[name]["median"]
+        change = timing["median"] / before if before else float("inf")
+        flag = ""
+        if change > threshold:
+            regressions.append(name)
+            flag = "  SLOWER"
+        print(
+            f"{name:<45} {timing['median']:>10.4f}s {before:>10.4f}s "
+            f"x{change:>6.2f}{flag}"
+        )
+    return regressions
+
+
+def print_results(results):
+    for name, timing in results.items():
+        print(f"{name:<45} {timing['median']:>10.4f}s  (min {timing['min']:.4f}s)")
+
+
+def add_report_arguments(parser):
+    """
+    Add the output and baseline options shared by the benchmarks.
+
+    Parameters:
+        parser (argparse.ArgumentParser): The parser to extend.
+    """
+    parser.add_argument("--output", help="write the timings to this JSON file")
+    parser.add_argument("--baseline", help="compare against this JSON file")
+    parser.add_argument(
+        "--threshold",
+        type=float,
+        default=1.25,
+        help="median ratio to the baseline counted as a regression",
+    )
+
+
+def report(args, results, extra=None):
+    """
+    Print, save and compare the results as asked for on the command line.
+
+    Parameters:
+        args (argparse.Namespace): Options added by add_report_arguments.
+        results (dict): Timings keyed by benchmark name.
+        extra (dict): More details of the environment to record.
+
+    Returns:
+        int: Exit status, 1 when a benchmark regressed against the baseline.
+    """
+    if args.output:
+        write_report(args.output, results, extra)
+    if not args.baseline:
+        print_results(results)
+        return 0
+    regressions = compare_reports(results, read_report(args.baseline), args.threshold)
+    if regressions:
+        print(f"{len(regressions)} benchmark(s) slower than x{args.threshold}")
+        return 1
+    return 0
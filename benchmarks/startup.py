@@ -0,0 +1,121 @@
+"""
+Measure the cold start time of the Knapp / FQV Reader.
+
+Each run starts a fresh Python process that creates MainApp and reports
+when the main window is first painted, so the time includes the
+interpreter start, every import and building the window.
+
+Usage:
+    python benchmarks/startup.py [--runs N] [--offscreen] [--max-seconds S]
+"""
+
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Modules that should only be imported once the window that needs them is
+# opened.
+DEFERRED_MODULES = ["matplotlib", "numpy"]
+
+CHILD = """
+import sys
+import time
+from PyQt6.QtCore import QEvent, QObject
+from PyQt6.QtWidgets import QApplication
+
+
+class FirstPaint(QObject):
+    def eventFilter(self, obj, event):
+        if event.type() == QEvent.Type.Paint:
+            loaded = [name for name in {deferred!r} if name in sys.modules]
+            print(time.time(), ",".join(loaded), flush=True)
+            QApplication.instance().removeEventFilter(self)
+            QApplication.instance().exit()
+        return False
+
+
+app = QApplication(sys.argv)
+first_paint = FirstPaint()
+app.installEventFilter(first_paint)
+import main
+
+window = main.MainApp()
+app.exec()
+"""
+
+
+def measure_startup(env=None):
+    """
+    Start the application once and time it until its first paint.
+
+    Parameters:
+        env (dict): Environment of the child process.
+
+    Returns:
+        tuple: Seconds until the first paint and the deferred modules that
+            were already imported by then.
+    """
+    code = CHILD.format(deferred=DEFERRED_MODULES)
+    start = time.time()
+    child = subprocess.run(
+        [sys.executable, "-c", code],
+        cwd=ROOT,
+        env=env,
+        capture_output=True,
+        text=True,
+        check=True,
+        timeout=120,
+    )
+    # Only the first paint counts, later ones may print before the exit.
+    output = child.stdout.splitlines()[0].split()
+    painted = float(output[0])
+    loaded = output[1].split(",") if len(output) > 1 else []
+    return painted - start, loaded
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--runs", type=int, default=5, help="number of cold starts")
+    parser.add_argument(
+        "--offscreen",
+        action="store_true",
+        help="use the offscreen Qt platform, for machines without a display",
+    )
+    parser.add_argument(
+        "--max-seconds",
+        type=float,
+        help="fail if the median start time is slower than this",
+    )
+    args = parser.parse_args()
+
+    env = dict(os.environ)
+    if args.offscreen:
+        env["QT_QPA_PLATFORM"] = "offscreen"
+
+    times = []
+    loaded = set()
+    for _ in range(args.runs):
+        seconds, modules = measure_startup(env)
+        times.append(seconds)
+        loaded.update(modules)
+
+    median = statistics.median(times)
+    print(f"time to first paint: median {median:.3f}s, min {min(times):.3f}s")
+
+    failed = False
+    if loaded:
+        print(f"imported before the first paint: {', '.join(sorted(loaded))}")
+        failed = True
+    if args.max_seconds is not None and median > args.max_seconds:
+        print(f"slower than {args.max_seconds:.3f}s")
+        failed = True
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
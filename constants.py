@@ -1,5 +1,21 @@
-CONTAINER_START = 1
-CONTAINER_END = 250
-ACCEPT_THRESHOLD = 3
-GREYZONE_THRESHOLD = 6
-REJECT_THRESHOLD = 7
+from knapp.constants import (
+    ACCEPT_THRESHOLD,
+    CONTAINER_END,
+    CONTAINER_START,
+    GREYZONE_THRESHOLD,
+    NOT_INSPECTED,
+    REJECT_THRESHOLD,
+)
+
+# Largest container set that can be created in the GUI
+MAX_CONTAINERS = 1000000
+
+__all__ = [
+    "ACCEPT_THRESHOLD",
+    "CONTAINER_END",
+    "CONTAINER_START",
+    "GREYZONE_THRESHOLD",
+    "MAX_CONTAINERS",
+    "NOT_INSPECTED",
+    "REJECT_THRESHOLD",
+]
@@ -0,0 +1,397 @@
+"""
+Local archive of studies with indexed queries across them.
+
+Each study is written to the archive directory as a study file, and its
+details and efficiency go into a SQLite database next to them. Queries such
+as every study of one machine in a year with an efficiency below 100% only
+touch the indexed database, so they stay fast across thousands of studies;
+the results themselves are memory-mapped from the study file when a study
+is opened.
+"""
+
+import argparse
+import csv
+import datetime
+import json
+import os
+import re
+import sqlite3
+import sys
+import time
+from knapp.layout import MachineLayout
+from knapp.loaders import load_study
+from knapp.storage import STUDY_EXTENSION, read_study_file, write_study_file
+from knapp.study import Study
+
+DEFAULT_ARCHIVE_DIR = os.path.join(
+    os.path.expanduser("~"), ".local", "share", "knapp-fqv-reader", "archive"
+)
+DATABASE_NAME = "archive.sqlite"
+# Details of a study that get their own indexed column.
+DETAILS = ["product", "machine", "recipe", "date", "spindles"]
+EFFICIENCY_COLUMNS = ["manual_vs_machine", "machine_vs_manual"]
+ISO_DATE = re.compile(r"\d{4}-\d{2}-\d{2}")
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS studies (
+    id INTEGER PRIMARY KEY,
+    title TEXT NOT NULL DEFAULT '',
+    product TEXT,
+    machine TEXT,
+    recipe TEXT,
+    date TEXT,
+    spindles INTEGER,
+    containers INTEGER NOT NULL,
+    total_manual INTEGER NOT NULL,
+    total_machine INTEGER NOT NULL,
+    manual_vs_machine REAL NOT NULL,
+    machine_vs_manual REAL NOT NULL,
+    metadata TEXT NOT NULL DEFAULT '{}',
+    added TEXT NOT NULL,
+    file TEXT NOT NULL DEFAULT ''
+);
+CREATE INDEX IF NOT EXISTS studies_machine_date ON studies (machine, date);
+CREATE INDEX IF NOT EXISTS studies_product_date ON studies (product, date);
+CREATE INDEX IF NOT EXISTS studies_recipe ON studies (recipe);
+CREATE INDEX IF NOT EXISTS studies_date ON studies (date);
+CREATE INDEX IF NOT EXISTS studies_manual_vs_machine ON studies (manual_vs_machine);
+CREATE INDEX IF NOT EXISTS studies_machine_vs_manual ON studies (machine_vs_manual);
+"""
+COLUMNS = [
+    "id",
+    "title",
+    *DETAILS,
+    "containers",
+    "total_manual",
+    "total_machine",
+    *EFFICIENCY_COLUMNS,
+    "added",
+]
+
+
+def iso_date(value):
+    """
+    Return a date as ISO text, e.g. "2025-03-14".
+
+    Parameters:
+        value (str or datetime.date): The date, None for no date.
+
+    Returns:
+        str: The ISO date, None if value is None.
+
+    Raises:
+        ValueError: If the value is not a date written as YYYY-MM-DD.
+    """
+    if value is None:
+        return None
+    if isinstance(value, datetime.datetime):
+        value = value.date()
+    if isinstance(value, datetime.date):
+        return value.isoformat()
+    try:
+        if ISO_DATE.fullmatch(str(value)):
+            return datetime.date.fromisoformat(value).isoformat()
+    except ValueError:
+        pass
+    raise ValueError(f"Expected a date as YYYY-MM-DD, got {value!r}")
+
+
+class StudyArchive:
+    """
+    SQLite index over a directory of archived study files.
+
+    Study details are read from the keyword arguments or, failing that, the
+    study's metadata. Dates are checked and stored as ISO text, e.g.
+    "2025-03-14", so they sort and compare as dates. A study without a date
+    is archived without one.
+
+    Attributes:
+        directory (str): Directory holding the database and study files.
+        connection (sqlite3.Connection): Connection to the database.
+    """
+
+    def __init__(self, directory=None):
+        self.directory = directory or os.environ.get(
+            "KNAPP_ARCHIVE_DIR", DEFAULT_ARCHIVE_DIR
+        )
+        os.makedirs(self.directory, exist_ok=True)
+        self.connection = sqlite3.connect(os.path.join(self.directory, DATABASE_NAME))
+        self.connection.row_factory = sqlite3.Row
+        self.connection.executescript(SCHEMA)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        self.connection.close()
+
+    def study_path(self, file_name):
+        return os.path.join(self.directory, file_name)
+
+    def add_study(self, study, **details):
+        """
+        Archive a study.
+
+        Parameters:
+            study (Study): The study to archive.
+            **details: product, machine, recipe, date and spindles, each
+                defaulting to the value in the study's metadata.
+
+        Returns:
+            int: Id of the archived study.
+
+        Raises:
+            ValueError: If the date is not written as YYYY-MM-DD.
+        """
+        unknown = set(details) - set(DETAILS)
+        if unknown:
+            raise TypeError(f"Unknown study details: {', '.join(sorted(unknown))}")
+        values = {
+            detail: details.get(detail, study.metadata.get(detail))
+            for detail in DETAILS
+        }
+        if values["spindles"] is not None:
+            values["spindles"] = int(values["spindles"])
+        values["date"] = iso_date(values["date"])
+        efficiency = study.efficiency()
+        metadata = {
+            **study.metadata,
+            **{detail: value for detail, value in values.items() if value is not None},
+        }
+        with self.connection:
+            cursor = self.connection.execute(
+                "INSERT INTO studies (title, product, machine, recipe, date,"
+                " spindles, containers, total_manual, total_machine,"
+                " manual_vs_machine, machine_vs_manual, metadata, added)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (
+                    study.title,
+                    *(values[detail] for detail in DETAILS),
+                    study.num_containers,
+                    efficiency["total_manual"],
+                    efficiency["total_machine"],
+                    efficiency["manual_vs_machine"],
+                    efficiency["machine_vs_manual"],
+                    json.dumps(metadata),
+                    time.strftime("%Y-%m-%dT%H:%M:%S"),
+                ),
+            )
+            study_id = cursor.lastrowid
+            file_name = f"{study_id}{STUDY_EXTENSION}"
+            write_study_file(
+                self.study_path(file_name),
+                Study(
+                    study.manual,
+                    study.machine,
+                    study.inspections if study.passes is None else study.passes,
+                    study.title,
+                    metadata=metadata,
+                ),
+            )
+            self.connection.execute(
+                "UPDATE studies SET file = ? WHERE id = ?", (file_name, study_id)
+            )
+        return study_id
+
+    def ingest(self, fqv_path=None, machine_paths=(), inspection_path=None, **details):
+        """
+        Load a study from its result files and archive it.
+
+        The spindles detail, when given, sets the machine layout the
+        KnappRun files are read with.
+
+        Parameters:
+            fqv_path (str): Path to the FQV results file.
+            machine_paths (list): Paths to the KnappRun xml files.
+            inspection_path (str): Path to the manual inspection data file.
+            **details: See add_study.
+
+        Returns:
+            int: Id of the archived study.
+        """
+        layout = MachineLayout(details["spindles"]) if details.get("spindles") else None
+        study = load_study(fqv_path, machine_paths, inspection_path, layout=layout)
+        if not study.title and fqv_path:
+            study.title = os.path.basename(fqv_path)
+        return self.add_study(study, **details)
+
+    def find_studies(
+        self,
+        product=None,
+        machine=None,
+        recipe=None,
+        date_from=None,
+        date_to=None,
+        efficiency_below=None,
+        efficiency="machine_vs_manual",
+        limit=None,
+    ):
+        """
+        Find archived studies matching every filter given.
+
+        Parameters:
+            product, machine, recipe (str): Exact values to match.
+            date_from, date_to (str): First and last ISO dates to include.
+            efficiency_below (float): Only studies with a lower efficiency (%).
+            efficiency (str): Efficiency ratio compared with efficiency_below,
+                "machine_vs_manual" or "manual_vs_machine".
+            limit (int): Most studies to return, None for all.
+
+        Returns:
+            list: Dictionary of the COLUMNS of each study, newest first.
+
+        Raises:
+            ValueError: If a date is not written as YYYY-MM-DD or the
+                efficiency ratio is unknown.
+        """
+        if efficiency not in EFFICIENCY_COLUMNS:
+            raise ValueError(f"Unknown efficiency ratio {efficiency}")
+        date_from = iso_date(date_from)
+        date_to = iso_date(date_to)
+        conditions = []
+        parameters = []
+        for column, value in (
+            ("product", product),
+            ("machine", machine),
+            ("recipe", recipe),
+        ):
+            if value is not None:
+                conditions.append(f"{column} = ?")
+                parameters.append(value)
+        if date_from is not None:
+            conditions.append("date >= ?")
+            parameters.append(date_from)
+        if date_to is not None:
+            conditions.append("date <= ?")
+            parameters.append(date_to)
+        if efficiency_below is not None:
+            conditions.append(f"{efficiency} < ?")
+            parameters.append(efficiency_below)
+        query = f"SELECT {', '.join(COLUMNS)} FROM studies"
+        if conditions:
+            query += " WHERE " + " AND ".join(conditions)
+        query += " ORDER BY date DESC, id DESC"
+        if limit is not None:
+            query += " LIMIT ?"
+            parameters.append(limit)
+        return [dict(row) for row in self.connection.execute(query, parameters)]
+
+    def distinct(self, column):
+        """
+        Return the distinct values of a study detail, for filter choices.
+
+        Parameters:
+            column (str): One of "product", "machine" or "recipe".
+
+        Returns:
+            list: The values in order, without None.
+        """
+        if column not in DETAILS:
+            raise ValueError(f"Unknown study detail {column}")
+        return [
+            row[0]
+            for row in self.connection.execute(
+                f"SELECT DISTINCT {column} FROM studies"
+                f" WHERE {column} IS NOT NULL ORDER BY {column}"
+            )
+        ]
+
+    def open_study(self, study_id, mmap=True):
+        """
+        Read an archived study.
+
+        Parameters:
+            study_id (int): Id of the study.
+            mmap (bool): Memory-map the study file.
+
+        Returns:
+            Study: The study.
+
+        Raises:
+            KeyError: If there is no study with that id.
+        """
+        row = self.connection.execute(
+            "SELECT file FROM studies WHERE id = ?", (study_id,)
+        ).fetchone()
+        if row is None:
+            raise KeyError(study_id)
+        return read_study_file(self.study_path(row["file"]), mmap)
+
+    def remove_study(self, study_id):
+        """
+        Remove a study and its study file from the archive.
+
+        Parameters:
+            study_id (int): Id of the study.
+        """
+        with self.connection:
+            row = self.connection.execute(
+                "SELECT file FROM studies WHERE id = ?", (study_id,)
+            ).fetchone()
+            self.connection.execute("DELETE FROM studies WHERE id = ?", (study_id,))
+        if row is not None and row["file"]:
+            try:
+                os.remove(self.study_path(row["file"]))
+            except OSError:
+                pass
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog="python -m knapp.archive",
+        description="Add studies to the study archive or search it.",
+    )
+    parser.add_argument("--archive", help="archive directory")
+    commands = parser.add_subparsers(dest="command", required=True)
+    add = commands.add_parser("add", help="archive a study from its result files")
+    add.add_argument("--fqv", help="FQV results file")
+    add.add_argument("--machine-results", nargs="+", default=[], metavar="FILE")
+    add.add_argument("--inspections", help="manual inspection data file")
+    find = commands.add_parser("find", help="list the matching studies")
+    for command in (add, find):
+        command.add_argument("--product")
+        command.add_argument("--machine")
+        command.add_argument("--recipe")
+    add.add_argument("--date", type=iso_date, help="date of the study, YYYY-MM-DD")
+    add.add_argument("--spindles", type=int)
+    find.add_argument("--date-from", type=iso_date, help="first date, YYYY-MM-DD")
+    find.add_argument("--date-to", type=iso_date, help="last date, YYYY-MM-DD")
+    find.add_argument("--efficiency-below", type=float, metavar="PERCENT")
+    find.add_argument(
+        "--efficiency", choices=EFFICIENCY_COLUMNS, default=EFFICIENCY_COLUMNS[1]
+    )
+    find.add_argument("--limit", type=int)
+    args = parser.parse_args(argv)
+
+    with StudyArchive(args.archive) as archive:
+        if args.command == "add":
+            details = {
+                detail: getattr(args, detail)
+                for detail in DETAILS
+                if getattr(args, detail) is not None
+            }
+            study_id = archive.ingest(
+                args.fqv, args.machine_results, args.inspections, **details
+            )
+            print(f"Added study {study_id}")
+            return 0
+        studies = archive.find_studies(
+            args.product,
+            args.machine,
+            args.recipe,
+            args.date_from,
+            args.date_to,
+            args.efficiency_below,
+            args.efficiency,
+            args.limit,
+        )
+        writer = csv.DictWriter(sys.stdout, COLUMNS, lineterminator="\n")
+        writer.writeheader()
+        writer.writerows(studies)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
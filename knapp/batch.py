@@ -0,0 +1,359 @@
+"""
+Compare whole directories of studies without the GUI.
+
+Every directory holding KnappRun xml files is one study. Its FQV is the
+file of that directory with "fqv" in its name, and a file with
+"inspection" in its name adds the per-inspector results. Directories
+without KnappRun files count each study file (.kfqv) as a study. The
+studies are loaded and compared on a process pool and the efficiency of
+every study is written to a CSV and/or JSON report.
+
+Usage:
+    python -m knapp.batch DIRECTORY [DIRECTORY ...] [--csv FILE]
+        [--json FILE] [--workers N] [--bootstrap N] [--seed N] [--no-cache]
+        [--layout SPINDLES[xRUNS]] [--strict]
+"""
+
+import argparse
+import csv
+import json
+import os
+import sys
+import time
+from concurrent.futures import as_completed
+from knapp.cache import ParseCache
+from knapp.layout import MachineLayout
+from knapp.loaders import load_study, process_pool
+from knapp.stats import bootstrap_efficiency, inspections_to_resample
+from knapp.storage import STUDY_EXTENSION, read_study_file
+
+# Preferred FQV file when a directory holds the FQV in several formats.
+FQV_EXTENSIONS = [STUDY_EXTENSION, ".pkl", ".csv", ".xml"]
+INSPECTION_EXTENSIONS = [STUDY_EXTENSION, ".pkl", ".csv", ".xml"]
+# Values of knapp.efficiency.calculate_efficiency copied into the report.
+EFFICIENCY_KEYS = [
+    "containers_inspected",
+    "total_manual",
+    "total_machine",
+    "fqv_sum",
+    "fqa_sum",
+    "manual_vs_machine",
+    "machine_vs_manual",
+]
+REPORT_COLUMNS = [
+    "study",
+    "status",
+    "error",
+    "fqv_file",
+    "inspection_file",
+    "runs",
+    "containers",
+    *EFFICIENCY_KEYS,
+    "manual_vs_machine_low",
+    "manual_vs_machine_high",
+    "machine_vs_manual_low",
+    "machine_vs_manual_high",
+    "seconds",
+]
+
+
+def pick_file(file_names, word, extensions):
+    """
+    Return the file whose name holds a word, by extension preference.
+
+    Parameters:
+        file_names (list): Names of the files in a directory.
+        word (str): Word the file name must contain, in any case.
+        extensions (list): Accepted extensions, most preferred first.
+
+    Returns:
+        str: The file name, or None if no file matches.
+    """
+    matches = {}
+    for file_name in sorted(file_names):
+        stem, extension = os.path.splitext(file_name)
+        if word in stem.lower() and extension.lower() in extensions:
+            matches.setdefault(extension.lower(), file_name)
+    return next((matches[ext] for ext in extensions if ext in matches), None)
+
+
+def find_study_files(directories, layout=None):
+    """
+    Pair up the FQV, KnappRun and inspection files of every study.
+
+    Parameters:
+        directories (list): Directories searched recursively.
+        layout (MachineLayout): Layout naming the run files.
+
+    Returns:
+        list: Dictionary per study with its name, fqv_path, machine_paths
+            and inspection_path, sorted by name.
+    """
+    layout = layout or MachineLayout()
+    studies = []
+    for top in directories:
+        for directory, _, file_names in os.walk(top):
+            name = os.path.relpath(directory, os.path.dirname(os.path.abspath(top)))
+            runs = [
+                file_name
+                for file_name in file_names
+                if file_name.lower().endswith(".xml")
+                and layout.run_number(file_name) is not None
+            ]
+            if runs:
+                fqv = pick_file(file_names, "fqv", FQV_EXTENSIONS)
+                inspections = pick_file(file_names, "inspection", INSPECTION_EXTENSIONS)
+                studies.append(
+                    {
+                        "name": name,
+                        "fqv_path": fqv and os.path.join(directory, fqv),
+                        "machine_paths": [
+                            os.path.join(directory, run) for run in sorted(runs)
+                        ],
+                        "inspection_path": inspections
+                        and os.path.join(directory, inspections),
+                    }
+                )
+                continue
+            for file_name in sorted(file_names):
+                if file_name.lower().endswith(STUDY_EXTENSION):
+                    studies.append(
+                        {
+                            "name": os.path.join(name, file_name),
+                            "study_path": os.path.join(directory, file_name),
+                        }
+                    )
+    return sorted(studies, key=lambda study: study["name"])
+
+
+def compare_study(
+    study_files, bootstrap=0, seed=None, use_cache=True, layout=None, validate=False
+):
+    """
+    Load one study and work out its efficiency.
+
+    Runs in a worker process, so any error is returned in the report row
+    rather than raised.
+
+    Parameters:
+        study_files (dict): Files of the study, from find_study_files.
+        bootstrap (int): Bootstrap resamples for confidence intervals, 0
+            for none.
+        seed (int): Seed of the bootstrap.
+        use_cache (bool): Use the parse cache.
+        layout (MachineLayout): Layout of the machine.
+        validate (bool): Fail the study if runs are missing or repeated.
+
+    Returns:
+        dict: Report row with the REPORT_COLUMNS of the study.
+    """
+    start = time.perf_counter()
+    row = {
+        "study": study_files["name"],
+        "status": "ok",
+        "fqv_file": study_files.get("fqv_path") or study_files.get("study_path"),
+        "inspection_file": study_files.get("inspection_path"),
+        "runs": len(study_files.get("machine_paths", ())),
+    }
+    try:
+        if "study_path" in study_files:
+            study = read_study_file(study_files["study_path"])
+        elif not study_files["fqv_path"]:
+            raise FileNotFoundError("No FQV file next to the KnappRun files")
+        else:
+            study = load_study(
+                study_files["fqv_path"],
+                study_files["machine_paths"],
+                study_files["inspection_path"],
+                cache=ParseCache() if use_cache else None,
+                max_workers=1,
+                layout=layout,
+                validate=validate,
+            )
+        efficiency = study.efficiency()
+        row["containers"] = study.num_containers
+        for key in EFFICIENCY_KEYS:
+            row[key] = efficiency[key]
+        if bootstrap:
+            intervals = bootstrap_efficiency(
+                study.manual,
+                study.machine,
+                inspections_to_resample(study.manual, study.inspections),
+                bootstrap,
+                seed=seed,
+            )
+            for key in ("manual_vs_machine", "machine_vs_manual"):
+                row[f"{key}_low"], row[f"{key}_high"] = intervals[key]
+    except Exception as error:
+        row["status"] = "error"
+        row["error"] = f"{type(error).__name__}: {error}"
+    row["seconds"] = time.perf_counter() - start
+    return row
+
+
+def compare_studies(
+    studies,
+    max_workers=None,
+    bootstrap=0,
+    seed=None,
+    use_cache=True,
+    progress=None,
+    layout=None,
+    validate=False,
+):
+    """
+    Compare every study on a process pool.
+
+    Parameters:
+        studies (list): Study files from find_study_files.
+        max_workers (int): Worker processes, 1 runs on the calling process.
+            Defaults to one per CPU.
+        bootstrap (int): Bootstrap resamples for confidence intervals.
+        seed (int): Seed of the bootstrap.
+        use_cache (bool): Use the parse cache.
+        progress (function): Called with (studies done, total) after each.
+        layout (MachineLayout): Layout of the machine.
+        validate (bool): Fail studies whose runs are missing or repeated.
+
+    Returns:
+        list: Report row of every study, in the order of studies.
+    """
+    options = (bootstrap, seed, use_cache, layout, validate)
+    rows = [None] * len(studies)
+    if max_workers is None:
+        max_workers = min(len(studies), os.cpu_count() or 1)
+    if max_workers > 1:
+        with process_pool(max_workers) as executor:
+            futures = {
+                executor.submit(compare_study, study, *options): index
+                for index, study in enumerate(studies)
+            }
+            for done, future in enumerate(as_completed(futures), 1):
+                rows[futures[future]] = future.result()
+                if progress:
+                    progress(done, len(studies))
+    else:
+        for index, study in enumerate(studies):
+            rows[index] = compare_study(study, *options)
+            if progress:
+                progress(index + 1, len(studies))
+    return rows
+
+
+def write_report_rows(csvfile, rows):
+    """
+    Write report rows with a header row to an open csv file.
+
+    Parameters:
+        csvfile (file): File opened for writing.
+        rows (list): Report rows from compare_studies.
+    """
+    writer = csv.DictWriter(csvfile, REPORT_COLUMNS, lineterminator="\n")
+    writer.writeheader()
+    writer.writerows(rows)
+
+
+def write_report_csv(file_path, rows):
+    """
+    Write report rows to a csv file, one row per study.
+
+    Parameters:
+        file_path (str): Path to the csv file.
+        rows (list): Report rows from compare_studies.
+    """
+    with open(file_path, "w") as csvfile:
+        write_report_rows(csvfile, rows)
+
+
+def write_report_json(file_path, rows):
+    """
+    Write report rows and a summary to a JSON file.
+
+    Parameters:
+        file_path (str): Path to the JSON file.
+        rows (list): Report rows from compare_studies.
+    """
+    ok = [row for row in rows if row["status"] == "ok"]
+    report = {
+        "summary": {
+            "studies": len(rows),
+            "failed": len(rows) - len(ok),
+            "below_100": sum(row["machine_vs_manual"] < 100 for row in ok),
+            "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        },
+        "studies": rows,
+    }
+    with open(file_path, "w") as fp:
+        json.dump(report, fp, indent=2)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog="python -m knapp.batch",
+        description="Compare every study found in directories of FQV and "
+        "KnappRun files.",
+    )
+    parser.add_argument("directories", nargs="+", help="directories to search")
+    parser.add_argument("--csv", help="write the report to this csv file")
+    parser.add_argument("--json", help="write the report to this JSON file")
+    parser.add_argument("--workers", type=int, help="worker processes")
+    parser.add_argument(
+        "--bootstrap",
+        type=int,
+        default=0,
+        metavar="N",
+        help="add 95%% confidence intervals from N bootstrap resamples",
+    )
+    parser.add_argument("--seed", type=int, help="seed of the bootstrap")
+    parser.add_argument(
+        "--no-cache", action="store_true", help="always parse the files"
+    )
+    parser.add_argument(
+        "--layout",
+        type=MachineLayout.parse,
+        default=MachineLayout(),
+        metavar="SPINDLES[xRUNS]",
+        help="machine layout, e.g. 48 or 48x11 (default 24 spindles)",
+    )
+    parser.add_argument(
+        "--strict",
+        action="store_true",
+        help="fail studies with missing or repeated runs",
+    )
+    parser.add_argument("--quiet", action="store_true", help="do not show progress")
+    args = parser.parse_args(argv)
+
+    studies = find_study_files(args.directories, args.layout)
+    if not studies:
+        parser.error("no studies found")
+
+    def progress(done, total):
+        print(f"\r{done}/{total} studies", end="", file=sys.stderr, flush=True)
+
+    rows = compare_studies(
+        studies,
+        args.workers,
+        args.bootstrap,
+        args.seed,
+        not args.no_cache,
+        None if args.quiet else progress,
+        args.layout,
+        args.strict,
+    )
+    if not args.quiet:
+        print(file=sys.stderr)
+    if args.json:
+        write_report_json(args.json, rows)
+    if args.csv:
+        write_report_csv(args.csv, rows)
+    if not args.csv and not args.json:
+        write_report_rows(sys.stdout, rows)
+
+    failed = [row for row in rows if row["status"] != "ok"]
+    for row in failed:
+        print(f"{row['study']}: {row['error']}", file=sys.stderr)
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,174 @@
+import hashlib
+import os
+import tempfile
+import numpy as np
+
+# Bump whenever a parser changes what it returns for the same file, so that
+# results cached by an older version are no longer used.
+PARSER_VERSION = 4
+DEFAULT_CACHE_DIR = os.path.join(os.path.expanduser("~"), ".cache", "knapp-fqv-reader")
+DEFAULT_MAX_BYTES = 512 * 1024 * 1024
+HASH_CHUNK_SIZE = 1024 * 1024
+
+
+def file_digest(file_path):
+    """
+    Return the SHA-256 hex digest of a file's contents.
+
+    Parameters:
+        file_path (str): Path to the file.
+
+    Returns:
+        str: The hex digest.
+    """
+    digest = hashlib.sha256()
+    with open(file_path, "rb") as fp:
+        for chunk in iter(lambda: fp.read(HASH_CHUNK_SIZE), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class ParseCache:
+    """
+    On-disk cache of parsed result arrays keyed by file contents.
+
+    Entries are keyed by the hash of the file, the parser and PARSER_VERSION,
+    so renaming or copying a file still hits the cache while editing it does
+    not. Once the cache grows past max_bytes the least recently used entries
+    are removed.
+
+    Attributes:
+        directory (str): Directory holding the cache entries.
+        max_bytes (int): Size the cache is trimmed back to after each write.
+    """
+
+    def __init__(self, directory=None, max_bytes=DEFAULT_MAX_BYTES):
+        self.directory = directory or os.environ.get(
+            "KNAPP_CACHE_DIR", DEFAULT_CACHE_DIR
+        )
+        self.max_bytes = max_bytes
+
+    def key(self, file_path, parser):
+        """
+        Return the cache key of a file for a parser.
+
+        Parameters:
+            file_path (str): Path to the file.
+            parser (function): The function parsing the file.
+
+        Returns:
+            str: The cache key.
+        """
+        extension = os.path.splitext(file_path)[1].lstrip(".").lower()
+        return (
+            f"{file_digest(file_path)}-{parser.__name__}-{extension}"
+            f"-v{PARSER_VERSION}"
+        )
+
+    def entry_path(self, key):
+        return os.path.join(self.directory, f"{key}.npy")
+
+    def get(self, key):
+        """
+        Return a cached array, or None if the key is not cached.
+
+        Parameters:
+            key (str): The cache key.
+
+        Returns:
+            numpy.ndarray: The cached array, or None.
+        """
+        path = self.entry_path(key)
+        try:
+            array = np.load(path, allow_pickle=False)
+            # The modification time records the last use for eviction.
+            os.utime(path)
+            return array
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError):
+            self.remove(path)
+            return None
+
+    def put(self, key, array):
+        """
+        Store an array in the cache and evict old entries if it is too large.
+
+        Failing to write the cache is not an error, the array is simply not
+        cached.
+
+        Parameters:
+            key (str): The cache key.
+            array (numpy.ndarray): The array to cache.
+        """
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            fd, temp_path = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+            with os.fdopen(fd, "wb") as fp:
+                np.save(fp, array, allow_pickle=False)
+            os.replace(temp_path, self.entry_path(key))
+            self.evict()
+        except OSError:
+            pass
+
+    def load(self, parser, file_path):
+        """
+        Return the result of parser(file_path), from the cache when possible.
+
+        Parameters:
+            parser (function): Function parsing the file into an array.
+            file_path (str): Path to the file.
+
+        Returns:
+            numpy.ndarray: The parsed array.
+        """
+        key = self.key(file_path, parser)
+        array = self.get(key)
+        if array is None:
+            array = parser(file_path)
+            self.put(key, array)
+        return array
+
+    def entries(self):
+        """
+        Return the cache entries, least recently used first.
+
+        Returns:
+            list: (modification time, size, path) of each entry.
+        """
+        entries = []
+        try:
+            with os.scandir(self.directory) as it:
+                for entry in it:
+                    if entry.name.endswith(".npy"):
+                        stat = entry.stat()
+                        entries.append((stat.st_mtime, stat.st_size, entry.path))
+        except FileNotFoundError:
+            pass
+        return sorted(entries)
+
+    def evict(self):
+        """
+        Remove the least recently used entries until the cache fits max_bytes.
+        """
+        entries = self.entries()
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in entries:
+            if total <= self.max_bytes:
+                break
+            self.remove(path)
+            total -= size
+
+    def clear(self):
+        """
+        Remove every entry from the cache.
+        """
+        for _, _, path in self.entries():
+            self.remove(path)
+
+    @staticmethod
+    def remove(path):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
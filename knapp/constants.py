@@ -0,0 +1,18 @@
+"""
+Constants shared by the knapp modules and the GUI.
+
+Kept free of NumPy so that the GUI can read them at startup.
+"""
+
+CONTAINER_START = 1
+CONTAINER_END = 250
+ACCEPT_THRESHOLD = 3
+GREYZONE_THRESHOLD = 6
+REJECT_THRESHOLD = 7
+# Stored in place of a result for containers that were not inspected
+NOT_INSPECTED = 255
+MAX_RESULT = 10
+INSPECTORS = 5
+# Each inspector inspects every container this many times, the FQV being the
+# share of the INSPECTORS x PASSES inspections that rejected it, times 10.
+PASSES = 10
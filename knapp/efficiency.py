@@ -0,0 +1,180 @@
+import numpy as np
+from knapp.study import NOT_INSPECTED, REJECT_THRESHOLD
+
+CATEGORIES = list(range(11))
+
+
+def stack_results(arrays, fill_value=NOT_INSPECTED):
+    """
+    Stack the result arrays of several studies into one 2-D array.
+
+    Shorter studies are padded with fill_value, which falls outside the
+    categories and so is never counted.
+
+    Parameters:
+        arrays (list): One result array per study.
+        fill_value (int): Value used for padding.
+
+    Returns:
+        numpy.ndarray: uint8 array of shape (studies, containers).
+    """
+    arrays = [np.asarray(array) for array in arrays]
+    width = max((len(array) for array in arrays), default=0)
+    stack = np.full((len(arrays), width), fill_value, dtype=np.uint8)
+    for row, array in enumerate(arrays):
+        stack[row, : len(array)] = array
+    return stack
+
+
+def count_categories(results):
+    """
+    Count how many containers fall into each category from 0 to 10.
+
+    Parameters:
+        results (numpy.ndarray): Result value per container, or a 2-D stack
+            of one row per study. Values outside the categories are not
+            counted.
+
+    Returns:
+        numpy.ndarray: Number of containers for each category, one row per
+            study for a stack.
+    """
+    results = np.asarray(results)
+    stack = np.atleast_2d(results)
+    num_categories = len(CATEGORIES)
+    rows = np.broadcast_to(np.arange(stack.shape[0])[:, np.newaxis], stack.shape)
+    valid = stack < num_categories
+    # Offset every study by its own block of categories so that a single
+    # bincount covers the whole stack.
+    counts = np.bincount(
+        rows[valid] * num_categories + stack[valid],
+        minlength=stack.shape[0] * num_categories,
+    ).reshape(stack.shape[0], num_categories)
+    return counts[0] if results.ndim == 1 else counts
+
+
+def ratio(numerator, denominator):
+    """
+    Return numerator / denominator * 100, or 0 where the denominator is 0.
+    """
+    numerator = np.asarray(numerator, dtype=np.float64)
+    denominator = np.asarray(denominator, dtype=np.float64)
+    return (
+        np.divide(
+            numerator,
+            denominator,
+            out=np.zeros(np.broadcast(numerator, denominator).shape),
+            where=denominator > 0,
+        )
+        * 100
+    )
+
+
+def suffix_sums(values):
+    """
+    Return the sum of each row from every column to the end.
+
+    Parameters:
+        values (numpy.ndarray): 2-D array.
+
+    Returns:
+        numpy.ndarray: Array one column wider, column t holding the sum of
+            columns t and up, the last column 0.
+    """
+    values = np.asarray(values)
+    sums = np.zeros((values.shape[0], values.shape[1] + 1), dtype=values.dtype)
+    sums[:, :-1] = np.cumsum(values[:, ::-1], axis=1)[:, ::-1]
+    return sums
+
+
+class CumulativeCounts:
+    """
+    Category counts of a stack of studies with running totals for any threshold.
+
+    The containers and the sum of their values from every category up to 10
+    are worked out once, so the efficiency for any reject threshold is a
+    lookup rather than a recount.
+
+    Attributes:
+        manual_counts, machine_counts (numpy.ndarray): Category histograms,
+            one row per study.
+        manual_totals, machine_totals (numpy.ndarray): Containers in
+            category t and up, in column t.
+        manual_sums, machine_sums (numpy.ndarray): Sum of the values in
+            category t and up, in column t.
+    """
+
+    def __init__(self, manual, machine):
+        self.manual_counts = count_categories(np.atleast_2d(manual))
+        self.machine_counts = count_categories(np.atleast_2d(machine))
+        values = np.asarray(CATEGORIES)
+        self.manual_totals = suffix_sums(self.manual_counts)
+        self.machine_totals = suffix_sums(self.machine_counts)
+        self.manual_sums = suffix_sums(self.manual_counts * values)
+        self.machine_sums = suffix_sums(self.machine_counts * values)
+
+    def efficiency(self, reject_threshold=REJECT_THRESHOLD):
+        """
+        Return the efficiency of every study for a reject threshold.
+
+        Parameters:
+            reject_threshold (int): Lowest category in the reject zone.
+
+        Returns:
+            dict: See calculate_efficiency_batch.
+        """
+        total_manual = self.manual_totals[:, reject_threshold]
+        total_machine = self.machine_totals[:, reject_threshold]
+        return {
+            "manual_counts": self.manual_counts,
+            "machine_counts": self.machine_counts,
+            "total_manual": total_manual,
+            "total_machine": total_machine,
+            "fqv_sum": self.manual_sums[:, reject_threshold],
+            "fqa_sum": self.machine_sums[:, reject_threshold],
+            "manual_vs_machine": ratio(total_manual, total_machine),
+            "machine_vs_manual": ratio(total_machine, total_manual),
+            "containers_inspected": self.manual_totals[:, 0],
+        }
+
+
+def calculate_efficiency_batch(manual, machine, reject_threshold=REJECT_THRESHOLD):
+    """
+    Calculate the Knapp efficiency of a whole stack of studies at once.
+
+    Only containers in the reject zone (categories 7 to 10 by default)
+    count towards the efficiency.
+
+    Parameters:
+        manual (numpy.ndarray): FQV values, shape (studies, containers).
+        machine (numpy.ndarray): FQA values, shape (studies, containers).
+        reject_threshold (int): Lowest category in the reject zone.
+
+    Returns:
+        dict: Arrays with one entry (or row) per study:
+            manual_counts, machine_counts: category histograms.
+            total_manual, total_machine: containers in the reject zone.
+            fqv_sum, fqa_sum: sum of the FQV and FQA values in the reject zone.
+            manual_vs_machine, machine_vs_manual: efficiency ratios in %.
+            containers_inspected: containers with a manual result.
+    """
+    return CumulativeCounts(manual, machine).efficiency(reject_threshold)
+
+
+def calculate_efficiency(manual, machine, reject_threshold=REJECT_THRESHOLD):
+    """
+    Calculate the Knapp efficiency of manual against machine inspection.
+
+    Parameters:
+        manual (numpy.ndarray): FQV value per container.
+        machine (numpy.ndarray): FQA value per container.
+        reject_threshold (int): Lowest category in the reject zone.
+
+    Returns:
+        dict: The values of calculate_efficiency_batch for a single study,
+            as plain Python numbers and lists.
+    """
+    batch = calculate_efficiency_batch(
+        stack_results([manual]), stack_results([machine]), reject_threshold
+    )
+    return {key: value[0].tolist() for key, value in batch.items()}
@@ -0,0 +1,109 @@
+import csv
+import numpy as np
+from knapp.study import NOT_INSPECTED
+
+# Text written for every possible stored value, -1 for containers that were
+# not inspected as in the legacy csv files.
+RESULT_TEXT = np.array([str(value) for value in range(256)], dtype=object)
+RESULT_TEXT[NOT_INSPECTED] = "-1"
+
+
+def write_results_csv(file_path, headers, columns):
+    """
+    Write result columns to a csv file with a header row.
+
+    Parameters:
+        file_path (str): Path to the csv file.
+        headers (list): Column headers.
+        columns (list): One uint8 result array per column, all the same length.
+    """
+    text_columns = [RESULT_TEXT[np.asarray(column)] for column in columns]
+    with open(file_path, "w") as csvfile:
+        writer = csv.writer(csvfile, dialect="excel", lineterminator="\n")
+        writer.writerow(headers)
+        writer.writerows(zip(*text_columns))
+
+
+def inspector_headers(inspections):
+    """
+    Return the "Inspector N" column headers of an inspection matrix.
+
+    Parameters:
+        inspections (numpy.ndarray): Inspection matrix (containers, inspectors).
+
+    Returns:
+        list: One header per inspector.
+    """
+    return [f"Inspector {i}" for i in range(1, inspections.shape[1] + 1)]
+
+
+def pass_headers(passes):
+    """
+    Return the "Inspector N Pass P" column headers of a pass array.
+
+    Parameters:
+        passes (numpy.ndarray): Pass array (containers, inspectors, passes).
+
+    Returns:
+        list: One header per inspector and pass, inspector by inspector.
+    """
+    return [
+        f"Inspector {inspector} Pass {run}"
+        for inspector in range(1, passes.shape[1] + 1)
+        for run in range(1, passes.shape[2] + 1)
+    ]
+
+
+def write_passes_csv(file_path, passes):
+    """
+    Write every inspection pass to a csv file, one row per container.
+
+    Parameters:
+        file_path (str): Path to the csv file.
+        passes (numpy.ndarray): Pass array (containers, inspectors, passes).
+    """
+    write_results_csv(
+        file_path, pass_headers(passes), list(passes.reshape(len(passes), -1).T)
+    )
+
+
+def write_inspections_csv(file_path, inspections):
+    """
+    Write per-inspector results to a csv file, one row per container.
+
+    Parameters:
+        file_path (str): Path to the csv file.
+        inspections (numpy.ndarray): Inspection matrix (containers,
+            inspectors), or a pass array (containers, inspectors, passes)
+            written as one column per inspector and pass.
+    """
+    if inspections.ndim == 3:
+        write_passes_csv(file_path, inspections)
+    else:
+        write_results_csv(
+            file_path, inspector_headers(inspections), list(inspections.T)
+        )
+
+
+def write_inspections_xml(file_path, inspections):
+    """
+    Write per-inspector results as Sample/Inspector xml elements.
+
+    Parameters:
+        file_path (str): Path to the xml file.
+        inspections (numpy.ndarray): Inspection matrix (containers,
+            inspectors), or a pass array (containers, inspectors, passes)
+            written as one Pass element per pass.
+    """
+    text = RESULT_TEXT[np.asarray(inspections)]
+    if text.ndim == 3:
+        inspector = "<Inspector>" + "<Pass>{}</Pass>" * text.shape[2] + "</Inspector>"
+    else:
+        inspector = "<Inspector>{}</Inspector>"
+    template = "<Sample>" + inspector * text.shape[1] + "</Sample>"
+    with open(file_path, "w") as fp:
+        fp.write("<Study>")
+        fp.writelines(
+            template.format(*values) for values in text.reshape(len(text), -1)
+        )
+        fp.write("</Study>")
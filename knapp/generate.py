@@ -0,0 +1,343 @@
+"""
+Generate synthetic studies for testing and load testing.
+
+Every container gets a true reject category from 0 to 10 drawn from a
+category distribution. Each inspector and the machine then reject it in
+each of MAX_RESULT passes with probability category / 10, so the FQV, the
+per-inspector results and the KnappRun files agree the way real studies do.
+
+Usage:
+    python -m knapp.generate OUTPUT_DIR [--containers N | --runs N]
+        [--spindles N] [--cameras N] [--distribution W0 ... W10]
+        [--seed N] [--passes] [--formats pkl xml csv kfqv runs]
+"""
+
+import argparse
+import os
+import sys
+import numpy as np
+from knapp.export import write_inspections_csv
+from knapp.layout import DEFAULT_SPINDLES
+from knapp.storage import write_pickle_file, write_study_file
+from knapp.study import (
+    CONTAINER_END,
+    INSPECTORS,
+    MAX_RESULT,
+    PASSES,
+    Study,
+    array_to_results,
+    fqv_from_inspections,
+)
+
+# Most containers of a real set are good, with a tail of grey zone and
+# reject containers.
+DEFAULT_DISTRIBUTION = [40, 10, 8, 6, 6, 5, 5, 5, 5, 5, 5]
+UNIFORM_DISTRIBUTION = [1] * (MAX_RESULT + 1)
+SPINDLES = DEFAULT_SPINDLES
+FORMATS = ["pkl", "xml", "csv", "kfqv", "runs"]
+# Samples formatted at a time when writing KnappRun files, which bounds the
+# memory used for very large runs.
+XML_CHUNK_SIZE = 100000
+
+
+def category_probabilities(distribution=None):
+    """
+    Normalise category weights to probabilities.
+
+    Parameters:
+        distribution (list): Weight of each category from 0 to 10, defaults
+            to DEFAULT_DISTRIBUTION.
+
+    Returns:
+        numpy.ndarray: Probability of each category.
+
+    Raises:
+        ValueError: If there is not one non-negative weight per category.
+    """
+    weights = np.asarray(
+        DEFAULT_DISTRIBUTION if distribution is None else distribution, dtype=float
+    )
+    if weights.shape != (MAX_RESULT + 1,) or (weights < 0).any() or not weights.sum():
+        raise ValueError(f"Expected {MAX_RESULT + 1} non-negative category weights")
+    return weights / weights.sum()
+
+
+def reject_counts(rng, categories, shape=()):
+    """
+    Draw how many of MAX_RESULT passes reject each container.
+
+    Parameters:
+        rng (numpy.random.Generator): Random generator.
+        categories (numpy.ndarray): True category of each container.
+        shape (tuple): Extra dimensions, e.g. (INSPECTORS,).
+
+    Returns:
+        numpy.ndarray: uint8 reject counts, shape categories.shape + shape.
+    """
+    probabilities = (categories / MAX_RESULT).reshape(
+        categories.shape + (1,) * len(shape)
+    )
+    return rng.binomial(
+        MAX_RESULT, np.broadcast_to(probabilities, categories.shape + shape)
+    ).astype(np.uint8)
+
+
+def generate_study(
+    num_containers,
+    distribution=None,
+    inspectors=INSPECTORS,
+    seed=None,
+    passes=False,
+):
+    """
+    Generate a study of random but consistent results.
+
+    Parameters:
+        num_containers (int): Number of containers.
+        distribution (list): Weight of each true category from 0 to 10,
+            defaults to DEFAULT_DISTRIBUTION.
+        inspectors (int): Number of inspectors.
+        seed (int): Seed of the random generator, None for a random study.
+        passes (bool): Record every inspection pass instead of only the
+            reject count of each inspector.
+
+    Returns:
+        Study: The study.
+    """
+    rng = np.random.default_rng(seed)
+    categories = rng.choice(
+        MAX_RESULT + 1, num_containers, p=category_probabilities(distribution)
+    ).astype(np.uint8)
+    if passes:
+        probabilities = (categories / MAX_RESULT)[:, np.newaxis, np.newaxis]
+        inspections = (
+            rng.random((num_containers, inspectors, PASSES)) < probabilities
+        ).astype(np.uint8)
+    else:
+        inspections = reject_counts(rng, categories, (inspectors,))
+    return Study(
+        fqv_from_inspections(inspections),
+        reject_counts(rng, categories),
+        inspections,
+        num_containers=num_containers,
+    )
+
+
+def generate_cameras(machine, cameras, seed=None):
+    """
+    Generate per-camera results that add up to the machine results.
+
+    Parameters:
+        machine (numpy.ndarray): FQA value per container.
+        cameras (int): Number of cameras.
+        seed (int): Seed of the random generator.
+
+    Returns:
+        numpy.ndarray: uint8 array (containers, cameras).
+    """
+    rng = np.random.default_rng(seed)
+    return rng.multinomial(
+        machine.astype(np.int64), np.full(cameras, 1 / cameras)
+    ).astype(np.uint8)
+
+
+def run_xml(machine, first_spindle=1, spindles=SPINDLES, cameras=None):
+    """
+    Format machine results as the text of a KnappRun xml file.
+
+    Parameters:
+        machine (numpy.ndarray): FQA value of each sample in the run.
+        first_spindle (int): Spindle of the first sample.
+        spindles (int): Number of spindles on the machine.
+        cameras (numpy.ndarray): Per-camera results (samples, cameras).
+
+    Yields:
+        str: Consecutive parts of the file.
+    """
+    yield "<Knapp><Header/><ParticlesInspection>"
+    spindle = (np.arange(len(machine)) + first_spindle - 1) % spindles + 1
+    for start in range(0, len(machine), XML_CHUNK_SIZE):
+        stop = start + XML_CHUNK_SIZE
+        columns = [spindle[start:stop].tolist(), machine[start:stop].tolist()]
+        template = "<Sample><Spindle>{}</Spindle><TotReject>{}</TotReject>"
+        if cameras is not None:
+            columns.extend(cameras[start:stop].T.tolist())
+            template += "".join(
+                f"<Cam{camera}>{{}}</Cam{camera}>"
+                for camera in range(1, cameras.shape[1] + 1)
+            )
+        template += "</Sample>"
+        yield "".join(template.format(*values) for values in zip(*columns))
+    yield "</ParticlesInspection></Knapp>"
+
+
+def write_runs(
+    directory, machine, spindles=SPINDLES, cameras=0, date="20240101", seed=None
+):
+    """
+    Write machine results as KnappRun xml files, one file per run.
+
+    Each run holds one sample per spindle, so run N covers the containers
+    from (N - 1) * spindles + 1.
+
+    Parameters:
+        directory (str): Directory for the files.
+        machine (numpy.ndarray): FQA value per container.
+        spindles (int): Containers per run.
+        cameras (int): Number of CamN values written per sample.
+        date (str): Date part of the file names.
+        seed (int): Seed of the per-camera results.
+
+    Returns:
+        list: Paths of the files written.
+    """
+    camera_results = generate_cameras(machine, cameras, seed) if cameras else None
+    paths = []
+    for run, start in enumerate(range(0, len(machine), spindles), 1):
+        path = os.path.join(directory, f"KnappRun_{run}_{date}.xml")
+        with open(path, "w") as fp:
+            fp.writelines(
+                run_xml(
+                    machine[start : start + spindles],
+                    spindles=spindles,
+                    cameras=(
+                        None
+                        if camera_results is None
+                        else camera_results[start : start + spindles]
+                    ),
+                )
+            )
+        paths.append(path)
+    return paths
+
+
+def write_fqv_xml(file_path, manual):
+    """
+    Write FQV results as an xml file of Sample/Manual elements.
+
+    Parameters:
+        file_path (str): Path to the xml file.
+        manual (numpy.ndarray): FQV value per container.
+    """
+    with open(file_path, "w") as fp:
+        fp.write("<Study>")
+        for start in range(0, len(manual), XML_CHUNK_SIZE):
+            fp.write(
+                "".join(
+                    f"<Sample><Manual>{value}</Manual></Sample>"
+                    for value in manual[start : start + XML_CHUNK_SIZE].tolist()
+                )
+            )
+        fp.write("</Study>")
+
+
+def inspection_results(study):
+    return study.inspections if study.passes is None else study.passes
+
+
+def write_study(
+    directory,
+    study,
+    formats=FORMATS,
+    spindles=SPINDLES,
+    cameras=0,
+    seed=None,
+):
+    """
+    Write a study in each of the requested formats.
+
+    Parameters:
+        directory (str): Directory for the files, created if needed.
+        study (Study): The study to write.
+        formats (list): Any of "pkl", "xml", "csv", "kfqv" and "runs".
+        spindles (int): Containers per KnappRun file.
+        cameras (int): Number of CamN values written per sample.
+        seed (int): Seed of the per-camera results.
+
+    Returns:
+        dict: Paths written for each format, a list of paths for "runs".
+    """
+    os.makedirs(directory, exist_ok=True)
+    paths = {}
+    if "pkl" in formats:
+        paths["pkl"] = os.path.join(directory, "fqv.pkl")
+        write_pickle_file(paths["pkl"], array_to_results(study.manual))
+        paths["inspections_pkl"] = os.path.join(directory, "inspections.pkl")
+        write_pickle_file(
+            paths["inspections_pkl"], array_to_results(inspection_results(study))
+        )
+    if "xml" in formats:
+        paths["xml"] = os.path.join(directory, "fqv.xml")
+        write_fqv_xml(paths["xml"], study.manual)
+    if "csv" in formats:
+        paths["csv"] = os.path.join(directory, "inspections.csv")
+        write_inspections_csv(
+            paths["csv"],
+            study.inspections if study.passes is None else study.passes,
+        )
+    if "kfqv" in formats:
+        paths["kfqv"] = os.path.join(directory, "study.kfqv")
+        write_study_file(paths["kfqv"], study)
+    if "runs" in formats:
+        paths["runs"] = write_runs(
+            directory, study.machine, spindles, cameras, seed=seed
+        )
+    return paths
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog="python -m knapp.generate",
+        description="Generate a synthetic Knapp study.",
+    )
+    parser.add_argument("directory", help="directory for the generated files")
+    size = parser.add_mutually_exclusive_group()
+    size.add_argument("--containers", type=int, help="number of containers")
+    size.add_argument("--runs", type=int, help="number of runs of --spindles")
+    parser.add_argument(
+        "--spindles",
+        type=int,
+        default=SPINDLES,
+        help="containers per KnappRun file, load them with the same layout",
+    )
+    parser.add_argument(
+        "--cameras", type=int, default=0, help="CamN values per KnappRun sample"
+    )
+    parser.add_argument("--inspectors", type=int, default=INSPECTORS)
+    parser.add_argument(
+        "--distribution",
+        type=float,
+        nargs=MAX_RESULT + 1,
+        metavar="W",
+        help="weights of the true categories 0 to 10",
+    )
+    parser.add_argument("--seed", type=int)
+    parser.add_argument(
+        "--passes",
+        action="store_true",
+        help="record every inspection pass rather than reject counts",
+    )
+    parser.add_argument("--formats", nargs="+", choices=FORMATS, default=FORMATS)
+    args = parser.parse_args(argv)
+
+    if args.runs is not None:
+        num_containers = args.runs * args.spindles
+    else:
+        num_containers = args.containers or CONTAINER_END
+    try:
+        study = generate_study(
+            num_containers, args.distribution, args.inspectors, args.seed, args.passes
+        )
+    except ValueError as error:
+        parser.error(str(error))
+    paths = write_study(
+        args.directory, study, args.formats, args.spindles, args.cameras, args.seed
+    )
+    for name, path in paths.items():
+        count = f"{len(path)} files" if isinstance(path, list) else path
+        print(f"{name}: {count}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
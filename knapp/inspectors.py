@@ -0,0 +1,197 @@
+"""
+Qualify inspectors from the containers × inspectors inspection matrix.
+
+Each inspector is rated on how often they reject and how well their zones
+agree with the other inspectors. Agreement is Cohen's kappa for every pair
+of inspectors and Fleiss' kappa for the whole group, both over the accept,
+grey and reject zones of the containers every inspector inspected. An
+inspector is flagged as an outlier when their reject rate, or their mean
+kappa with the others, lies more than OUTLIER_Z standard deviations from
+the rest of the group. The mean and standard deviation leave the inspector
+out, so a single outlier does not hide itself by widening the spread.
+"""
+
+import csv
+import numpy as np
+from knapp.study import MAX_RESULT, NOT_INSPECTED, fqv_from_inspections
+from knapp.zones import ZONE_NAMES, ZONE_TABLE, zones
+
+OUTLIER_Z = 2.0
+REPORT_HEADERS = [
+    "Inspector",
+    "Containers",
+    "Reject rate (%)",
+    "Mean kappa",
+    "Reject rate z",
+    "Kappa z",
+    "Outlier",
+]
+
+
+def kappa(observed, expected):
+    """
+    Return Cohen's kappa, 1 where chance agreement is already perfect.
+    """
+    observed = np.asarray(observed, dtype=np.float64)
+    expected = np.asarray(expected, dtype=np.float64)
+    chance = 1 - expected
+    return np.divide(
+        observed - expected,
+        chance,
+        out=np.ones_like(chance),
+        where=chance > 0,
+    )
+
+
+def leave_one_out_z(values):
+    """
+    Return how far each value lies from the others in standard deviations.
+
+    Parameters:
+        values (numpy.ndarray): One value per inspector.
+
+    Returns:
+        numpy.ndarray: z-score of each value against the mean and sample
+            standard deviation of the other values, 0 where the others do not
+            vary or there are fewer than three values.
+    """
+    values = np.asarray(values, dtype=np.float64)
+    count = len(values)
+    if count < 3:
+        return np.zeros(count)
+    others = count - 1
+    mean = (values.sum() - values) / others
+    squares = (np.square(values).sum() - np.square(values)) / others
+    spread = np.sqrt(np.maximum(squares - np.square(mean), 0) * others / (others - 1))
+    return np.divide(
+        values - mean,
+        spread,
+        out=np.zeros(count),
+        where=spread > 1e-12,
+    )
+
+
+def analyse_inspectors(inspections, table=ZONE_TABLE, outlier_z=OUTLIER_Z):
+    """
+    Work out the qualification figures of every inspector in one pass.
+
+    Parameters:
+        inspections (numpy.ndarray): Inspection matrix (containers, inspectors).
+        table (numpy.ndarray): Zone of each value, from knapp.zones.zone_table.
+        outlier_z (float): z-score beyond which an inspector is an outlier.
+
+    Returns:
+        dict: Arrays with one entry per inspector unless noted:
+            inspected: containers the inspector has a result for.
+            reject_rates: % of the inspector's passes that rejected.
+            pairwise_kappa: Cohen's kappa of every pair (inspectors, inspectors).
+            mean_kappa: mean Cohen's kappa with the other inspectors.
+            fleiss_kappa: Fleiss' kappa of the whole group (float).
+            complete: containers every inspector inspected (int).
+            reject_rate_z, kappa_z: leave-one-out z-scores.
+            outliers: whether the inspector is an outlier.
+            fqv: FQV per container.
+    """
+    inspections = np.asarray(inspections)
+    num_inspectors = inspections.shape[1]
+    inspected = inspections != NOT_INSPECTED
+    counts = inspected.sum(axis=0)
+    rejects = np.where(inspected, inspections, 0).sum(axis=0, dtype=np.int64)
+    reject_rates = np.divide(
+        rejects * 100.0,
+        counts * MAX_RESULT,
+        out=np.zeros(num_inspectors),
+        where=counts > 0,
+    )
+
+    # One-hot zones of the containers every inspector inspected.
+    complete = inspected.all(axis=1)
+    num_complete = int(complete.sum())
+    one_hot = np.eye(len(ZONE_NAMES))[zones(inspections[complete], table)]
+    shares = one_hot.mean(axis=0) if num_complete else one_hot.sum(axis=0)
+
+    observed = np.einsum("nia,nja->ij", one_hot, one_hot) / max(num_complete, 1)
+    pairwise_kappa = kappa(observed, shares @ shares.T)
+    others = ~np.eye(num_inspectors, dtype=bool)
+    mean_kappa = (
+        (pairwise_kappa * others).sum(axis=1) / (num_inspectors - 1)
+        if num_inspectors > 1
+        else np.ones(num_inspectors)
+    )
+
+    raters = one_hot.sum(axis=1)
+    pair_agreement = (np.square(raters).sum(axis=1) - num_inspectors) / max(
+        num_inspectors * (num_inspectors - 1), 1
+    )
+    zone_shares = shares.mean(axis=0)
+    fleiss_kappa = float(
+        kappa(
+            pair_agreement.mean() if num_complete else 0.0,
+            np.square(zone_shares).sum(),
+        )
+    )
+
+    reject_rate_z = leave_one_out_z(reject_rates)
+    kappa_z = leave_one_out_z(mean_kappa)
+    return {
+        "inspected": counts,
+        "reject_rates": reject_rates,
+        "pairwise_kappa": pairwise_kappa,
+        "mean_kappa": mean_kappa,
+        "fleiss_kappa": fleiss_kappa,
+        "complete": num_complete,
+        "reject_rate_z": reject_rate_z,
+        "kappa_z": kappa_z,
+        "outliers": (np.abs(reject_rate_z) > outlier_z) | (kappa_z < -outlier_z),
+        "fqv": fqv_from_inspections(inspections),
+    }
+
+
+def report_rows(analysis, names=None):
+    """
+    Format the per-inspector figures of an analysis as table rows.
+
+    Parameters:
+        analysis (dict): Result of analyse_inspectors.
+        names (list): Name of each inspector, defaults to "Inspector N".
+
+    Returns:
+        list: One list of texts per inspector, in REPORT_HEADERS order.
+    """
+    count = len(analysis["inspected"])
+    names = names or [f"Inspector {i}" for i in range(1, count + 1)]
+    return [
+        [
+            name,
+            str(inspected),
+            f"{rate:.2f}",
+            f"{mean_kappa:.3f}",
+            f"{rate_z:.2f}",
+            f"{kappa_z:.2f}",
+            "Yes" if outlier else "No",
+        ]
+        for name, inspected, rate, mean_kappa, rate_z, kappa_z, outlier in zip(
+            names,
+            analysis["inspected"].tolist(),
+            analysis["reject_rates"].tolist(),
+            analysis["mean_kappa"].tolist(),
+            analysis["reject_rate_z"].tolist(),
+            analysis["kappa_z"].tolist(),
+            analysis["outliers"].tolist(),
+        )
+    ]
+
+
+def write_inspector_report(file_path, analysis, names=None):
+    """
+    Write the per-inspector figures of an analysis to a csv file.
+
+    Parameters:
+        file_path (str): Path to the csv file.
+        analysis (dict): Result of analyse_inspectors.
+        names (list): Name of each inspector, defaults to "Inspector N".
+    """
+    with open(file_path, "w") as csvfile:
+        writer = csv.writer(csvfile, dialect="excel", lineterminator="\n")
+        writer.writerow(REPORT_HEADERS)
+        writer.writerows(report_rows(analysis, names))
@@ -0,0 +1,209 @@
+"""
+Machine layouts mapping KnappRun files to the containers they inspected.
+
+A Knapp machine inspects one container per spindle in every run, so run N
+of a machine with S spindles covers the containers from (N - 1) * S + 1.
+The layout of a machine is its spindle count, optionally the number of runs
+in a set and the pattern its run files are named with.
+"""
+
+import os
+import re
+import numpy as np
+from knapp.study import CONTAINER_START
+
+DEFAULT_SPINDLES = 24
+# Spindle counts of the machines in use, offered as choices in the GUI.
+SPINDLE_CHOICES = [20, 24, 40, 48]
+RUN_PATTERN = re.compile(r"KnappRun_(\d+)_")
+
+
+class MachineLayout:
+    """
+    Spindles, runs and run file naming of a machine.
+
+    The first container of every run is worked out once into an offset
+    index, so mapping any number of run files to containers is a single
+    pass over their names.
+
+    Attributes:
+        spindles (int): Containers inspected per run.
+        runs (int): Runs in a set, None if the set has no fixed size.
+        pattern (re.Pattern): Pattern of the run file names, its first group
+            is the run number.
+        offsets (numpy.ndarray): Index of the first container of each run,
+            by run number, when runs is set.
+    """
+
+    def __init__(self, spindles=DEFAULT_SPINDLES, runs=None, pattern=RUN_PATTERN):
+        if int(spindles) < 1:
+            raise ValueError(f"A machine needs at least one spindle, got {spindles}")
+        if runs is not None and int(runs) < 1:
+            raise ValueError(f"A set needs at least one run, got {runs}")
+        self.spindles = int(spindles)
+        self.runs = None if runs is None else int(runs)
+        self.pattern = re.compile(pattern)
+        if self.pattern.groups < 1:
+            raise ValueError("The run file pattern needs a group for the run number")
+        self.offsets = None
+        if self.runs is not None:
+            # Run numbers start at 1, the unused first entry keeps the index
+            # a plain lookup by run number.
+            self.offsets = np.arange(-1, self.runs) * self.spindles
+
+    def __repr__(self):
+        return (
+            f"MachineLayout(spindles={self.spindles}, runs={self.runs}, "
+            f"pattern={self.pattern.pattern!r})"
+        )
+
+    def __eq__(self, other):
+        return isinstance(other, MachineLayout) and self.to_dict() == other.to_dict()
+
+    @classmethod
+    def parse(cls, profile):
+        """
+        Create a layout from a profile such as "48" or "48x11".
+
+        Parameters:
+            profile (str): Spindles, optionally followed by x and the runs
+                in a set.
+
+        Returns:
+            MachineLayout: The layout.
+
+        Raises:
+            ValueError: If the profile cannot be read.
+        """
+        match = re.fullmatch(r"\s*(\d+)\s*(?:[xX]\s*(\d+))?\s*", str(profile))
+        if not match:
+            raise ValueError(f"Expected SPINDLES or SPINDLESxRUNS, got {profile!r}")
+        return cls(int(match.group(1)), match.group(2) and int(match.group(2)))
+
+    @classmethod
+    def from_dict(cls, profile):
+        """
+        Create a layout from a dictionary of its attributes.
+
+        Parameters:
+            profile (dict): spindles and optionally runs and pattern, as
+                written by to_dict.
+
+        Returns:
+            MachineLayout: The layout.
+        """
+        return cls(
+            profile.get("spindles", DEFAULT_SPINDLES),
+            profile.get("runs"),
+            profile.get("pattern", RUN_PATTERN),
+        )
+
+    def to_dict(self):
+        return {
+            "spindles": self.spindles,
+            "runs": self.runs,
+            "pattern": self.pattern.pattern,
+        }
+
+    @property
+    def num_containers(self):
+        """
+        Containers in a set, None if the set has no fixed number of runs.
+        """
+        return None if self.runs is None else self.runs * self.spindles
+
+    def run_number(self, file_path):
+        """
+        Return the run number of a run file from its name.
+
+        Parameters:
+            file_path (str): Path to the machine results file.
+
+        Returns:
+            int: The run number, or None if the name does not match.
+        """
+        match = self.pattern.search(os.path.basename(file_path))
+        return int(match.group(1)) if match else None
+
+    def has_run(self, run):
+        return run >= 1 and (self.runs is None or run <= self.runs)
+
+    def first_container(self, run):
+        """
+        Return the number of the first container of a run.
+
+        Parameters:
+            run (int): The run number.
+
+        Returns:
+            int: The container number.
+
+        Raises:
+            ValueError: If the run is not part of the layout.
+        """
+        if not self.has_run(run):
+            raise ValueError(f"Run {run} is outside a layout of {self.runs} runs")
+        if self.offsets is not None:
+            return CONTAINER_START + int(self.offsets[run])
+        return CONTAINER_START + (run - 1) * self.spindles
+
+    def check_runs(self, file_paths):
+        """
+        Find the runs missing from, repeated in or outside a set of files.
+
+        Runs are missing if they come before the last run given, or up to
+        the layout's runs when it has a fixed number.
+
+        Parameters:
+            file_paths (list): Paths to the run files of a set. Files that
+                are not run files are ignored.
+
+        Returns:
+            dict: Sorted run numbers that are "missing", "duplicate" and
+                "outside" the layout.
+        """
+        runs = [self.run_number(file_path) for file_path in file_paths]
+        runs = np.array([run for run in runs if run is not None], dtype=np.int64)
+        last = self.runs if self.runs is not None else runs.max(initial=0)
+        counts = np.bincount(runs, minlength=last + 1)
+        return {
+            "missing": (np.flatnonzero(counts[1 : last + 1] == 0) + 1).tolist(),
+            "duplicate": np.flatnonzero(counts > 1).tolist(),
+            "outside": np.unique(runs[(runs < 1) | (runs > last)]).tolist(),
+        }
+
+    def validate_runs(self, file_paths):
+        """
+        Check a set of run files is complete, one file per run.
+
+        Parameters:
+            file_paths (list): Paths to the run files of a set.
+
+        Raises:
+            ValueError: Naming the runs that are missing, repeated or
+                outside the layout.
+        """
+        message = run_problems(self.check_runs(file_paths))
+        if message:
+            raise ValueError(message)
+
+
+def run_problems(check):
+    """
+    Describe the problems found by MachineLayout.check_runs.
+
+    Parameters:
+        check (dict): Result of check_runs.
+
+    Returns:
+        str: One sentence per kind of problem, empty if there are none.
+    """
+    problems = []
+    for key, text in (
+        ("missing", "Missing runs"),
+        ("duplicate", "Runs loaded more than once"),
+        ("outside", "Runs outside the machine layout"),
+    ):
+        if check[key]:
+            problems.append(f"{text}: {', '.join(map(str, check[key]))}.")
+    return " ".join(problems)
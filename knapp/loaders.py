@@ -0,0 +1,671 @@
+import csv
+import multiprocessing
+import os
+import pickle
+import re
+import xml.etree.ElementTree as ET
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import numpy as np
+from knapp.layout import MachineLayout
+from knapp.storage import (
+    is_study_file,
+    is_study_pickle,
+    read_pickle_file,
+    read_study_file,
+    study_from_pickle,
+)
+from knapp.study import (
+    CONTAINER_START,
+    INSPECTORS,
+    PASSES,
+    Study,
+    counts_to_passes,
+    empty_passes,
+    empty_results,
+    fit_results,
+    fqv_from_inspections,
+    fqv_from_passes,
+    inspections_to_array,
+    passes_to_array,
+    results_to_array,
+    to_pass,
+    to_result,
+)
+
+
+class LoadCancelled(Exception):
+    """
+    Raised from a progress callback to stop a load part way through.
+    """
+
+
+PASS_HEADER = re.compile(r"Inspector (\d+) Pass (\d+)")
+# Tags from below the root to the Sample elements of FQV and inspection
+# files, and of KnappRun files.
+SAMPLE_PATH = ("Sample",)
+RUN_SAMPLE_PATH = ("ParticlesInspection", "Sample")
+
+
+def iterparse_elements(file_path, path):
+    """
+    Stream the elements found at a path of tags below the root of an xml file.
+
+    Only direct children are followed, so a Sample held by any other section
+    of the file, or nested inside another element, is not matched. Every
+    element outside a match is removed from the tree as soon as it closes,
+    and each match is removed once the caller moves on to the next, so the
+    parsed tree never grows beyond one match.
+
+    Parameters:
+        file_path (str): Path to the xml file.
+        path (tuple): Tags from the child of the root down to the elements,
+            e.g. ("ParticlesInspection", "Sample").
+
+    Yields:
+        xml.etree.ElementTree.Element: Each element at the path, complete,
+            in document order.
+    """
+    depth = len(path)
+    # (element, whether it and its ancestors follow the path) from the root.
+    stack = []
+    with open(file_path, "rb") as fp:
+        for event, element in ET.iterparse(fp, events=("start", "end")):
+            if event == "start":
+                level = len(stack)
+                on_path = level == 0 or (
+                    level <= depth and stack[-1][1] and element.tag == path[level - 1]
+                )
+                stack.append((element, on_path))
+                continue
+            _, on_path = stack.pop()
+            level = len(stack)
+            if level == 0:
+                continue
+            if on_path and level == depth:
+                yield element
+            elif level > depth and stack[depth][1]:
+                # Part of a match that is still open.
+                continue
+            element.clear()
+            stack[-1][0].remove(element)
+
+
+def iterparse_text(file_path, path, tag):
+    """
+    Stream the text of every tag element held directly by the elements at path.
+
+    Parameters:
+        file_path (str): Path to the xml file.
+        path (tuple): Tags from the child of the root down to the elements
+            holding the values, e.g. ("ParticlesInspection", "Sample").
+        tag (str): Tag of the value elements, e.g. "TotReject".
+
+    Yields:
+        str: The text of each matching element, in document order.
+    """
+    for element in iterparse_elements(file_path, path):
+        for value in element.iterfind(tag):
+            yield value.text
+
+
+def read_csv_inspections(file_path):
+    """
+    Read per-inspector results from a csv file with a header row.
+
+    Non-numeric values are read as 0.
+
+    Parameters:
+        file_path (str): Path to the csv file.
+
+    Returns:
+        list: List of inspector results for each container.
+    """
+    inspection_results = []
+    with open(file_path, "rt") as csvfile:
+        reader = csv.reader(csvfile)
+        next(reader)
+        for values in reader:
+            inspector_results = []
+            for value in values:
+                try:
+                    inspector_results.append(int(value))
+                except ValueError:
+                    inspector_results.append(0)
+            inspection_results.append(inspector_results)
+    return inspection_results
+
+
+def pass_columns(headers):
+    """
+    Find the inspector and pass of every "Inspector N Pass P" csv column.
+
+    Parameters:
+        headers (list): Header row of the csv file.
+
+    Returns:
+        list: (inspector, pass) numbers from 1 for each column, or None if
+            any header does not name a pass.
+    """
+    columns = [PASS_HEADER.fullmatch(header.strip()) for header in headers]
+    if not columns or not all(columns):
+        return None
+    return [(int(match[1]), int(match[2])) for match in columns]
+
+
+def read_csv_inspection_matrix(file_path):
+    """
+    Read per-inspector results from a csv file into an inspection matrix.
+
+    Files with "Inspector N Pass P" headers hold every pass and are read
+    into a pass array, other files hold a reject count per inspector.
+
+    Parameters:
+        file_path (str): Path to the csv file.
+
+    Returns:
+        numpy.ndarray: uint8 inspection matrix (containers, inspectors) or
+            pass array (containers, inspectors, passes).
+    """
+    with open(file_path, "rt") as csvfile:
+        columns = pass_columns(next(csv.reader(csvfile), []))
+    rows = read_csv_inspections(file_path)
+    if columns:
+        inspectors = max(inspector for inspector, _ in columns)
+        passes = empty_passes(len(rows), inspectors, max(run for _, run in columns))
+        for row, pass_results in enumerate(rows):
+            for (inspector, run), value in zip(columns, pass_results):
+                passes[row, inspector - 1, run - 1] = to_pass(value)
+        return passes
+    inspections = empty_results(len(rows), max(map(len, rows), default=0) or INSPECTORS)
+    for row, inspector_results in enumerate(rows):
+        values = [to_result(value) for value in inspector_results]
+        inspections[row, : len(values)] = values
+    return inspections
+
+
+def parse_inspection_xml(file_path):
+    """
+    Parse per-inspector results from Sample/Inspector xml elements.
+
+    Each Inspector element holds either its reject count or one Pass
+    element per inspection pass.
+
+    Parameters:
+        file_path (str): Path to the xml file.
+
+    Returns:
+        numpy.ndarray: uint8 inspection matrix (containers, inspectors) or
+            pass array (containers, inspectors, passes) if any inspector
+            has Pass elements, sized by the most Inspector and Pass elements
+            of any sample.
+    """
+    samples = [
+        [
+            [value.text for value in inspector.iterfind("Pass")] or inspector.text
+            for inspector in element.iterfind("Inspector")
+        ]
+        for element in iterparse_elements(file_path, SAMPLE_PATH)
+    ]
+    inspectors = max(map(len, samples), default=0) or INSPECTORS
+    if not any(isinstance(value, list) for sample in samples for value in sample):
+        inspections = empty_results(len(samples), inspectors)
+        for row, values in enumerate(samples):
+            values = [to_result(value) for value in values]
+            inspections[row, : len(values)] = values
+        return inspections
+    passes = max(
+        (
+            len(values)
+            for sample in samples
+            for values in sample
+            if isinstance(values, list)
+        ),
+        default=0,
+    )
+    passes = empty_passes(len(samples), inspectors, passes or PASSES)
+    for row, sample in enumerate(samples):
+        for inspector, values in enumerate(sample):
+            if isinstance(values, list):
+                values = [to_pass(value) for value in values]
+                passes[row, inspector, : len(values)] = values
+            else:
+                passes[row, inspector] = counts_to_passes(
+                    to_result(values), passes.shape[2]
+                )
+    return passes
+
+
+def is_pass_results(results):
+    """
+    Return whether a legacy dictionary holds lists of passes per inspector.
+    """
+    return any(
+        isinstance(value, list) and any(isinstance(item, list) for item in value)
+        for value in results.values()
+    )
+
+
+def parse_fqv(file_path):
+    """
+    Parse FQV results from a pickle, csv or xml file.
+
+    Pickle and csv files holding inspector results per container are
+    reduced to a single FQV per container with fqv_from_inspections. A
+    study pickle written by write_study_pickle gives the FQV of the study.
+
+    Parameters:
+        file_path (str): Path to the FQV results file.
+
+    Returns:
+        numpy.ndarray: uint8 FQV for each container in the file,
+            NOT_INSPECTED where the file has no result.
+    """
+    manual = empty_results(0)
+    if file_path.endswith(".pkl"):
+        try:
+            fqv = read_pickle_file(file_path)
+            if is_study_pickle(fqv):
+                manual = study_from_pickle(fqv).manual
+            elif is_pass_results(fqv):
+                manual = fqv_from_passes(passes_to_array(fqv))
+            elif any(isinstance(value, list) for value in fqv.values()):
+                manual = fqv_from_inspections(inspections_to_array(fqv))
+            else:
+                manual = results_to_array(fqv)
+        except (pickle.UnpicklingError, KeyError):
+            pass
+    elif file_path.endswith(".xml"):
+        try:
+            manual = np.array(
+                [
+                    to_result(text)
+                    for text in iterparse_text(file_path, SAMPLE_PATH, "Manual")
+                ],
+                dtype=np.uint8,
+            )
+        except KeyError:
+            pass
+    elif file_path.endswith(".csv"):
+        manual = fqv_from_inspections(read_csv_inspection_matrix(file_path))
+    return manual
+
+
+def load_fqv(file_path, num_containers=None, cache=None):
+    """
+    Load FQV results from a pickle, csv, xml or study file.
+
+    Parameters:
+        file_path (str): Path to the FQV results file.
+        num_containers (int): Number of containers in the set, defaults to
+            the number of containers in the file.
+        cache (ParseCache): Cache of parsed files, None always parses.
+
+    Returns:
+        numpy.ndarray: uint8 FQV per container, NOT_INSPECTED where the
+            file has no result.
+    """
+    if is_study_file(file_path):
+        manual = read_study_file(file_path).manual
+    elif cache:
+        manual = cache.load(parse_fqv, file_path)
+    else:
+        manual = parse_fqv(file_path)
+    if num_containers is not None:
+        manual = fit_results(manual, num_containers)
+    return manual
+
+
+def process_pool(max_workers):
+    """
+    Return a process pool whose workers are spawned rather than forked.
+
+    Forking copies a threaded process, such as one running a Qt thread pool,
+    with its locks in whatever state they are in. Spawned workers start a
+    fresh interpreter, which imports the main module of the caller and the
+    knapp modules of the functions they run, so the main module has to start
+    its work under if __name__ == "__main__", as main.py and the command
+    line tools do.
+
+    Parameters:
+        max_workers (int): Number of worker processes.
+
+    Returns:
+        concurrent.futures.ProcessPoolExecutor: The pool.
+    """
+    return ProcessPoolExecutor(
+        max_workers=max_workers, mp_context=multiprocessing.get_context("spawn")
+    )
+
+
+def run_number(file_path, layout=None):
+    """
+    Return the run number of a KnappRun file from its name.
+
+    Parameters:
+        file_path (str): Path to the machine results file.
+        layout (MachineLayout): Layout naming the run files, defaults to
+            KnappRun_N_ names.
+
+    Returns:
+        int: The run number, or None if the name has no KnappRun_N_ part.
+    """
+    return (layout or MachineLayout()).run_number(file_path)
+
+
+def parse_run_values(file_path, limit=None):
+    """
+    Parse the TotReject values of a KnappRun xml file.
+
+    A TotReject that is not a result is read as NOT_INSPECTED.
+
+    Parameters:
+        file_path (str): Path to the machine results file.
+        limit (int): Stop reading after this many values, None reads them all.
+
+    Returns:
+        numpy.ndarray: uint8 FQA of each sample in the file.
+    """
+    values = []
+    if limit is None or limit > 0:
+        for text in iterparse_text(file_path, RUN_SAMPLE_PATH, "TotReject"):
+            values.append(to_result(text))
+            if len(values) == limit:
+                break
+    return np.array(values, dtype=np.uint8)
+
+
+def read_machine_file(file_path, num_containers=None, cache=None, layout=None):
+    """
+    Read the TotReject values of a KnappRun xml file.
+
+    The run number in the file name decides which containers the samples
+    belong to, one container per spindle of the machine layout. A study file
+    or a study pickle written by write_study_pickle holds the machine
+    results of the whole set.
+
+    Parameters:
+        file_path (str): Path to the machine results file.
+        num_containers (int): Number of containers in the set, values past
+            the end of the set are dropped. None keeps every value.
+        cache (ParseCache): Cache of parsed files, None always parses.
+        layout (MachineLayout): Layout of the machine, defaults to 24
+            spindles.
+
+    Returns:
+        tuple: Number of the first container and the uint8 array of values,
+            or (None, empty array) when the file is not a KnappRun xml file
+            or study, or its run is outside the layout.
+    """
+    if is_study_file(file_path):
+        return 1, read_study_file(file_path).machine[:num_containers]
+    if file_path.endswith(".pkl"):
+        try:
+            data = read_pickle_file(file_path)
+        except pickle.UnpicklingError:
+            data = None
+        if not is_study_pickle(data):
+            return None, empty_results(0)
+        return 1, study_from_pickle(data).machine[:num_containers]
+    layout = layout or MachineLayout()
+    run = layout.run_number(file_path)
+    if not file_path.endswith(".xml") or not run or not layout.has_run(run):
+        return None, empty_results(0)
+    first_container = layout.first_container(run)
+    limit = None
+    if num_containers is not None:
+        limit = max(num_containers - first_container + 1, 0)
+    if cache:
+        values = cache.load(parse_run_values, file_path)[:limit]
+    else:
+        values = parse_run_values(file_path, limit)
+    return first_container, values
+
+
+def merge_machine_values(machine, first_container, values):
+    """
+    Write the values of a single run into the machine results.
+
+    Values past the end of the machine array are dropped.
+
+    Parameters:
+        machine (numpy.ndarray): FQA array updated with the results.
+        first_container (int): Number of the container of the first value.
+        values (numpy.ndarray): FQA values of the run.
+
+    Returns:
+        numpy.ndarray: The updated machine results.
+    """
+    start = first_container - CONTAINER_START
+    values = values[: max(len(machine) - start, 0)]
+    machine[start : start + len(values)] = values
+    return machine
+
+
+def load_machine_file(file_path, machine):
+    """
+    Load machine inspection results from a KnappRun xml file.
+
+    Parameters:
+        file_path (str): Path to the machine results file.
+        machine (numpy.ndarray): FQA array updated with the results.
+
+    Returns:
+        numpy.ndarray: The updated machine results.
+    """
+    first_container, values = read_machine_file(file_path, len(machine))
+    if first_container is not None:
+        merge_machine_values(machine, first_container, values)
+    return machine
+
+
+def load_machine_results(
+    file_paths,
+    max_workers=None,
+    num_containers=None,
+    cache=None,
+    progress=None,
+    layout=None,
+    validate=False,
+):
+    """
+    Load machine inspection results from one or more KnappRun xml files.
+
+    When more than one file is given they are parsed in parallel on a
+    process pool of spawned workers (see process_pool) and merged in run
+    order, so a repeated run selected later overrides the earlier one
+    unless validate is set. The GUI loads its files the same way from its
+    loader thread.
+
+    Parameters:
+        file_paths (list): Paths to the machine results files.
+        max_workers (int): Number of worker processes, 1 parses the files
+            one after another on the calling thread. Defaults to one per
+            file up to the number of CPUs.
+        num_containers (int): Number of containers in the set, defaults to
+            the containers of the layout or else the last container covered
+            by the runs.
+        cache (ParseCache): Cache of parsed files, None always parses.
+        progress (function): Called with (files done, total files) after
+            each file. Raising LoadCancelled from it stops the load and
+            drops the files that have not started yet.
+        layout (MachineLayout): Layout of the machine, defaults to 24
+            spindles.
+        validate (bool): Check there is exactly one file per run first.
+
+    Returns:
+        numpy.ndarray: uint8 FQA per container, NOT_INSPECTED where no run
+            covers the container.
+
+    Raises:
+        ValueError: If validate is set and runs are missing, repeated or
+            outside the layout. Otherwise runs outside the layout are
+            dropped.
+    """
+    file_paths = list(file_paths)
+    layout = layout or MachineLayout()
+    if validate:
+        layout.validate_runs([path for path in file_paths if not is_study_file(path)])
+    if num_containers is None:
+        num_containers = layout.num_containers
+    if max_workers is None:
+        max_workers = min(len(file_paths), os.cpu_count() or 1)
+    runs = [None] * len(file_paths)
+    if max_workers > 1:
+        executor = process_pool(max_workers)
+        try:
+            futures = {}
+            for index, file_path in enumerate(file_paths):
+                future = executor.submit(
+                    read_machine_file, file_path, num_containers, cache, layout
+                )
+                futures[future] = index
+            for done, future in enumerate(as_completed(futures), 1):
+                runs[futures[future]] = future.result()
+                if progress:
+                    progress(done, len(file_paths))
+        finally:
+            executor.shutdown(cancel_futures=True)
+    else:
+        for index, file_path in enumerate(file_paths):
+            runs[index] = read_machine_file(file_path, num_containers, cache, layout)
+            if progress:
+                progress(index + 1, len(file_paths))
+
+    runs = sorted((run for run in runs if run[0] is not None), key=lambda run: run[0])
+    if num_containers is None:
+        num_containers = max(
+            (first_container + len(values) - 1 for first_container, values in runs),
+            default=0,
+        )
+    machine = empty_results(num_containers)
+    for first_container, values in runs:
+        merge_machine_values(machine, first_container, values)
+    return machine
+
+
+def parse_manual_inspection_data(file_path):
+    """
+    Parse manual inspection data from a pickle, csv or xml file.
+
+    Pickle files holding a single value per container are expanded to one
+    value for each of the five inspectors. Files holding every pass are
+    read into a pass array, and a study pickle written by write_study_pickle
+    gives the inspections of the study.
+
+    Parameters:
+        file_path (str): Path to the manual inspection data file.
+
+    Returns:
+        numpy.ndarray: uint8 inspection matrix (containers, inspectors) or
+            pass array (containers, inspectors, passes).
+    """
+    inspections = empty_results(0, INSPECTORS)
+    if file_path.endswith(".pkl"):
+        try:
+            results = read_pickle_file(file_path)
+            if is_study_pickle(results):
+                study = study_from_pickle(results)
+                inspections = (
+                    study.inspections if study.passes is None else study.passes
+                )
+            elif is_pass_results(results):
+                inspections = passes_to_array(results)
+            else:
+                inspections = inspections_to_array(results)
+        except (pickle.UnpicklingError, KeyError):
+            pass
+    elif file_path.endswith(".csv"):
+        inspections = read_csv_inspection_matrix(file_path)
+    elif file_path.endswith(".xml"):
+        try:
+            inspections = parse_inspection_xml(file_path)
+        except ET.ParseError:
+            pass
+    return inspections
+
+
+def load_manual_inspection_data(file_path, num_containers=None, cache=None):
+    """
+    Load manual inspection data from a pickle, csv, xml or study file.
+
+    Parameters:
+        file_path (str): Path to the manual inspection data file.
+        num_containers (int): Number of containers in the set, defaults to
+            the number of containers in the file.
+        cache (ParseCache): Cache of parsed files, None always parses.
+
+    Returns:
+        numpy.ndarray: uint8 inspection matrix (containers, inspectors) or
+            pass array (containers, inspectors, passes).
+    """
+    if is_study_file(file_path):
+        study = read_study_file(file_path)
+        inspections = study.inspections if study.passes is None else study.passes
+    elif cache:
+        inspections = cache.load(parse_manual_inspection_data, file_path)
+    else:
+        inspections = parse_manual_inspection_data(file_path)
+    if num_containers is not None:
+        inspections = fit_results(inspections, num_containers)
+    return inspections
+
+
+def load_study(
+    fqv_path=None,
+    machine_paths=(),
+    inspection_path=None,
+    num_containers=None,
+    cache=None,
+    progress=None,
+    max_workers=None,
+    layout=None,
+    validate=False,
+):
+    """
+    Load a study from its FQV, machine and manual inspection files.
+
+    Parameters:
+        fqv_path (str): Path to the FQV results file.
+        machine_paths (list): Paths to the KnappRun xml files.
+        inspection_path (str): Path to the manual inspection data file.
+        num_containers (int): Number of containers in the set, defaults to
+            the containers in the FQV file.
+        cache (ParseCache): Cache of parsed files, None always parses.
+        progress (function): Called with (files done, total files) after
+            each file. Raising LoadCancelled from it stops the load.
+        max_workers (int): Worker processes parsing the machine results,
+            see load_machine_results.
+        layout (MachineLayout): Layout of the machine, defaults to 24
+            spindles.
+        validate (bool): Check there is exactly one KnappRun file per run.
+
+    Returns:
+        Study: The loaded study.
+    """
+    machine_paths = list(machine_paths)
+    total = bool(fqv_path) + len(machine_paths) + bool(inspection_path)
+    done = 0
+
+    def report(files):
+        if progress:
+            progress(done + files, total)
+
+    manual = machine = inspections = None
+    if fqv_path:
+        manual = load_fqv(fqv_path, cache=cache)
+        report(1)
+        done += 1
+    if machine_paths:
+        machine = load_machine_results(
+            machine_paths,
+            max_workers,
+            cache=cache,
+            progress=lambda files, _: report(files),
+            layout=layout,
+            validate=validate,
+        )
+        done += len(machine_paths)
+    if inspection_path:
+        inspections = load_manual_inspection_data(inspection_path, cache=cache)
+        report(1)
+    return Study(manual, machine, inspections, num_containers=num_containers)
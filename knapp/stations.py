@@ -0,0 +1,639 @@
+"""
+Per-spindle and per-station reject analytics across many machine runs.
+
+Every Sample of a KnappRun file records the spindle that held the container,
+its TotReject and, for each inspection station, the rejects of that camera
+(Cam1, Cam2, ...). The samples of any number of runs and studies are kept
+in a SampleTable, one column per field, so the figures below are a few
+vectorised passes however many runs are loaded:
+
+- the reject rate of each spindle against the other spindles,
+- the reject rate of each spindle at each camera against the other
+  spindles at that camera, which shows a spindle misaligned at one station,
+- the reject rate of each camera in each study (or run) against the same
+  camera in the other studies, which shows a station drifting over time.
+
+A spindle or camera deviates when its mean rejects per sample lie more than
+DEVIATION_Z standard errors from the median of its peers. Samples are the
+unit, so the repeated passes over one container do not count as independent
+evidence, and the median keeps a few deviating peers from moving the
+baseline.
+
+Usage:
+    python -m knapp.stations [DIRECTORY ...] [--table FILE ...] [--save FILE]
+        [--csv FILE] [--layout SPINDLES[xRUNS]] [--drift-by study|run]
+        [--z Z] [--workers N]
+
+Saving the samples read with --save and passing the file to --table later
+skips parsing the runs again, e.g. to add the runs of new studies to the
+history of a machine.
+"""
+
+import argparse
+import csv
+import os
+import re
+import sys
+import numpy as np
+from knapp.batch import find_study_files
+from knapp.layout import MachineLayout
+from knapp.loaders import RUN_SAMPLE_PATH, iterparse_elements, process_pool
+from knapp.study import MAX_RESULT, NOT_INSPECTED
+
+# High because every spindle, camera and period is tested, which would
+# otherwise flag a few of them by chance in any large history.
+DEVIATION_Z = 4.0
+CAMERA_TAG = re.compile(r"Cam(\d+)$")
+# Columns of the arrays returned by parse_run_samples.
+SPINDLE_COLUMN = 0
+TOTAL_COLUMN = 1
+FIRST_CAMERA_COLUMN = 2
+DRIFT_PERIODS = ["study", "run"]
+REPORT_HEADERS = ["Unit", "Samples", "Reject rate (%)", "z", "Deviates"]
+
+
+def parse_run_samples(file_path):
+    """
+    Parse the spindle, TotReject and camera rejects of every sample of a
+    KnappRun xml file.
+
+    Parameters:
+        file_path (str): Path to the machine results file.
+
+    Returns:
+        numpy.ndarray: uint16 array (samples, 2 + cameras) holding the
+            spindle (0 where the file has none), the TotReject and the
+            rejects of Cam1, Cam2, ... of each sample, NOT_INSPECTED where a
+            value is missing or out of range.
+    """
+    # Column of each child tag of a Sample, None for tags that are skipped.
+    columns = {"Spindle": SPINDLE_COLUMN, "TotReject": TOTAL_COLUMN}
+    sample_columns = []
+    texts = []
+    counts = []
+    for element in iterparse_elements(file_path, RUN_SAMPLE_PATH):
+        count = len(texts)
+        for child in element:
+            column = columns.get(child.tag, -1)
+            if column == -1:
+                match = CAMERA_TAG.match(child.tag)
+                column = columns[child.tag] = (
+                    FIRST_CAMERA_COLUMN + int(match.group(1)) - 1
+                    if match and int(match.group(1)) > 0
+                    else None
+                )
+            if column is not None:
+                sample_columns.append(column)
+                texts.append(child.text)
+        counts.append(len(texts) - count)
+
+    try:
+        values = np.array(texts, dtype=str).astype(np.int64)
+    except ValueError:
+        values = np.array([to_int(text) for text in texts], dtype=np.int64)
+    width = max(column + 1 for column in columns.values() if column is not None)
+    array = np.full((len(counts), width), NOT_INSPECTED, np.uint16)
+    array[:, SPINDLE_COLUMN] = 0
+    rows = np.repeat(np.arange(len(counts)), counts)
+    sample_columns = np.array(sample_columns, dtype=np.int64)
+    valid = np.where(
+        sample_columns == SPINDLE_COLUMN,
+        values > 0,
+        (values >= 0) & (values <= MAX_RESULT),
+    )
+    array[rows[valid], sample_columns[valid]] = values[valid]
+    return array
+
+
+def to_int(text):
+    try:
+        return int(text)
+    except (TypeError, ValueError):
+        return -1
+
+
+def read_run_samples(file_path, cache=None):
+    if cache:
+        return cache.load(parse_run_samples, file_path)
+    return parse_run_samples(file_path)
+
+
+class SampleTable:
+    """
+    Columnar store of the samples of many machine runs.
+
+    Attributes:
+        spindle (numpy.ndarray): uint16 spindle of each sample.
+        total (numpy.ndarray): uint8 TotReject of each sample.
+        cameras (numpy.ndarray): uint8 (samples, cameras) rejects of each
+            camera, NOT_INSPECTED where a run has fewer cameras.
+        run (numpy.ndarray): int32 index in runs of the run of each sample.
+        runs (list): Name of each run, its study and file name.
+        run_study (numpy.ndarray): int32 index in studies of each run.
+        studies (list): Name of each study.
+    """
+
+    def __init__(self, spindle, total, cameras, run, runs, run_study, studies):
+        self.spindle = np.asarray(spindle, dtype=np.uint16)
+        self.total = np.asarray(total, dtype=np.uint8)
+        self.cameras = np.asarray(cameras, dtype=np.uint8).reshape(len(self.total), -1)
+        self.run = np.asarray(run, dtype=np.int32)
+        self.runs = list(runs)
+        self.run_study = np.asarray(run_study, dtype=np.int32)
+        self.studies = list(studies)
+
+    def __len__(self):
+        return len(self.total)
+
+    @property
+    def study(self):
+        """
+        Index in studies of the study of each sample.
+        """
+        return self.run_study[self.run]
+
+    @classmethod
+    def from_studies(
+        cls, studies, layout=None, cache=None, max_workers=None, progress=None
+    ):
+        """
+        Read the samples of the KnappRun files of one or more studies.
+
+        Samples without a Spindle element take the spindle of their place
+        in the run. The files are parsed on a process pool of spawned
+        workers, see knapp.loaders.process_pool.
+
+        Parameters:
+            studies (list): (name, run file paths) of each study.
+            layout (MachineLayout): Layout of the machine.
+            cache (ParseCache): Cache of parsed files, None always parses.
+            max_workers (int): Worker processes, 1 parses on the calling
+                thread. Defaults to one per CPU.
+            progress (function): Called with (files done, total files) as
+                the files are parsed. Raising LoadCancelled from it stops
+                reading.
+
+        Returns:
+            SampleTable: The samples of every run, in study and run order.
+        """
+        layout = layout or MachineLayout()
+        runs = [
+            (index, file_path)
+            for index, (_, file_paths) in enumerate(studies)
+            for file_path in sorted(
+                file_paths, key=lambda path: layout.run_number(path) or 0
+            )
+        ]
+        file_paths = [file_path for _, file_path in runs]
+        run_names = [
+            os.path.join(studies[index][0], os.path.basename(file_path))
+            for index, file_path in runs
+        ]
+        if max_workers is None:
+            max_workers = min(len(file_paths), os.cpu_count() or 1)
+        arrays = []
+        if max_workers > 1:
+            executor = process_pool(max_workers)
+            try:
+                for array in executor.map(
+                    read_run_samples,
+                    file_paths,
+                    [cache] * len(file_paths),
+                    chunksize=max(len(file_paths) // (4 * max_workers), 1),
+                ):
+                    arrays.append(array)
+                    if progress:
+                        progress(len(arrays), len(file_paths))
+            finally:
+                executor.shutdown(cancel_futures=True)
+        else:
+            for file_path in file_paths:
+                arrays.append(read_run_samples(file_path, cache))
+                if progress:
+                    progress(len(arrays), len(file_paths))
+
+        cameras = max((array.shape[1] for array in arrays), default=2)
+        samples = np.full(
+            (sum(len(array) for array in arrays), cameras), NOT_INSPECTED, np.uint16
+        )
+        start = 0
+        for array in arrays:
+            samples[start : start + len(array), : array.shape[1]] = array
+            spindles = samples[start : start + len(array), SPINDLE_COLUMN]
+            missing = spindles == 0
+            spindles[missing] = np.flatnonzero(missing) % layout.spindles + 1
+            start += len(array)
+        return cls(
+            samples[:, SPINDLE_COLUMN],
+            samples[:, TOTAL_COLUMN],
+            samples[:, FIRST_CAMERA_COLUMN:],
+            np.repeat(np.arange(len(arrays)), [len(array) for array in arrays]),
+            run_names,
+            [index for index, _ in runs],
+            [name for name, _ in studies],
+        )
+
+    @classmethod
+    def concatenate(cls, tables):
+        """
+        Join the samples of several tables, e.g. a saved table and new runs.
+
+        Parameters:
+            tables (list): The tables to join.
+
+        Returns:
+            SampleTable: One table with the runs and studies of all of them.
+        """
+        cameras = max((table.cameras.shape[1] for table in tables), default=0)
+        run_offsets = np.cumsum([0] + [len(table.runs) for table in tables])
+        study_offsets = np.cumsum([0] + [len(table.studies) for table in tables])
+        return cls(
+            np.concatenate([table.spindle for table in tables]),
+            np.concatenate([table.total for table in tables]),
+            np.concatenate(
+                [
+                    np.pad(
+                        table.cameras,
+                        ((0, 0), (0, cameras - table.cameras.shape[1])),
+                        constant_values=NOT_INSPECTED,
+                    )
+                    for table in tables
+                ]
+            ),
+            np.concatenate(
+                [table.run + offset for table, offset in zip(tables, run_offsets)]
+            ),
+            [run for table in tables for run in table.runs],
+            np.concatenate(
+                [
+                    table.run_study + offset
+                    for table, offset in zip(tables, study_offsets)
+                ]
+            ),
+            [study for table in tables for study in table.studies],
+        )
+
+    def save(self, file_path):
+        """
+        Write the table to an uncompressed .npz file.
+
+        Parameters:
+            file_path (str): Path to the file.
+        """
+        with open(file_path, "wb") as fp:
+            np.savez(
+                fp,
+                spindle=self.spindle,
+                total=self.total,
+                cameras=self.cameras,
+                run=self.run,
+                runs=np.array(self.runs, dtype=str),
+                run_study=self.run_study,
+                studies=np.array(self.studies, dtype=str),
+            )
+
+    @classmethod
+    def load(cls, file_path):
+        """
+        Read a table written by save.
+
+        Parameters:
+            file_path (str): Path to the file.
+
+        Returns:
+            SampleTable: The table.
+        """
+        with np.load(file_path) as arrays:
+            return cls(
+                arrays["spindle"],
+                arrays["total"],
+                arrays["cameras"],
+                arrays["run"],
+                arrays["runs"].tolist(),
+                arrays["run_study"],
+                arrays["studies"].tolist(),
+            )
+
+
+def group_sums(groups, values, num_groups):
+    """
+    Count, sum and sum the squares of the values of each group.
+
+    Values of NOT_INSPECTED are left out.
+
+    Parameters:
+        groups (numpy.ndarray): Group index of each value.
+        values (numpy.ndarray): The values.
+        num_groups (int): Number of groups.
+
+    Returns:
+        tuple: Count, sum and sum of squares arrays, one entry per group.
+    """
+    inspected = values != NOT_INSPECTED
+    groups = groups[inspected]
+    values = values[inspected].astype(np.float64)
+    return (
+        np.bincount(groups, minlength=num_groups),
+        np.bincount(groups, values, minlength=num_groups),
+        np.bincount(groups, np.square(values), minlength=num_groups),
+    )
+
+
+def reject_rates(counts, sums):
+    """
+    Return the % of passes rejected from the counts and sums of rejects.
+    """
+    return np.divide(
+        sums * 100.0,
+        counts * MAX_RESULT,
+        out=np.zeros(np.shape(counts)),
+        where=counts > 0,
+    )
+
+
+def median_z(counts, sums, squares):
+    """
+    Return how far the mean of each group lies from the median group.
+
+    The distance is in standard errors of the group's mean, taking the
+    variance of the values of all the groups together so that a small group
+    that happens not to vary is not flagged. The median of the group means
+    is the baseline so that several deviating groups, e.g. a station that
+    drifted for a sixth of the studies, do not shift it. Works along the
+    last axis, so each row of 2-D input is compared on its own.
+
+    Parameters:
+        counts, sums, squares (numpy.ndarray): From group_sums.
+
+    Returns:
+        numpy.ndarray: z of each group, 0 where it has no values, the values
+            do not vary or fewer than three groups have values.
+    """
+    counts = np.asarray(counts, dtype=np.float64)
+    mean = np.divide(sums, counts, out=np.zeros_like(counts), where=counts > 0)
+    total = [np.sum(array, axis=-1, keepdims=True) for array in (counts, sums, squares)]
+    variance = np.divide(
+        total[2] - np.square(total[1]) / np.maximum(total[0], 1),
+        total[0] - 1,
+        out=np.zeros_like(total[0]),
+        where=total[0] > 1,
+    )
+    error = np.sqrt(
+        np.divide(
+            np.maximum(variance, 0),
+            counts,
+            out=np.zeros_like(counts),
+            where=counts > 0,
+        )
+    )
+    baseline = np.ma.filled(
+        np.ma.median(
+            np.ma.masked_array(mean, mask=counts == 0), axis=-1, keepdims=True
+        ),
+        0,
+    )
+    enough = (counts > 0).sum(axis=-1, keepdims=True) >= 3
+    return np.divide(
+        mean - baseline,
+        error,
+        out=np.zeros_like(counts),
+        where=(error > 1e-12) & enough,
+    )
+
+
+def analyse_stations(table, deviation_z=DEVIATION_Z, drift_by="study"):
+    """
+    Work out the reject rates and deviations of every spindle and camera.
+
+    Parameters:
+        table (SampleTable): Samples of the runs to analyse.
+        deviation_z (float): z beyond which a spindle or camera deviates.
+        drift_by (str): Compare each camera across "study" or "run".
+
+    Returns:
+        dict: Arrays with one entry per spindle or camera unless noted:
+            samples, runs, studies: size of the table (int).
+            spindles, cameras: spindle and camera numbers.
+            spindle_samples, spindle_rates, spindle_z, spindle_deviates:
+                samples, % of passes rejected and z of each spindle
+                against the other spindles.
+            station_samples, station_rates, station_z, station_deviates:
+                the same for each spindle at each camera (cameras,
+                spindles), against the other spindles at that camera.
+            camera_samples, camera_rates: samples and % of passes rejected
+                of each camera.
+            periods: names of the studies or runs drift is measured over.
+            drift_samples, drift_rates, drift_z, drift_deviates: the same for each
+                camera in each period (cameras, periods), against the same
+                camera in the other periods.
+            camera_z, camera_deviates: the largest drift of each camera and
+                whether it drifted in any period.
+    """
+    if drift_by not in DRIFT_PERIODS:
+        raise ValueError(f"Unknown drift period {drift_by}")
+    spindles, spindle_index = np.unique(table.spindle, return_inverse=True)
+    spindle_sums = group_sums(spindle_index, table.total, len(spindles))
+    spindle_z = median_z(*spindle_sums)
+
+    num_cameras = table.cameras.shape[1]
+    camera_index = np.broadcast_to(np.arange(num_cameras), table.cameras.shape).ravel()
+    values = table.cameras.ravel()
+
+    def camera_sums(groups, num_groups):
+        # Group every camera value by camera and another column at once.
+        return [
+            array.reshape(num_cameras, num_groups)
+            for array in group_sums(
+                camera_index * num_groups + np.repeat(groups, num_cameras),
+                values,
+                num_cameras * num_groups,
+            )
+        ]
+
+    station_sums = camera_sums(spindle_index, len(spindles))
+    station_z = median_z(*station_sums)
+
+    if drift_by == "study":
+        period, periods = table.study, table.studies
+    else:
+        period, periods = table.run, table.runs
+    drift_sums = camera_sums(period, len(periods))
+    drift_z = median_z(*drift_sums)
+    drift_deviates = np.abs(drift_z) > deviation_z
+    camera_samples = drift_sums[0].sum(axis=1)
+    camera_z = np.zeros(num_cameras)
+    if len(periods):
+        camera_z = drift_z[np.arange(num_cameras), np.abs(drift_z).argmax(axis=1)]
+
+    return {
+        "samples": len(table),
+        "runs": len(table.runs),
+        "studies": len(table.studies),
+        "spindles": spindles,
+        "spindle_samples": spindle_sums[0],
+        "spindle_rates": reject_rates(*spindle_sums[:2]),
+        "spindle_z": spindle_z,
+        "spindle_deviates": np.abs(spindle_z) > deviation_z,
+        "station_samples": station_sums[0],
+        "station_rates": reject_rates(*station_sums[:2]),
+        "station_z": station_z,
+        "station_deviates": np.abs(station_z) > deviation_z,
+        "cameras": np.arange(1, num_cameras + 1),
+        "camera_samples": camera_samples,
+        "camera_rates": reject_rates(camera_samples, drift_sums[1].sum(axis=1)),
+        "periods": list(periods),
+        "drift_samples": drift_sums[0],
+        "drift_rates": reject_rates(*drift_sums[:2]),
+        "drift_z": drift_z,
+        "drift_deviates": drift_deviates,
+        "camera_z": camera_z,
+        "camera_deviates": drift_deviates.any(axis=1),
+    }
+
+
+def report_rows(analysis):
+    """
+    Format an analysis as table rows.
+
+    Every spindle and camera gets a row, the z of a camera being its
+    largest drift. They are followed by a row for each spindle deviating at
+    a camera and each camera in each study or run it drifted in.
+
+    Parameters:
+        analysis (dict): Result of analyse_stations.
+
+    Returns:
+        list: One list of texts per row, in REPORT_HEADERS order.
+    """
+
+    def row(unit, samples, rate, z, deviates):
+        return [
+            unit,
+            str(samples),
+            f"{rate:.2f}",
+            f"{z:.2f}",
+            "Yes" if deviates else "No",
+        ]
+
+    rows = []
+    for unit, key in (("Spindle", "spindle"), ("Camera", "camera")):
+        for number, samples, rate, z, deviates in zip(
+            analysis[f"{key}s"].tolist(),
+            analysis[f"{key}_samples"].tolist(),
+            analysis[f"{key}_rates"].tolist(),
+            analysis[f"{key}_z"].tolist(),
+            analysis[f"{key}_deviates"].tolist(),
+        ):
+            rows.append(row(f"{unit} {number}", samples, rate, z, deviates))
+    for key, names, text in (
+        ("station", analysis["spindles"], "Spindle {} at camera {}"),
+        ("drift", analysis["periods"], "Camera {1} in {0}"),
+    ):
+        for camera, column in np.argwhere(analysis[f"{key}_deviates"]).tolist():
+            rows.append(
+                row(
+                    text.format(names[column], analysis["cameras"][camera]),
+                    analysis[f"{key}_samples"][camera, column],
+                    analysis[f"{key}_rates"][camera, column],
+                    analysis[f"{key}_z"][camera, column],
+                    True,
+                )
+            )
+    return rows
+
+
+def write_report_rows(csvfile, analysis):
+    """
+    Write the rows of an analysis with a header row to an open csv file.
+
+    Parameters:
+        csvfile (file): File opened for writing.
+        analysis (dict): Result of analyse_stations.
+    """
+    writer = csv.writer(csvfile, dialect="excel", lineterminator="\n")
+    writer.writerow(REPORT_HEADERS)
+    writer.writerows(report_rows(analysis))
+
+
+def write_station_report(file_path, analysis):
+    """
+    Write the rows of an analysis to a csv file.
+
+    Parameters:
+        file_path (str): Path to the csv file.
+        analysis (dict): Result of analyse_stations.
+    """
+    with open(file_path, "w") as csvfile:
+        write_report_rows(csvfile, analysis)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog="python -m knapp.stations",
+        description="Find spindles and cameras whose reject rate deviates "
+        "across the KnappRun files of one or more studies.",
+    )
+    parser.add_argument(
+        "directories", nargs="*", help="directories of studies to search"
+    )
+    parser.add_argument(
+        "--table", nargs="+", default=[], help="sample tables saved with --save"
+    )
+    parser.add_argument("--save", help="save the samples read to this file")
+    parser.add_argument("--csv", help="write the report to this csv file")
+    parser.add_argument(
+        "--layout",
+        type=MachineLayout.parse,
+        default=MachineLayout(),
+        metavar="SPINDLES[xRUNS]",
+        help="machine layout, e.g. 48 (default 24 spindles)",
+    )
+    parser.add_argument(
+        "--drift-by",
+        choices=DRIFT_PERIODS,
+        default="study",
+        help="compare each camera across studies or runs (default study)",
+    )
+    parser.add_argument(
+        "--z",
+        type=float,
+        default=DEVIATION_Z,
+        help=f"z beyond which a unit deviates (default {DEVIATION_Z})",
+    )
+    parser.add_argument("--workers", type=int, help="worker processes")
+    args = parser.parse_args(argv)
+
+    tables = [SampleTable.load(file_path) for file_path in args.table]
+    studies = [
+        (study["name"], study["machine_paths"])
+        for study in find_study_files(args.directories, args.layout)
+        if study.get("machine_paths")
+    ]
+    if studies:
+        tables.append(
+            SampleTable.from_studies(studies, args.layout, max_workers=args.workers)
+        )
+    if not tables:
+        parser.error("no KnappRun files or sample tables found")
+    table = tables[0] if len(tables) == 1 else SampleTable.concatenate(tables)
+    if args.save:
+        table.save(args.save)
+
+    analysis = analyse_stations(table, args.z, args.drift_by)
+    if args.csv:
+        write_station_report(args.csv, analysis)
+    else:
+        write_report_rows(sys.stdout, analysis)
+    print(
+        f"{analysis['samples']} samples from {analysis['runs']} runs of "
+        f"{analysis['studies']} studies: "
+        f"{int(analysis['spindle_deviates'].sum())} spindles deviate, "
+        f"{int(analysis['station_deviates'].sum())} spindles at a camera and "
+        f"{int(analysis['camera_deviates'].sum())} cameras drifting",
+        file=sys.stderr,
+    )
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
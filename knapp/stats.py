@@ -0,0 +1,191 @@
+"""
+Bootstrap confidence intervals for the Knapp efficiency.
+
+Only whether a container is in the manual and machine reject zones counts
+towards the efficiency, so every container falls into one of four classes:
+rejected by neither, by manual inspection only, by the machine only or by
+both. Drawing containers with replacement is then the same as drawing the
+class counts of a resample from a multinomial distribution, which NumPy
+does for thousands of resamples in a single call.
+"""
+
+import numpy as np
+from knapp.efficiency import ratio
+from knapp.study import (
+    MAX_RESULT,
+    NOT_INSPECTED,
+    REJECT_THRESHOLD,
+    fqv_from_inspections,
+)
+
+RESAMPLES = 10000
+CONFIDENCE = 0.95
+NEITHER, MANUAL_ONLY, MACHINE_ONLY, BOTH = range(4)
+
+
+def in_reject_zone(results, reject_threshold=REJECT_THRESHOLD):
+    """
+    Return whether each result is in the reject zone.
+
+    Parameters:
+        results (numpy.ndarray): Stored result values.
+        reject_threshold (int): Lowest category in the reject zone.
+
+    Returns:
+        numpy.ndarray: bool array, False for containers without a result.
+    """
+    results = np.asarray(results)
+    return (results >= reject_threshold) & (results <= MAX_RESULT)
+
+
+def count_classes(manual_rejects, machine_rejects):
+    """
+    Count the containers in each of the four reject classes.
+
+    Parameters:
+        manual_rejects (numpy.ndarray): Manual reject flag per container.
+        machine_rejects (numpy.ndarray): Machine reject flag per container.
+
+    Returns:
+        numpy.ndarray: Containers in NEITHER, MANUAL_ONLY, MACHINE_ONLY and
+            BOTH.
+    """
+    classes = manual_rejects.astype(np.intp) + 2 * machine_rejects
+    return np.bincount(classes, minlength=4)
+
+
+def matches_inspections(manual, inspections):
+    """
+    Return whether an FQV is the one rebuilt from the inspector results.
+
+    Parameters:
+        manual (numpy.ndarray): FQV value per container.
+        inspections (numpy.ndarray): Inspection matrix (containers, inspectors).
+
+    Returns:
+        bool: True if fqv_from_inspections gives the same FQV.
+    """
+    return np.array_equal(manual, fqv_from_inspections(np.asarray(inspections)))
+
+
+def inspections_to_resample(manual, inspections):
+    """
+    Return the inspector results a bootstrap of an FQV can resample.
+
+    Parameters:
+        manual (numpy.ndarray): FQV value per container.
+        inspections (numpy.ndarray): Inspection matrix (containers, inspectors).
+
+    Returns:
+        numpy.ndarray: The inspections, or None if they hold no results or
+            the FQV was not rebuilt from them, e.g. when it was loaded from
+            a file of its own.
+    """
+    if inspections is None or (inspections == NOT_INSPECTED).all():
+        return None
+    return inspections if matches_inspections(manual, inspections) else None
+
+
+def resample_inspector_classes(
+    rng, inspections, machine_rejects, resamples, reject_threshold
+):
+    """
+    Count the reject classes of every resample of the inspectors.
+
+    Each resample draws as many inspectors as the study has with
+    replacement and rebuilds the FQV from them the way
+    knapp.study.fqv_from_inspections does. Resamples that drew the same
+    inspectors share their counts, so the FQV is only rebuilt once for each
+    distinct draw.
+
+    Parameters:
+        rng (numpy.random.Generator): Random generator.
+        inspections (numpy.ndarray): Inspection matrix (containers, inspectors).
+        machine_rejects (numpy.ndarray): Machine reject flag per container.
+        resamples (int): Number of resamples.
+        reject_threshold (int): Lowest category in the reject zone.
+
+    Returns:
+        numpy.ndarray: Class counts, shape (resamples, 4).
+    """
+    inspectors = inspections.shape[1]
+    weights = rng.multinomial(
+        inspectors, np.full(inspectors, 1 / inspectors), resamples
+    )
+    draws, inverse = np.unique(weights, axis=0, return_inverse=True)
+    missing = (inspections == NOT_INSPECTED).any(axis=1)
+    # The FQV is the rounded mean, so it reaches the reject zone once the
+    # sum of the drawn results reaches the smallest sum that rounds up to it.
+    sums = np.arange(inspectors * MAX_RESULT + 1)
+    reject_sum = np.searchsorted(np.rint(sums / inspectors) >= reject_threshold, True)
+    values = np.where(missing[:, np.newaxis], 0, inspections).astype(np.float32)
+    counts = np.empty((len(draws), 4), dtype=np.int64)
+    for row, draw in enumerate(draws):
+        manual_rejects = (values @ draw.astype(np.float32) >= reject_sum) & ~missing
+        counts[row] = count_classes(manual_rejects, machine_rejects)
+    return counts[inverse.ravel()]
+
+
+def bootstrap_efficiency(
+    manual,
+    machine,
+    inspections=None,
+    resamples=RESAMPLES,
+    confidence=CONFIDENCE,
+    reject_threshold=REJECT_THRESHOLD,
+    seed=None,
+):
+    """
+    Bootstrap confidence intervals for both efficiency ratios.
+
+    Containers are resampled with replacement. When the per-inspector
+    results are given, the inspectors are resampled too and the FQV of each
+    resample is rebuilt from them, so the intervals also cover the spread
+    between inspectors. The FQV must then be the one rebuilt from all of
+    them, or the intervals would describe a different FQV.
+
+    Parameters:
+        manual (numpy.ndarray): FQV value per container.
+        machine (numpy.ndarray): FQA value per container.
+        inspections (numpy.ndarray): Inspection matrix (containers, inspectors).
+        resamples (int): Number of bootstrap resamples.
+        confidence (float): Confidence level of the intervals, e.g. 0.95.
+        reject_threshold (int): Lowest category in the reject zone.
+        seed (int): Seed of the random generator, None for a random seed.
+
+    Returns:
+        dict: (low, high) percentile intervals in % for manual_vs_machine
+            and machine_vs_manual, with the confidence and resamples used.
+
+    Raises:
+        ValueError: If inspections are given and the FQV is not the one
+            rebuilt from them.
+    """
+    if inspections is not None and not matches_inspections(manual, inspections):
+        raise ValueError("The FQV is not the one rebuilt from the inspector results")
+    rng = np.random.default_rng(seed)
+    machine_rejects = in_reject_zone(machine, reject_threshold)
+    num_containers = len(machine_rejects)
+    if inspections is None:
+        counts = count_classes(
+            in_reject_zone(manual, reject_threshold), machine_rejects
+        )
+        probabilities = np.broadcast_to(counts, (resamples, 4))
+    else:
+        probabilities = resample_inspector_classes(
+            rng, np.asarray(inspections), machine_rejects, resamples, reject_threshold
+        )
+    classes = rng.multinomial(
+        num_containers, probabilities / max(num_containers, 1), resamples
+    )
+    total_manual = classes[:, MANUAL_ONLY] + classes[:, BOTH]
+    total_machine = classes[:, MACHINE_ONLY] + classes[:, BOTH]
+    tails = [(1 - confidence) / 2 * 100, (1 + confidence) / 2 * 100]
+    intervals = {
+        key: tuple(np.percentile(values, tails).tolist())
+        for key, values in (
+            ("manual_vs_machine", ratio(total_manual, total_machine)),
+            ("machine_vs_manual", ratio(total_machine, total_manual)),
+        )
+    }
+    return {**intervals, "confidence": confidence, "resamples": resamples}
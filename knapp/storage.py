@@ -0,0 +1,300 @@
+import json
+import pickle
+import struct
+import numpy as np
+from knapp.study import (
+    Study,
+    array_to_results,
+    inspections_to_array,
+    passes_to_array,
+    results_to_array,
+)
+
+STUDY_EXTENSION = ".kfqv"
+STUDY_MAGIC = b"KNAPPFQV"
+STUDY_VERSION = 1
+# magic, version, header size, containers, inspectors, passes, inspection
+# dtype, metadata length, then the offsets of the manual, machine,
+# inspection and metadata sections.
+STUDY_HEADER = struct.Struct("<8sHHQHHc3xIQQQQ")
+SECTION_ALIGNMENT = 64
+
+
+def read_pickle_file(file_path):
+    """
+    Read data from a pickle file.
+
+    Parameters:
+        file_path (str): The path to the pickle file.
+
+    Returns:
+        object: The data read from the pickle file.
+    """
+    with open(file_path, "rb") as fp:
+        return pickle.load(fp)
+
+
+def write_pickle_file(file_path, data):
+    """
+    Write data to a pickle file.
+
+    Parameters:
+        file_path (str): The path to the pickle file.
+        data (object): The data to be written to the file.
+    """
+    with open(file_path, "wb") as fp:
+        pickle.dump(data, fp)
+
+
+class StudyHeader:
+    """
+    Fixed size header at the start of a study file.
+
+    Attributes:
+        num_containers (int): Number of containers in the set.
+        inspectors (int): Number of inspectors in the inspection matrix.
+        passes (int): Inspection passes per inspector, 0 when the matrix
+            holds one reject count per inspector.
+        inspection_dtype (str): NumPy type code of the inspection matrix.
+        metadata_length (int): Length of the JSON metadata in bytes.
+        offsets (tuple): Offsets of the manual, machine, inspection and
+            metadata sections.
+    """
+
+    def __init__(
+        self,
+        num_containers,
+        inspectors,
+        passes,
+        inspection_dtype,
+        metadata_length,
+        offsets,
+    ):
+        self.num_containers = num_containers
+        self.inspectors = inspectors
+        self.passes = passes
+        self.inspection_dtype = inspection_dtype
+        self.metadata_length = metadata_length
+        self.offsets = offsets
+
+    @property
+    def inspection_shape(self):
+        shape = (self.num_containers, self.inspectors)
+        return shape + (self.passes,) if self.passes else shape
+
+    @classmethod
+    def unpack(cls, data):
+        """
+        Read the header from the first bytes of a study file.
+
+        Parameters:
+            data (bytes): At least STUDY_HEADER.size bytes from the file.
+
+        Returns:
+            StudyHeader: The header.
+
+        Raises:
+            ValueError: If the data is not a supported study file.
+        """
+        if len(data) < STUDY_HEADER.size:
+            raise ValueError("Not a Knapp study file")
+        (
+            magic,
+            version,
+            _,
+            num_containers,
+            inspectors,
+            passes,
+            inspection_dtype,
+            metadata_length,
+            *offsets,
+        ) = STUDY_HEADER.unpack_from(data)
+        if magic != STUDY_MAGIC:
+            raise ValueError("Not a Knapp study file")
+        if version > STUDY_VERSION:
+            raise ValueError(f"Unsupported study file version {version}")
+        return cls(
+            num_containers,
+            inspectors,
+            passes,
+            inspection_dtype.decode(),
+            metadata_length,
+            tuple(offsets),
+        )
+
+
+def align(offset):
+    return -(-offset // SECTION_ALIGNMENT) * SECTION_ALIGNMENT
+
+
+def write_study_file(file_path, study):
+    """
+    Write a study to the native binary study format.
+
+    The file holds a fixed header followed by the manual, machine and
+    inspection arrays and the JSON metadata, each starting on a 64 byte
+    boundary so they can be memory-mapped in place.
+
+    Parameters:
+        file_path (str): Path to the study file.
+        study (Study): The study to write.
+    """
+    # Every pass is kept when the study has them, reject counts otherwise.
+    inspections = np.ascontiguousarray(
+        study.inspections if study.passes is None else study.passes
+    )
+    passes = inspections.shape[2] if inspections.ndim == 3 else 0
+    metadata = json.dumps({"title": study.title, **study.metadata}).encode()
+    sections = [
+        np.ascontiguousarray(study.manual, dtype=np.uint8).tobytes(),
+        np.ascontiguousarray(study.machine, dtype=np.uint8).tobytes(),
+        inspections.tobytes(),
+        metadata,
+    ]
+    offsets = []
+    offset = align(STUDY_HEADER.size)
+    for section in sections:
+        offsets.append(offset)
+        offset = align(offset + len(section))
+
+    with open(file_path, "wb") as fp:
+        fp.write(
+            STUDY_HEADER.pack(
+                STUDY_MAGIC,
+                STUDY_VERSION,
+                STUDY_HEADER.size,
+                study.num_containers,
+                inspections.shape[1],
+                passes,
+                inspections.dtype.char.encode(),
+                len(metadata),
+                *offsets,
+            )
+        )
+        for section_offset, section in zip(offsets, sections):
+            fp.seek(section_offset)
+            fp.write(section)
+
+
+def read_study_header(file_path):
+    """
+    Read only the header and metadata of a study file.
+
+    Parameters:
+        file_path (str): Path to the study file.
+
+    Returns:
+        tuple: The StudyHeader and the metadata dictionary.
+    """
+    with open(file_path, "rb") as fp:
+        header = StudyHeader.unpack(fp.read(STUDY_HEADER.size))
+        fp.seek(header.offsets[3])
+        metadata = json.loads(fp.read(header.metadata_length) or b"{}")
+    return header, metadata
+
+
+def read_study_file(file_path, mmap=True):
+    """
+    Read a study from the native binary study format.
+
+    With mmap the arrays are read-only views onto the file, so only the
+    parts that are actually used are read from disk.
+
+    Parameters:
+        file_path (str): Path to the study file.
+        mmap (bool): Memory-map the file instead of reading it into memory.
+
+    Returns:
+        Study: The study.
+    """
+    if mmap:
+        data = np.memmap(file_path, dtype=np.uint8, mode="r")
+    else:
+        data = np.fromfile(file_path, dtype=np.uint8)
+    header = StudyHeader.unpack(data[: STUDY_HEADER.size].tobytes())
+    manual_offset, machine_offset, inspections_offset, metadata_offset = header.offsets
+    inspection_dtype = np.dtype(header.inspection_dtype)
+    inspection_size = int(np.prod(header.inspection_shape)) * inspection_dtype.itemsize
+    metadata = json.loads(
+        data[metadata_offset : metadata_offset + header.metadata_length].tobytes()
+        or b"{}"
+    )
+    return Study(
+        data[manual_offset : manual_offset + header.num_containers],
+        data[machine_offset : machine_offset + header.num_containers],
+        data[inspections_offset : inspections_offset + inspection_size]
+        .view(inspection_dtype)
+        .reshape(header.inspection_shape),
+        title=metadata.pop("title", ""),
+        metadata=metadata,
+    )
+
+
+def is_study_file(file_path):
+    return file_path.lower().endswith(STUDY_EXTENSION)
+
+
+def write_study_pickle(file_path, study):
+    """
+    Export a study as a pickle of legacy {"container_N": value} dictionaries.
+
+    Studies holding every pass also write them under "passes".
+
+    Parameters:
+        file_path (str): Path to the pickle file.
+        study (Study): The study to write.
+    """
+    manual_results, machine_results, inspection_results = study.to_results()
+    data = {
+        "manual": manual_results,
+        "machine": machine_results,
+        "inspections": inspection_results,
+        "title": study.title,
+        "metadata": study.metadata,
+    }
+    if study.passes is not None:
+        data["passes"] = array_to_results(study.passes)
+    write_pickle_file(file_path, data)
+
+
+def is_study_pickle(data):
+    """
+    Return whether pickled data is a study written by write_study_pickle.
+    """
+    return isinstance(data, dict) and "manual" in data and "machine" in data
+
+
+def study_from_pickle(data):
+    """
+    Convert the data of a study pickle back to a study.
+
+    Parameters:
+        data (dict): Data read from a pickle written by write_study_pickle.
+
+    Returns:
+        Study: The study.
+    """
+    if data.get("passes"):
+        inspections = passes_to_array(data["passes"])
+    else:
+        inspections = inspections_to_array(data.get("inspections", {}))
+    return Study(
+        results_to_array(data.get("manual", {})),
+        results_to_array(data.get("machine", {})),
+        inspections,
+        title=data.get("title", ""),
+        metadata=data.get("metadata", {}),
+    )
+
+
+def read_study_pickle(file_path):
+    """
+    Import a study written by write_study_pickle.
+
+    Parameters:
+        file_path (str): Path to the pickle file.
+
+    Returns:
+        Study: The study.
+    """
+    return study_from_pickle(read_pickle_file(file_path))
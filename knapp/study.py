@@ -0,0 +1,466 @@
+import numpy as np
+from knapp.constants import (
+    CONTAINER_END,
+    CONTAINER_START,
+    INSPECTORS,
+    MAX_RESULT,
+    NOT_INSPECTED,
+    PASSES,
+    REJECT_THRESHOLD,
+)
+
+
+def container_number(key):
+    """
+    Return the container number of a legacy "container_N" key.
+
+    Parameters:
+        key (str): The dictionary key.
+
+    Returns:
+        int: The container number, or None if the key is not a container key.
+    """
+    try:
+        return int(key.rsplit("_", 1)[1])
+    except (AttributeError, IndexError, ValueError):
+        return None
+
+
+def to_result(value):
+    """
+    Convert a legacy result value to its stored form.
+
+    Parameters:
+        value: Value from a legacy results dictionary.
+
+    Returns:
+        int: The value if it lies between 0 and 10, NOT_INSPECTED otherwise.
+    """
+    try:
+        value = int(value)
+    except (TypeError, ValueError):
+        return NOT_INSPECTED
+    return value if 0 <= value <= MAX_RESULT else NOT_INSPECTED
+
+
+def empty_results(num_containers=CONTAINER_END, inspectors=None):
+    """
+    Return a result array with every container marked as not inspected.
+
+    Parameters:
+        num_containers (int): Number of containers in the set.
+        inspectors (int): Number of inspectors for an inspection matrix, or
+            None for a single result per container.
+
+    Returns:
+        numpy.ndarray: uint8 array filled with NOT_INSPECTED.
+    """
+    shape = num_containers if inspectors is None else (num_containers, inspectors)
+    return np.full(shape, NOT_INSPECTED, dtype=np.uint8)
+
+
+def empty_passes(num_containers=CONTAINER_END, inspectors=INSPECTORS, passes=PASSES):
+    """
+    Return a pass array with every inspection marked as not done.
+
+    Parameters:
+        num_containers (int): Number of containers in the set.
+        inspectors (int): Number of inspectors.
+        passes (int): Passes per inspector.
+
+    Returns:
+        numpy.ndarray: uint8 array (containers, inspectors, passes) filled
+            with NOT_INSPECTED.
+    """
+    return np.full((num_containers, inspectors, passes), NOT_INSPECTED, np.uint8)
+
+
+def to_pass(value):
+    """
+    Convert a legacy pass result to its stored form.
+
+    Parameters:
+        value: 1 or True for a reject, 0 or False for an accept.
+
+    Returns:
+        int: 1 or 0, NOT_INSPECTED for anything else.
+    """
+    result = to_result(value)
+    return result if result <= 1 else NOT_INSPECTED
+
+
+def fit_results(array, num_containers):
+    """
+    Cut or pad a result array to the given number of containers.
+
+    Parameters:
+        array (numpy.ndarray): Result array, one row per container.
+        num_containers (int): Number of containers in the set.
+
+    Returns:
+        numpy.ndarray: The array itself if it already has that length,
+            otherwise a copy padded with NOT_INSPECTED.
+    """
+    if len(array) == num_containers:
+        return array
+    fitted = np.full((num_containers,) + array.shape[1:], NOT_INSPECTED, np.uint8)
+    fitted[: len(array)] = array[:num_containers]
+    return fitted
+
+
+def set_size(results):
+    """
+    Return the highest container number of a legacy results dictionary.
+
+    Parameters:
+        results (dict): Result values keyed by container.
+
+    Returns:
+        int: The highest container number, 0 if there are none.
+    """
+    return max(
+        (number for number in map(container_number, results) if number), default=0
+    )
+
+
+def results_to_array(results, num_containers=None):
+    """
+    Convert a legacy {"container_N": value} dictionary to a result array.
+
+    Parameters:
+        results (dict): Result values keyed by container.
+        num_containers (int): Number of containers in the set, defaults to
+            the highest container number in the dictionary.
+
+    Returns:
+        numpy.ndarray: uint8 array with one result per container.
+    """
+    if num_containers is None:
+        num_containers = set_size(results)
+    array = empty_results(num_containers)
+    for key, value in results.items():
+        container = container_number(key)
+        if container is not None and CONTAINER_START <= container <= num_containers:
+            array[container - 1] = to_result(value)
+    return array
+
+
+def inspections_to_array(results, num_containers=None):
+    """
+    Convert a legacy dictionary of per-inspector lists to an inspection matrix.
+
+    A single value for a container is used for every inspector. There is a
+    column for each inspector of the longest list, INSPECTORS if there are
+    no lists.
+
+    Parameters:
+        results (dict): Lists of inspector results keyed by container.
+        num_containers (int): Number of containers in the set, defaults to
+            the highest container number in the dictionary.
+
+    Returns:
+        numpy.ndarray: uint8 array of shape (containers, inspectors).
+    """
+    if num_containers is None:
+        num_containers = set_size(results)
+    inspectors = (
+        max(
+            (
+                len(values)
+                for key, values in results.items()
+                if container_number(key) and isinstance(values, (list, tuple))
+            ),
+            default=0,
+        )
+        or INSPECTORS
+    )
+    array = empty_results(num_containers, inspectors)
+    for key, values in results.items():
+        container = container_number(key)
+        if container is None or not CONTAINER_START <= container <= num_containers:
+            continue
+        if not isinstance(values, (list, tuple)):
+            values = [values] * inspectors
+        for inspector, value in enumerate(values):
+            array[container - 1, inspector] = to_result(value)
+    return array
+
+
+def passes_to_array(results, num_containers=None, passes=None):
+    """
+    Convert a legacy dictionary of per-inspector pass lists to a pass array.
+
+    Parameters:
+        results (dict): For each container a list holding one list of pass
+            results (1 reject, 0 accept) per inspector.
+        num_containers (int): Number of containers in the set, defaults to
+            the highest container number in the dictionary.
+        passes (int): Passes per inspector, defaults to the longest list of
+            passes. The inspectors are those of the longest container.
+
+    Returns:
+        numpy.ndarray: uint8 array of shape (containers, inspectors, passes).
+    """
+    if num_containers is None:
+        num_containers = set_size(results)
+    containers = [
+        inspectors for key, inspectors in results.items() if container_number(key)
+    ]
+    inspectors = max(map(len, containers), default=0) or INSPECTORS
+    if passes is None:
+        passes = (
+            max(
+                (
+                    len(values)
+                    for inspector_passes in containers
+                    for values in inspector_passes
+                ),
+                default=0,
+            )
+            or PASSES
+        )
+    array = empty_passes(num_containers, inspectors, passes)
+    for key, inspector_passes in results.items():
+        container = container_number(key)
+        if container is None or not CONTAINER_START <= container <= num_containers:
+            continue
+        for inspector, values in enumerate(inspector_passes):
+            for inspection, value in enumerate(values[:passes]):
+                array[container - 1, inspector, inspection] = to_pass(value)
+    return array
+
+
+def replace_missing(values, missing):
+    return [
+        (
+            replace_missing(value, missing)
+            if isinstance(value, list)
+            else missing if value == NOT_INSPECTED else value
+        )
+        for value in values
+    ]
+
+
+def array_to_results(array, missing=-1):
+    """
+    Convert a result array back to a legacy {"container_N": value} dictionary.
+
+    Parameters:
+        array (numpy.ndarray): Result array, one row per container.
+        missing: Value used for containers that were not inspected, or None
+            to leave them out.
+
+    Returns:
+        dict: Result values keyed by container, lists for inspection matrices.
+    """
+    results = {}
+    for container, value in enumerate(array.tolist(), start=CONTAINER_START):
+        if isinstance(value, list):
+            value = replace_missing(value, missing)
+        elif value == NOT_INSPECTED:
+            if missing is None:
+                continue
+            value = missing
+        results[f"container_{container}"] = value
+    return results
+
+
+def fqv_from_inspections(inspections):
+    """
+    Derive the FQV of each container from the per-inspector results.
+
+    Parameters:
+        inspections (numpy.ndarray): Inspection matrix (containers, inspectors)
+            of reject counts, or a pass array (containers, inspectors, passes).
+
+    Returns:
+        numpy.ndarray: uint8 FQV per container, NOT_INSPECTED where any
+            inspector result is missing.
+    """
+    if inspections.ndim == 3:
+        return fqv_from_passes(inspections)
+    missing = (inspections == NOT_INSPECTED).any(axis=1)
+    fqv = np.rint(inspections.sum(axis=1, dtype=np.int64) / inspections.shape[1])
+    return np.where(missing, NOT_INSPECTED, fqv).astype(np.uint8)
+
+
+def fqv_from_passes(passes):
+    """
+    Derive the FQV of each container from every inspection pass.
+
+    The FQV is n / N x 10, n being the inspections that rejected the
+    container and N the inspections done.
+
+    Parameters:
+        passes (numpy.ndarray): Pass array (containers, inspectors, passes).
+
+    Returns:
+        numpy.ndarray: uint8 FQV per container, NOT_INSPECTED where no
+            inspection was done.
+    """
+    flat = passes.reshape(len(passes), -1)
+    done = flat != NOT_INSPECTED
+    inspected = done.sum(axis=1)
+    rejected = (flat == 1).sum(axis=1)
+    fqv = np.rint(
+        np.divide(
+            rejected * MAX_RESULT,
+            inspected,
+            out=np.zeros(len(flat)),
+            where=inspected > 0,
+        )
+    )
+    return np.where(inspected > 0, fqv, NOT_INSPECTED).astype(np.uint8)
+
+
+def passes_to_counts(passes):
+    """
+    Count the rejects of each inspector from their passes.
+
+    Parameters:
+        passes (numpy.ndarray): Pass array (containers, inspectors, passes).
+
+    Returns:
+        numpy.ndarray: uint8 inspection matrix (containers, inspectors),
+            NOT_INSPECTED where an inspector has a missing pass.
+    """
+    missing = (passes == NOT_INSPECTED).any(axis=2)
+    counts = (passes == 1).sum(axis=2, dtype=np.uint8)
+    return np.where(missing, NOT_INSPECTED, counts).astype(np.uint8)
+
+
+def counts_to_passes(inspections, passes=PASSES):
+    """
+    Expand reject counts to passes, the first count passes rejecting.
+
+    Legacy data only records how many passes rejected each container, so
+    the order of the passes is not known.
+
+    Parameters:
+        inspections (numpy.ndarray): Inspection matrix (containers, inspectors).
+        passes (int): Passes per inspector.
+
+    Returns:
+        numpy.ndarray: uint8 pass array (containers, inspectors, passes),
+            NOT_INSPECTED for every pass of a missing result.
+    """
+    inspections = np.asarray(inspections)
+    expanded = (np.arange(passes) < inspections[..., np.newaxis]).astype(np.uint8)
+    expanded[inspections == NOT_INSPECTED] = NOT_INSPECTED
+    return expanded
+
+
+class Study:
+    """
+    Manual, machine and per-inspector results of a single Knapp study.
+
+    Each result set is a uint8 array with one row per container, with
+    NOT_INSPECTED marking containers without a result. Unless num_containers
+    is given, the manual FQV defines the container set; without it the
+    longest result set does. The other result sets are cut or padded to match.
+    Free-form details such as product, machine or date go in metadata.
+
+    The inspections may be given as reject counts (containers, inspectors)
+    or as every pass (containers, inspectors, passes). Passes are kept in
+    passes and counted into inspections; for counts, passes is None.
+    """
+
+    def __init__(
+        self,
+        manual=None,
+        machine=None,
+        inspections=None,
+        title="",
+        num_containers=None,
+        metadata=None,
+    ):
+        if num_containers is None and manual is not None:
+            num_containers = len(manual)
+        if num_containers is None:
+            num_containers = max(
+                (len(array) for array in (machine, inspections) if array is not None),
+                default=CONTAINER_END,
+            )
+        self.manual = (
+            empty_results(num_containers)
+            if manual is None
+            else fit_results(manual, num_containers)
+        )
+        self.machine = (
+            empty_results(num_containers)
+            if machine is None
+            else fit_results(machine, num_containers)
+        )
+        self.passes = None
+        if inspections is None:
+            self.inspections = empty_results(num_containers, INSPECTORS)
+        elif inspections.ndim == 3:
+            self.passes = fit_results(inspections, num_containers)
+            self.inspections = passes_to_counts(self.passes)
+        else:
+            self.inspections = fit_results(inspections, num_containers)
+        self.title = title
+        self.metadata = metadata or {}
+
+    @property
+    def num_containers(self):
+        return len(self.manual)
+
+    @property
+    def inspection_passes(self):
+        """
+        Return every inspection pass, expanding reject counts if needed.
+        """
+        if self.passes is not None:
+            return self.passes
+        return counts_to_passes(self.inspections)
+
+    @classmethod
+    def from_results(
+        cls, manual_results=None, machine_results=None, inspection_results=None
+    ):
+        """
+        Create a study from legacy {"container_N": value} dictionaries.
+
+        Parameters:
+            manual_results (dict): FQV values keyed by container.
+            machine_results (dict): FQA values keyed by container.
+            inspection_results (dict): Lists of inspector results keyed by
+                container.
+
+        Returns:
+            Study: The converted study.
+        """
+        return cls(
+            results_to_array(manual_results) if manual_results else None,
+            results_to_array(machine_results) if machine_results else None,
+            inspections_to_array(inspection_results) if inspection_results else None,
+        )
+
+    def to_results(self):
+        """
+        Convert the study to legacy {"container_N": value} dictionaries.
+
+        Returns:
+            tuple: Manual, machine and inspection result dictionaries.
+        """
+        return (
+            array_to_results(self.manual),
+            array_to_results(self.machine),
+            array_to_results(self.inspections),
+        )
+
+    def efficiency(self, reject_threshold=REJECT_THRESHOLD):
+        """
+        Calculate the efficiency of manual against machine inspection.
+
+        Parameters:
+            reject_threshold (int): Lowest category in the reject zone.
+
+        Returns:
+            dict: See knapp.efficiency.calculate_efficiency.
+        """
+        # knapp.efficiency imports its constants from this module.
+        from knapp.efficiency import calculate_efficiency
+
+        return calculate_efficiency(self.manual, self.machine, reject_threshold)
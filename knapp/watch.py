@@ -0,0 +1,119 @@
+"""
+Follow the folder a Knapp machine exports its KnappRun files to.
+
+The machine writes one KnappRun_N_*.xml file as each run finishes. Polling
+the folder parses only the runs that appeared or changed since the last
+poll and merges them into the machine results, so the results of a study
+are complete as soon as its last run lands.
+"""
+
+import os
+import xml.etree.ElementTree as ET
+from knapp.layout import MachineLayout
+from knapp.loaders import merge_machine_values, read_machine_file
+from knapp.study import CONTAINER_START, empty_results, fit_results
+
+
+class RunFolderWatcher:
+    """
+    Incrementally ingest the KnappRun xml files of a folder.
+
+    A file is identified by its path, size and modification time: a run is
+    parsed once, and again only if the machine rewrites it. A file that does
+    not parse yet is taken to be still being written and is retried on the
+    next poll. A file that parses but cannot be read as a run is skipped
+    until the machine rewrites it, so one bad export does not hold up the
+    runs after it.
+
+    Attributes:
+        directory (str): The folder watched.
+        num_containers (int): Number of containers in the set, None grows
+            the machine results with the runs.
+        cache (ParseCache): Cache of parsed files, None always parses.
+        layout (MachineLayout): Layout of the machine.
+        machine (numpy.ndarray): uint8 FQA per container of the runs so far.
+        ingested (dict): (size, modification time) of every ingested file
+            by path.
+        skipped (dict): (size, modification time) of every skipped file and
+            why it could not be read, by path.
+    """
+
+    def __init__(self, directory, num_containers=None, cache=None, layout=None):
+        self.directory = directory
+        self.layout = layout or MachineLayout()
+        if num_containers is None:
+            num_containers = self.layout.num_containers
+        self.num_containers = num_containers
+        self.cache = cache
+        self.machine = empty_results(num_containers or 0)
+        self.ingested = {}
+        self.skipped = {}
+
+    def pending_files(self):
+        """
+        Return the run files that have not been ingested or skipped as they
+        are now.
+
+        Returns:
+            list: (path, (size, modification time)) of each file, in run
+                order.
+        """
+        pending = []
+        try:
+            entries = list(os.scandir(self.directory))
+        except FileNotFoundError:
+            return pending
+        for entry in entries:
+            run = self.layout.run_number(entry.name)
+            if run is None or not entry.name.lower().endswith(".xml"):
+                continue
+            try:
+                stat = entry.stat()
+            except FileNotFoundError:
+                continue
+            signature = (stat.st_size, stat.st_mtime_ns)
+            skipped = self.skipped.get(entry.path, (None, ""))[0]
+            if entry.is_file() and signature not in (
+                self.ingested.get(entry.path),
+                skipped,
+            ):
+                pending.append((run, entry.path, signature))
+        return [(path, signature) for _, path, signature in sorted(pending)]
+
+    def poll(self, progress=None):
+        """
+        Parse the new run files and merge them into the machine results.
+
+        Parameters:
+            progress (function): Called with (files done, total files)
+                before each file. Raising LoadCancelled from it stops the
+                poll, the files not read yet are left for the next one.
+
+        Returns:
+            list: Paths of the files ingested by this poll, empty if there
+                were none.
+        """
+        ingested = []
+        pending = self.pending_files()
+        for done, (file_path, signature) in enumerate(pending):
+            if progress:
+                progress(done, len(pending))
+            try:
+                first_container, values = read_machine_file(
+                    file_path, self.num_containers, self.cache, self.layout
+                )
+            except (ET.ParseError, OSError):
+                continue
+            except ValueError as error:
+                self.skipped[file_path] = (signature, str(error))
+                continue
+            self.ingested[file_path] = signature
+            self.skipped.pop(file_path, None)
+            if first_container is None:
+                continue
+            end = first_container - CONTAINER_START + len(values)
+            if end > len(self.machine):
+                self.machine = fit_results(self.machine, end)
+            merge_machine_values(self.machine, first_container, values)
+            ingested.append(file_path)
+        return ingested
@@ -0,0 +1,56 @@
+import numpy as np
+from knapp.constants import (
+    ACCEPT_THRESHOLD,
+    GREYZONE_THRESHOLD,
+    MAX_RESULT,
+    REJECT_THRESHOLD,
+)
+
+ACCEPT_ZONE = 0
+GREY_ZONE = 1
+REJECT_ZONE = 2
+# Containers that were not inspected, or values between the grey zone and
+# the reject threshold when the thresholds leave a gap.
+EMPTY_ZONE = 3
+ZONE_NAMES = ["Accept", "Grey zone", "Reject", "Empty"]
+
+
+def zone_table(
+    accept=ACCEPT_THRESHOLD, greyzone=GREYZONE_THRESHOLD, reject=REJECT_THRESHOLD
+):
+    """
+    Return the zone of every possible stored value for a set of thresholds.
+
+    Parameters:
+        accept (int): Highest value in the accept zone.
+        greyzone (int): Highest value in the grey zone.
+        reject (int): Lowest value in the reject zone.
+
+    Returns:
+        numpy.ndarray: uint8 zone for each value from 0 to 255.
+    """
+    values = np.arange(256)
+    table = np.full(256, EMPTY_ZONE, dtype=np.uint8)
+    table[values <= accept] = ACCEPT_ZONE
+    table[(values > accept) & (values <= greyzone)] = GREY_ZONE
+    table[values >= reject] = REJECT_ZONE
+    # Values above 10, NOT_INSPECTED among them, are not results.
+    table[MAX_RESULT + 1 :] = EMPTY_ZONE
+    return table
+
+
+ZONE_TABLE = zone_table()
+
+
+def zones(results, table=ZONE_TABLE):
+    """
+    Return the zone of every result.
+
+    Parameters:
+        results (numpy.ndarray): Stored result values.
+        table (numpy.ndarray): Zone of each value, from zone_table.
+
+    Returns:
+        numpy.ndarray: uint8 zones with the shape of results.
+    """
+    return table[np.asarray(results)]
@@ -1,9 +1,4 @@
-import random
 import sys
-from utils import (
-    show_confirmation,
-    write_pickle_file,
-)
 from PyQt6.QtWidgets import (
     QApplication,
     QPushButton,
@@ -12,14 +7,11 @@ from PyQt6.QtWidgets import (
     QFileDialog,
     QTabWidget,
 )
-from PyQt6.QtCore import pyqtSlot
-from widgets.compare_results import CompareResults
-from widgets.create_fqv import CreateFQV
-from widgets.load_fqv import LoadFQV
-from widgets.create_manual_inspection import CreateManualInspection
-from widgets.load_manual_inspection import LoadManualInspection
-from widgets.load_machine_results import LoadMachineResults
-from constants import CONTAINER_START, CONTAINER_END
+from PyQt6.QtCore import QThreadPool, pyqtSlot
+from constants import CONTAINER_END
+
+# The windows, NumPy and matplotlib are imported when first used so that
+# the main window shows as quickly as possible.
 
 
 class MainApp(QWidget):
@@ -67,6 +59,7 @@ class MainApp(QWidget):
         self.load_fqv.clicked.connect(self.LoadFQV)
         self.load_machine_results.clicked.connect(self.LoadMachineResults)
         self.compare_results.clicked.connect(self.CompareResults)
+        self.study_archive.clicked.connect(self.StudyArchive)
         self.quit_button.clicked.connect(self.close)
         self.show()
 
@@ -78,11 +71,13 @@ class MainApp(QWidget):
         self.load_machine_results = QPushButton("Load FQA (Machine)", self)
         self.compare_results = QPushButton("Compare Results", self)
         self.compare_results.setEnabled(False)
+        self.study_archive = QPushButton("Study Archive", self)
 
         main_layout = QVBoxLayout(self.knapp_tab)
         main_layout.addWidget(self.load_fqv)
         main_layout.addWidget(self.load_machine_results)
         main_layout.addWidget(self.compare_results)
+        main_layout.addWidget(self.study_archive)
 
     def setup_create_data_tab_layout(self):
         """
@@ -109,58 +104,106 @@ class MainApp(QWidget):
         manual_inspection_tab_layout.addWidget(self.load_manual_inspection)
 
     def LoadManualInspection(self):
+        from utils import show_confirmation
+        from widgets.load_manual_inspection import LoadManualInspection
+
         self.manual_inspection_window = LoadManualInspection()
         if show_confirmation(self, "Show Manual Inspection Data?"):
             self.manual_inspection_window.show()
 
     def LoadFQV(self):
+        from utils import show_confirmation
+        from widgets.load_fqv import LoadFQV
+
         self.fqv_window = LoadFQV()
+        self.fqv_window.study_loaded.connect(self.update_compare_button)
+        self.update_compare_button()
         if show_confirmation(self, "Show FQV?"):
             self.fqv_window.show()
 
     def LoadMachineResults(self):
+        from utils import show_confirmation
+        from widgets.load_machine_results import LoadMachineResults
+
         self.machine_window = LoadMachineResults()
+        self.machine_window.study_loaded.connect(self.update_compare_button)
+        self.update_compare_button()
         if show_confirmation(self, "Show Machine Results?"):
             self.machine_window.show()
-        self.compare_results.setEnabled(True)
+
+    def update_compare_button(self):
+        """
+        Enable comparing once both the FQV and machine results have loaded.
+        """
+        windows = [
+            getattr(self, "fqv_window", None),
+            getattr(self, "machine_window", None),
+        ]
+        self.compare_results.setEnabled(
+            all(window is not None and window.is_loaded for window in windows)
+        )
 
     def CompareResults(self):
+        from knapp.study import Study
+        from widgets.compare_results import CompareResults
+
+        inspection_window = getattr(self, "manual_inspection_window", None)
         self.compare_window = CompareResults(
-            self.fqv_window.manual_results, self.machine_window.machine_results
+            Study(
+                manual=self.fqv_window.study.manual,
+                machine=self.machine_window.study.machine,
+                inspections=(
+                    inspection_window.study.inspections
+                    if inspection_window and inspection_window.is_loaded
+                    else None
+                ),
+            )
+        )
+        # Runs ingested from a watched folder update the comparison live.
+        self.machine_window.study_loaded.connect(
+            self.compare_window.set_machine_results
         )
         self.compare_window.show()
 
+    def StudyArchive(self):
+        from widgets.study_archive import StudyArchiveWindow
+
+        self.archive_window = StudyArchiveWindow()
+        self.archive_window.show()
+
     def create_fqv_window(self):
+        from widgets.create_fqv import CreateFQV
+
         self.create_fqv_window = CreateFQV()
         self.create_fqv_window.show()
 
     def create_manual_inspection_window(self):
+        from widgets.create_manual_inspection import CreateManualInspection
+
         self.create_manual_inspection_window = CreateManualInspection()
         self.create_manual_inspection_window.show()
 
     @pyqtSlot()
     def random_fqv_button(self):
-        inspectors = {}
-        for container in range(CONTAINER_START, CONTAINER_END + 1):
-            results = {f"container_{container}": random.randint(0, 10)}
-            inspectors.update(results)
+        from knapp.generate import generate_study
+        from knapp.storage import write_pickle_file
+        from knapp.study import array_to_results
 
         self.saveFileDialog()
         if self.fileName != "":
-            write_pickle_file(self.fileName, inspectors)
+            study = generate_study(CONTAINER_END)
+            write_pickle_file(self.fileName, array_to_results(study.manual))
 
     @pyqtSlot()
     def random_man_inspect_button(self):
-        inspectors = {}
-        for container in range(CONTAINER_START, CONTAINER_END + 1):
-            results = {
-                f"container_{container}": [random.randint(0, 10) for _ in range(5)]
-            }
-            inspectors.update(results)
+        from knapp.generate import generate_study
+        from knapp.storage import write_pickle_file
+        from knapp.study import array_to_results
 
         self.saveFileDialog()
         if self.fileName != "":
-            write_pickle_file(self.fileName, inspectors)
+            study = generate_study(CONTAINER_END)
+            write_pickle_file(self.fileName, array_to_results(study.inspections))
 
     def saveFileDialog(self):
         self.fileName, _ = QFileDialog.getSaveFileName(
@@ -174,4 +217,7 @@ class MainApp(QWidget):
 if __name__ == "__main__":
     app = QApplication(sys.argv)
     window = MainApp()
-    sys.exit(app.exec())
+    exit_code = app.exec()
+    # Let loads and bootstraps still running finish before Qt is torn down.
+    QThreadPool.globalInstance().waitForDone()
+    sys.exit(exit_code)
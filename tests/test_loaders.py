@@ -0,0 +1,100 @@
+import numpy as np
+import pytest
+from knapp.export import (
+    inspector_headers,
+    write_inspections_csv,
+    write_inspections_xml,
+    write_passes_csv,
+)
+from knapp.generate import generate_study
+from knapp.loaders import (
+    iterparse_elements,
+    load_manual_inspection_data,
+    load_study,
+    parse_fqv,
+    parse_run_values,
+)
+from knapp.storage import read_study_pickle, write_pickle_file, write_study_pickle
+from knapp.study import array_to_results
+
+RUN_XML = (
+    "<Knapp><Header/><ParticlesInspection>"
+    "<Sample><Spindle>1</Spindle><TotReject>3</TotReject>"
+    "<Detail><Sample><TotReject>7</TotReject></Sample></Detail></Sample>"
+    "<Sample><Spindle>2</Spindle><TotReject>5</TotReject></Sample>"
+    "</ParticlesInspection><CosmeticInspection>"
+    "<Sample><Spindle>1</Spindle><TotReject>9</TotReject></Sample>"
+    "</CosmeticInspection></Knapp>"
+)
+
+
+def test_run_values_only_read_particles_inspection(tmp_path):
+    file_path = tmp_path / "KnappRun_1_.xml"
+    file_path.write_text(RUN_XML)
+    assert parse_run_values(str(file_path)).tolist() == [3, 5]
+
+
+def test_fqv_only_reads_samples_below_the_root(tmp_path):
+    file_path = tmp_path / "fqv.xml"
+    file_path.write_text(
+        "<Study><Sample><Manual>6</Manual></Sample>"
+        "<Other><Sample><Manual>9</Manual></Sample></Other>"
+        "<Sample><Manual>2</Manual><Sample><Manual>8</Manual></Sample></Sample>"
+        "</Study>"
+    )
+    manual = parse_fqv(str(file_path))
+    assert manual.dtype == np.uint8
+    assert manual.tolist() == [6, 2]
+
+
+def test_samples_are_cleared_once_read(tmp_path):
+    file_path = tmp_path / "KnappRun_1_.xml"
+    file_path.write_text(RUN_XML)
+    samples = iterparse_elements(str(file_path), ("ParticlesInspection", "Sample"))
+    first = next(samples)
+    assert [element.tag for element in first] == ["Spindle", "TotReject", "Detail"]
+    second = next(samples)
+    assert len(first) == 0
+    assert second.findtext("TotReject") == "5"
+    assert next(samples, None) is None
+
+
+def test_passes_csv_keeps_its_inspectors_and_passes(tmp_path):
+    passes = generate_study(20, inspectors=6, seed=0, passes=True).passes[:, :, :5]
+    file_path = tmp_path / "inspections.csv"
+    write_passes_csv(str(file_path), passes)
+    loaded = load_manual_inspection_data(str(file_path))
+    assert loaded.shape == (20, 6, 5)
+    assert np.array_equal(loaded, passes)
+    assert inspector_headers(loaded)[-1] == "Inspector 6"
+
+
+def test_study_pickle_loads_back(tmp_path):
+    study = generate_study(30, seed=2, passes=True)
+    file_path = str(tmp_path / "study.pkl")
+    write_study_pickle(file_path, study)
+    loaded = load_study(
+        fqv_path=file_path, machine_paths=[file_path], inspection_path=file_path
+    )
+    for read in (loaded, read_study_pickle(file_path)):
+        assert np.array_equal(read.manual, study.manual)
+        assert np.array_equal(read.machine, study.machine)
+        assert np.array_equal(read.passes, study.passes)
+
+
+@pytest.mark.parametrize("extension", ["pkl", "csv", "xml"])
+def test_inspections_keep_every_inspector_and_pass(tmp_path, extension):
+    rng = np.random.default_rng(3)
+    passes = rng.integers(0, 2, (20, 6, 12)).astype(np.uint8)
+    counts = passes[:, :, :10].sum(axis=2).astype(np.uint8)
+    for inspections in (passes, counts):
+        file_path = str(tmp_path / f"inspections.{extension}")
+        if extension == "pkl":
+            write_pickle_file(file_path, array_to_results(inspections))
+        elif extension == "csv":
+            write_inspections_csv(file_path, inspections)
+        else:
+            write_inspections_xml(file_path, inspections)
+        loaded = load_manual_inspection_data(file_path)
+        assert loaded.shape == inspections.shape
+        assert np.array_equal(loaded, inspections)
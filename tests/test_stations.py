@@ -0,0 +1,18 @@
+from knapp.stations import parse_run_samples
+from knapp.study import NOT_INSPECTED
+
+
+def test_run_samples_only_read_particles_inspection(tmp_path):
+    file_path = tmp_path / "KnappRun_1_.xml"
+    file_path.write_text(
+        "<Knapp><ParticlesInspection>"
+        "<Sample><Spindle>1</Spindle><TotReject>3</TotReject><Cam2>1</Cam2></Sample>"
+        "<Sample><Spindle>2</Spindle><TotReject>5</TotReject><Cam1>4</Cam1></Sample>"
+        "</ParticlesInspection><CosmeticInspection>"
+        "<Sample><Spindle>1</Spindle><TotReject>9</TotReject><Cam3>9</Cam3></Sample>"
+        "</CosmeticInspection></Knapp>"
+    )
+    assert parse_run_samples(str(file_path)).tolist() == [
+        [1, 3, NOT_INSPECTED, 1],
+        [2, 5, 4, NOT_INSPECTED],
+    ]
@@ -0,0 +1,26 @@
+import numpy as np
+import pytest
+from knapp.generate import generate_study
+from knapp.stats import bootstrap_efficiency, inspections_to_resample
+
+
+def test_bootstrap_rejects_an_fqv_not_rebuilt_from_the_inspections():
+    study = generate_study(500, seed=1)
+    manual = study.manual.copy()
+    manual[:50] = 10
+    with pytest.raises(ValueError):
+        bootstrap_efficiency(manual, study.machine, study.inspections, 100, seed=0)
+    assert inspections_to_resample(manual, study.inspections) is None
+
+
+def test_bootstrap_intervals_bracket_the_efficiency():
+    study = generate_study(2000, seed=1)
+    inspections = inspections_to_resample(study.manual, study.inspections)
+    assert inspections is not None
+    intervals = bootstrap_efficiency(
+        study.manual, study.machine, inspections, 1000, seed=0
+    )
+    efficiency = study.efficiency()
+    for key in ("manual_vs_machine", "machine_vs_manual"):
+        low, high = intervals[key]
+        assert low <= np.asarray(efficiency[key]).item() <= high
@@ -0,0 +1,46 @@
+import knapp.watch
+from knapp.layout import MachineLayout
+from knapp.study import NOT_INSPECTED
+from knapp.watch import RunFolderWatcher
+
+
+def write_run(directory, run, values):
+    samples = "".join(
+        f"<Sample><TotReject>{value}</TotReject></Sample>" for value in values
+    )
+    (directory / f"KnappRun_{run}_.xml").write_text(
+        f"<Knapp><ParticlesInspection>{samples}</ParticlesInspection></Knapp>"
+    )
+
+
+def test_malformed_run_does_not_stop_the_runs_after_it(tmp_path):
+    write_run(tmp_path, 1, [1, 2])
+    write_run(tmp_path, 2, ["x0", 4])
+    write_run(tmp_path, 3, [5, 6])
+    watcher = RunFolderWatcher(str(tmp_path), layout=MachineLayout(2))
+    assert len(watcher.poll()) == 3
+    assert watcher.machine.tolist() == [1, 2, NOT_INSPECTED, 4, 5, 6]
+
+
+def test_unreadable_run_is_skipped_until_rewritten(tmp_path, monkeypatch):
+    read_machine_file = knapp.watch.read_machine_file
+
+    def read_run(file_path, *args):
+        if file_path.endswith("KnappRun_2_.xml"):
+            raise ValueError("bad run")
+        return read_machine_file(file_path, *args)
+
+    monkeypatch.setattr(knapp.watch, "read_machine_file", read_run)
+    for run in (1, 2, 3):
+        write_run(tmp_path, run, [run, run])
+    watcher = RunFolderWatcher(str(tmp_path), layout=MachineLayout(2))
+    assert len(watcher.poll()) == 2
+    assert watcher.machine.tolist() == [1, 1, NOT_INSPECTED, NOT_INSPECTED, 3, 3]
+    assert list(watcher.skipped) == [str(tmp_path / "KnappRun_2_.xml")]
+    assert watcher.poll() == []
+
+    monkeypatch.setattr(knapp.watch, "read_machine_file", read_machine_file)
+    write_run(tmp_path, 2, [2, 20])
+    assert watcher.poll() == [str(tmp_path / "KnappRun_2_.xml")]
+    assert watcher.machine.tolist() == [1, 1, 2, NOT_INSPECTED, 3, 3]
+    assert watcher.skipped == {}
@@ -1,42 +1,17 @@
-import csv
+import numpy as np
 from PyQt6.QtWidgets import (
     QApplication,
+    QLabel,
     QMessageBox,
-    QTableWidget,
+    QTableView,
     QTableWidgetItem,
-    QStyledItemDelegate,
     QFileDialog,
 )
-from PyQt6.QtCore import Qt
+from PyQt6.QtCore import Qt, QAbstractTableModel, QModelIndex, pyqtSignal
 from PyQt6.QtGui import QBrush, QColor
-import pickle
-from constants import ACCEPT_THRESHOLD, GREYZONE_THRESHOLD, REJECT_THRESHOLD
-
-
-def read_pickle_file(file_path):
-    """
-    Read data from a pickle file.
-
-    Parameters:
-        file_path (str): The path to the pickle file.
-
-    Returns:
-        object: The data read from the pickle file.
-    """
-    with open(file_path, "rb") as fp:
-        return pickle.load(fp)
-
-
-def write_pickle_file(file_path, data):
-    """
-    Write data to a pickle file.
-
-    Parameters:
-        file_path (str): The path to the pickle file.
-        data (object): The data to be written to the file.
-    """
-    with open(file_path, "wb") as fp:
-        pickle.dump(data, fp)
+from knapp.export import RESULT_TEXT, write_results_csv
+from knapp.study import MAX_RESULT, NOT_INSPECTED
+from knapp.zones import ZONE_TABLE, zones
 
 
 def show_confirmation(parent, message):
@@ -60,123 +35,349 @@ def show_confirmation(parent, message):
     return confirmation == QMessageBox.StandardButton.Yes
 
 
-class ColourCell(QStyledItemDelegate):
-    def __init__(self):
-        super().__init__()
+# Background brush of each zone, the empty zone is left unpainted.
+ZONE_BRUSHES = [
+    QBrush(QColor(0, 150, 0)),
+    QBrush(QColor(255, 165, 0)),
+    QBrush(QColor(255, 0, 0)),
+    None,
+]
+# Item data role serving the zone of a cell.
+ZoneRole = Qt.ItemDataRole.UserRole + 1
 
-    def initStyleOption(self, option, index):
-        """
-        Initialize the style options for a table cell based on its value.
 
-        Parameters:
-            option: Style options for the cell.
-            index: Index of the cell in the model.
-        """
-        super().initStyleOption(option, index)
+def result_text(value):
+    """
+    Return the text shown for a result, -1 for containers not inspected.
 
-        try:
-            value = int(index.data(Qt.ItemDataRole.DisplayRole))
-            # Colour cells based on the threshold values
-            if 0 <= value <= ACCEPT_THRESHOLD:
-                option.backgroundBrush = QBrush(QColor(0, 150, 0))
-            elif ACCEPT_THRESHOLD < value <= GREYZONE_THRESHOLD:
-                option.backgroundBrush = QBrush(QColor(255, 165, 0))
-            elif value >= REJECT_THRESHOLD:
-                option.backgroundBrush = QBrush(QColor(255, 0, 0))
-        except ValueError:
-            option.backgroundBrush = QBrush(QColor(0, 150, 0))
+    Parameters:
+        value (int): Stored result value.
 
+    Returns:
+        str: The text to display.
+    """
+    return RESULT_TEXT[value]
 
-def setup_results_table(results, result_type):
+
+def entry_value(text):
     """
-    Set up a QTableWidget with colour coded cells.
+    Convert text entered into a table to a stored result.
+
+    -1 marks a container as not inspected, anything that is not a result
+    from 0 to 10 is reset to 0.
 
     Parameters:
-        results (dict): Dictionary containing result values.
-        result_type (str): Type of result.
+        text (str): The entered text.
 
     Returns:
-        tuple: QTableWidget and a dictionary of QTableWidgetItem objects.
+        int: The stored result value.
     """
-    results_table = QTableWidget()
-    results_table.setRowCount(250)
-    results_table.setColumnCount(1)
-    results_table.setHorizontalHeaderLabels([result_type])
+    try:
+        value = int(text)
+    except (ValueError, TypeError):
+        return 0
+    if value == -1:
+        return NOT_INSPECTED
+    return value if 0 <= value <= MAX_RESULT else 0
 
-    containers = {}
 
-    for container in range(1, 251):
-        containers[container] = QTableWidgetItem(
-            str(results.get(f"container_{container}", 0))
-        )
-        results_table.setItem(container - 1, 0, containers[container])
-        containers[container].setFlags(
-            containers[container].flags() & ~Qt.ItemFlag.ItemIsEditable
-        )
-        if int(containers[container].text()) > REJECT_THRESHOLD:
-            containers[container].setData(Qt.ItemDataRole.UserRole, "high_value")
+def is_result_text(text):
+    """
+    Return whether entered text is a result from 0 to 10 or -1.
 
-    colour_cell = ColourCell()
-    results_table.itemChanged.connect(handle_item_changed)
-    results_table.setItemDelegate(colour_cell)
+    Parameters:
+        text (str): The entered text.
 
-    return results_table, containers
+    Returns:
+        bool: False if entry_value resets the text to 0.
+    """
+    try:
+        value = int(text)
+    except (ValueError, TypeError):
+        return False
+    return value == -1 or 0 <= value <= MAX_RESULT
 
 
-def export_table_to_csv(table: QTableWidget):
+def parse_clipboard(text):
     """
-    Export the contents of a QTableWidget to a CSV file.
+    Split tab separated clipboard text into a block of cells.
+
+    Each distinct text is numbered once, so a block of any size only holds
+    a handful of different texts to validate. The line break spreadsheets
+    add after the last row is ignored, and text without any cell, such as a
+    lone line break, gives an empty block.
 
     Parameters:
-        table (QTableWidget): The table to be exported.
+        text (str): Text copied from a table or spreadsheet.
+
+    Returns:
+        tuple: int32 array (rows, columns) with the number of each cell's
+            text, -1 where a short row has no cell, and the list of texts.
     """
-    path, ok = QFileDialog.getSaveFileName(None, "Save CSV", "", "CSV(*.csv)")
-    if ok:
-        columns = range(table.columnCount())
-        header = [table.horizontalHeaderItem(column).text() for column in columns]
-        with open(path, "w") as csvfile:
-            writer = csv.writer(csvfile, dialect="excel", lineterminator="\n")
-            writer.writerow(header)
-            for row in range(table.rowCount()):
-                writer.writerow(table.item(row, column).text() for column in columns)
+    lines = text.splitlines()
+    if not any(lines):
+        lines = []
+    widths = [line.count("\t") + 1 for line in lines]
+    numbers = {}
+    if len(set(widths)) <= 1:
+        cells = "\t".join(lines).split("\t") if lines else []
+        codes = np.array(
+            [numbers.setdefault(cell, len(numbers)) for cell in cells], dtype=np.int32
+        ).reshape(len(lines), widths[0] if lines else 0)
+    else:
+        codes = np.full((len(lines), max(widths)), -1, dtype=np.int32)
+        for row, line in enumerate(lines):
+            codes[row, : widths[row]] = [
+                numbers.setdefault(cell, len(numbers)) for cell in line.split("\t")
+            ]
+    return codes, list(numbers)
+
+
+def entry_values(codes, texts):
+    """
+    Convert a parsed block of cells to stored results, as entry_value does.
 
+    Parameters:
+        codes (numpy.ndarray): Number of each cell's text, -1 for no cell.
+        texts (list): The distinct texts, as returned by parse_clipboard.
 
-def reset_value(value):
+    Returns:
+        tuple: uint8 array of stored results and a boolean array marking the
+            cells that were not a result and were reset to 0.
     """
-    Reset the value to 0 if it's higher than 10 or not an integer.
+    # The extra entry at the end is looked up by the -1 of missing cells.
+    values = np.array([entry_value(text) for text in texts] + [0], dtype=np.uint8)
+    reset = np.array([not is_result_text(text) for text in texts] + [False])
+    return values[codes], reset[codes]
+
+
+class ResultsTableModel(QAbstractTableModel):
     """
-    try:
-        int_value = int(value)
-        if int_value > 10:
-            return "0"
-    except (ValueError, TypeError):
-        return "0"
-    return value
+    Table model serving result arrays, one array per column.
 
+    Cells are read from the arrays when the view asks for them, so the cost
+    of building a table does not depend on the number of containers. Edits
+    are written straight back into the arrays. The accept, grey or reject
+    zone of every cell is worked out once per column and served as ZoneRole,
+    so painting a cell's background is a single lookup.
 
-def handle_item_changed(item):
+    Attributes:
+        columns (list): One uint8 result array per column.
+        headers (list): Column headers.
+        editable (bool): Whether cells can be edited.
+        zones (list): uint8 zone array of each column.
+
+    Signals:
+        pasted (int, int): Cells written by paste_block and how many of them
+            were reset to 0.
     """
-    Resets the value to 0 if it's higher than 10 on the itemChanged signal.
+
+    pasted = pyqtSignal(int, int)
+
+    def __init__(self, columns, headers, editable=False):
+        super().__init__()
+        self.columns = list(columns)
+        self.headers = list(headers)
+        self.editable = editable
+        self.zone_table = ZONE_TABLE
+        self.update_zones()
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.columns[0])
+
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.columns)
+
+    def data(self, index, role=Qt.ItemDataRole.DisplayRole):
+        if not index.isValid():
+            return None
+        if role in (Qt.ItemDataRole.DisplayRole, Qt.ItemDataRole.EditRole):
+            return RESULT_TEXT[self.columns[index.column()][index.row()]]
+        if role == Qt.ItemDataRole.BackgroundRole:
+            return ZONE_BRUSHES[self.zones[index.column()][index.row()]]
+        if role == ZoneRole:
+            return int(self.zones[index.column()][index.row()])
+        return None
+
+    def headerData(self, section, orientation, role=Qt.ItemDataRole.DisplayRole):
+        if role != Qt.ItemDataRole.DisplayRole:
+            return None
+        if orientation == Qt.Orientation.Horizontal:
+            return self.headers[section]
+        return str(section + 1)
+
+    def flags(self, index):
+        flags = super().flags(index)
+        if self.editable:
+            flags |= Qt.ItemFlag.ItemIsEditable
+        return flags
+
+    def setData(self, index, value, role=Qt.ItemDataRole.EditRole):
+        if not index.isValid() or not self.editable:
+            return False
+        if role != Qt.ItemDataRole.EditRole:
+            return False
+        value = entry_value(value)
+        self.columns[index.column()][index.row()] = value
+        self.zones[index.column()][index.row()] = self.zone_table[value]
+        self.dataChanged.emit(index, index)
+        return True
+
+    def paste_block(self, row, column, text):
+        """
+        Paste tab separated text with its top left cell at (row, column).
+
+        The whole block is validated at once and written with a single
+        dataChanged, values that are not a result are reset to 0 and cells
+        past the edge of the table are dropped.
+
+        Parameters:
+            row (int): Row of the top left cell.
+            column (int): Column of the top left cell.
+            text (str): Tab separated rows of values.
+
+        Returns:
+            tuple: Number of cells written and how many were reset to 0.
+        """
+        if not self.editable:
+            return 0, 0
+        codes, texts = parse_clipboard(text)
+        codes = codes[
+            : max(self.rowCount() - row, 0), : max(self.columnCount() - column, 0)
+        ]
+        present = codes >= 0
+        if not present.any():
+            return 0, 0
+        values, invalid = entry_values(codes, texts)
+        rows, columns = codes.shape
+        for offset in range(columns):
+            target = self.columns[column + offset][row : row + rows]
+            np.copyto(target, values[:, offset], where=present[:, offset])
+            self.zones[column + offset][row : row + rows] = zones(
+                target, self.zone_table
+            )
+        self.dataChanged.emit(
+            self.index(row, column),
+            self.index(row + rows - 1, column + columns - 1),
+        )
+        written = int(present.sum())
+        reset = int(invalid.sum())
+        self.pasted.emit(written, reset)
+        return written, reset
+
+    def set_columns(self, columns, headers=None):
+        """
+        Replace the arrays served by the model.
+
+        Parameters:
+            columns (list): One uint8 result array per column.
+            headers (list): Column headers, unchanged if None.
+        """
+        self.beginResetModel()
+        self.columns = list(columns)
+        if headers is not None:
+            self.headers = list(headers)
+        self.update_zones()
+        self.endResetModel()
+
+    def update_zones(self):
+        self.zones = [zones(column, self.zone_table) for column in self.columns]
+
+    def set_zone_table(self, table):
+        """
+        Colour the cells with the zones of a different set of thresholds.
+
+        Parameters:
+            table (numpy.ndarray): Zone of each value, from zone_table.
+        """
+        self.zone_table = table
+        self.update_zones()
+        self.dataChanged.emit(
+            self.index(0, 0),
+            self.index(self.rowCount() - 1, self.columnCount() - 1),
+            [Qt.ItemDataRole.BackgroundRole, ZoneRole],
+        )
+
+
+class PasteLabel(QLabel):
+    """
+    Label reporting the last paste into a ResultsTableModel.
     """
-    if isinstance(item, QTableWidgetItem) and item.column() < 5:
-        item.setText(reset_value(item.text()))
 
+    def __init__(self, model, parent=None):
+        super().__init__(parent)
+        model.pasted.connect(self.show_paste_result)
+
+    def show_paste_result(self, written, reset):
+        """
+        Report how many pasted cells were not a result and were reset to 0.
 
-class TableWidget(QTableWidget):
+        Parameters:
+            written (int): Number of cells pasted.
+            reset (int): Number of those cells reset to 0.
+        """
+        self.setText(f"Pasted {written} cells, {reset} invalid values reset to 0")
+
+
+def setup_results_table(results, result_type):
     """
-    Custom QTableWidget class to add paste functionality.
+    Set up a read-only QTableView with colour coded cells.
 
-    Attributes:
-        rows (int): Number of rows in the table.
-        columns (int): Number of columns in the table.
+    Parameters:
+        results (numpy.ndarray): Result value per container.
+        result_type (str): Type of result.
+
+    Returns:
+        tuple: QTableView and the ResultsTableModel behind it.
+    """
+    results_model = ResultsTableModel([results], [result_type])
+    results_table = QTableView()
+    results_table.setModel(results_model)
+    return results_table, results_model
+
+
+def export_table_to_csv(table: QTableView):
+    """
+    Export the contents of a table backed by a ResultsTableModel to a CSV file.
+
+    Parameters:
+        table (QTableView): The table to be exported.
+    """
+    path, ok = QFileDialog.getSaveFileName(None, "Save CSV", "", "CSV(*.csv)")
+    if ok:
+        model = table.model()
+        write_results_csv(path, model.headers, model.columns)
+
+
+def fill_table(table, headers, rows, row_headers=None):
+    """
+    Fill a table widget with rows of text.
+
+    Parameters:
+        table (QTableWidget): The table to fill.
+        headers (list): Column headers.
+        rows (list): One list of texts per row.
+        row_headers (list): Row headers, None to number the rows.
+    """
+    table.setColumnCount(len(headers))
+    table.setRowCount(len(rows))
+    table.setHorizontalHeaderLabels(headers)
+    if row_headers is not None:
+        table.setVerticalHeaderLabels(row_headers)
+    for row, values in enumerate(rows):
+        for column, value in enumerate(values):
+            table.setItem(row, column, QTableWidgetItem(value))
+    table.resizeColumnsToContents()
+
+
+class TableView(QTableView):
+    """
+    Custom QTableView class to add paste functionality.
 
     Methods:
         keyPressEvent(event): Overrides the keyPressEvent to handle Ctrl+V for pasting data.
     """
 
-    def __init__(self, rows, columns, parent=None):
-        super().__init__(rows, columns)
-
     def keyPressEvent(self, event):
         """
         Overrides the keyPressEvent to handle Ctrl+V for pasting data into selected cells.
@@ -190,17 +391,9 @@ class TableWidget(QTableWidget):
             selection = self.selectedIndexes()
 
             if selection:
-                row_anchor = selection[0].row()
-                column_anchor = selection[0].column()
-
-                clipboard = QApplication.clipboard()
-
-                rows = clipboard.text().split("\n")
-                for indx_row, row in enumerate(rows):
-                    values = row.split("\t")
-                    for indx_col, value in enumerate(values):
-                        item = QTableWidgetItem(value)
-                        self.setItem(
-                            row_anchor + indx_row, column_anchor + indx_col, item
-                        )
-            super().keyPressEvent(event)
+                self.model().paste_block(
+                    min(index.row() for index in selection),
+                    min(index.column() for index in selection),
+                    QApplication.clipboard().text(),
+                )
+        super().keyPressEvent(event)
@@ -1,20 +1,51 @@
+from knapp.efficiency import CATEGORIES, CumulativeCounts
+from knapp.stats import CONFIDENCE, bootstrap_efficiency, inspections_to_resample
+from knapp.storage import write_study_file, write_study_pickle
+from knapp.study import MAX_RESULT, NOT_INSPECTED, Study
+from knapp.zones import zone_table
+from constants import ACCEPT_THRESHOLD, GREYZONE_THRESHOLD, REJECT_THRESHOLD
 from utils import (
     export_table_to_csv,
-    ColourCell,
+    ResultsTableModel,
 )
+from widgets.workers import LoaderWorker
+from PyQt6.QtCore import pyqtSignal
 from PyQt6.QtWidgets import (
+    QDialog,
+    QHBoxLayout,
+    QLabel,
     QPushButton,
+    QSpinBox,
     QVBoxLayout,
     QMainWindow,
     QWidget,
-    QTableWidget,
-    QTableWidgetItem,
+    QTableView,
     QFileDialog,
 )
-from PyQt6.QtCore import Qt
-from matplotlib.backends.backend_qt5agg import FigureCanvasQTAgg as FigureCanvas
-from matplotlib.figure import Figure
-from constants import CONTAINER_START, CONTAINER_END
+
+
+def study_intervals(study, reject_threshold, progress=None):
+    """
+    Bootstrap the confidence intervals of a study on a LoaderWorker.
+
+    The inspectors are resampled as well when the FQV was rebuilt from them.
+
+    Parameters:
+        study (Study): The study.
+        reject_threshold (int): Lowest category in the reject zone.
+        progress (function): Unused, the bootstrap is a single step.
+
+    Returns:
+        tuple: The study, the reject threshold and the intervals returned by
+            bootstrap_efficiency.
+    """
+    intervals = bootstrap_efficiency(
+        study.manual,
+        study.machine,
+        inspections_to_resample(study.manual, study.inspections),
+        reject_threshold=reject_threshold,
+    )
+    return study, reject_threshold, intervals
 
 
 class CompareResults(QWidget):
@@ -22,10 +53,9 @@ class CompareResults(QWidget):
     Class for comparing manual and machine inspection results.
     """
 
-    def __init__(self, manual_results=None, machine_results=None):
+    def __init__(self, study=None):
         super().__init__()
-        self.manual_results = manual_results or {}
-        self.machine_results = machine_results or {}
+        self.study = study if study is not None else Study()
         self.efficiency_window = None
         self.CompareResultsUI()
 
@@ -36,45 +66,27 @@ class CompareResults(QWidget):
         self.compare_results_widget = QVBoxLayout()
         self.setGeometry(600, 100, 300, 600)
         self.setWindowTitle("FQV vs Machine Results")
-        self.manual_containers = {}
-        self.machine_containers = {}
-        self.table = QTableWidget()
-        self.table.setRowCount(CONTAINER_END)
-        self.table.setColumnCount(2)
-        self.table.setHorizontalHeaderLabels(["Manual", "Machine"])
-
-        for container in range(CONTAINER_START, CONTAINER_END + 1):
-            manual_item = QTableWidgetItem(
-                str(self.manual_results.get(f"container_{container}", 0))
-            )
-            machine_item = QTableWidgetItem(
-                str(self.machine_results.get(f"container_{container}", 0))
-            )
-
-            manual_item.setFlags(manual_item.flags() & ~Qt.ItemFlag.ItemIsEditable)
-            machine_item.setFlags(machine_item.flags() & ~Qt.ItemFlag.ItemIsEditable)
-
-            self.table.setItem(container - 1, 0, manual_item)
-            self.table.setItem(container - 1, 1, machine_item)
-
-            if int(manual_item.text()) > 7:
-                manual_item.setData(Qt.ItemDataRole.UserRole, "high_value")
-            if int(machine_item.text()) > 7:
-                machine_item.setData(Qt.ItemDataRole.UserRole, "high_value")
-
-            self.manual_containers[f"container_{container}"] = int(manual_item.text())
-            self.machine_containers[f"container_{container}"] = int(machine_item.text())
+        self.table_model = ResultsTableModel(
+            [self.study.manual, self.study.machine], ["Manual", "Machine"]
+        )
+        self.table = QTableView()
+        self.table.setModel(self.table_model)
 
-        self.table.setItemDelegate(ColourCell())
         self.show_efficiency_button = QPushButton("Calculate efficiency", self)
         self.show_efficiency_button.clicked.connect(self.show_efficiency)
         self.export_button = QPushButton("Export (csv)", self)
         self.export_button.clicked.connect(self.export_compare_results_data)
+        self.save_study_button = QPushButton("Save study", self)
+        self.save_study_button.clicked.connect(self.save_study)
+        self.archive_button = QPushButton("Add to archive", self)
+        self.archive_button.clicked.connect(self.archive_study)
         self.close_button = QPushButton("Close", self)
         self.close_button.clicked.connect(self.close)
         button_layout = QVBoxLayout()
         button_layout.addWidget(self.show_efficiency_button)
         button_layout.addWidget(self.export_button)
+        button_layout.addWidget(self.save_study_button)
+        button_layout.addWidget(self.archive_button)
         button_layout.addWidget(self.close_button)
         self.compare_results_widget.addWidget(self.table)
         self.compare_results_widget.addLayout(button_layout)
@@ -85,21 +97,91 @@ class CompareResults(QWidget):
             self.efficiency_window.showNormal()
             self.efficiency_window.activateWindow()
         else:
-            self.efficiency_window = EfficiencyWindow(
-                self.manual_containers, self.machine_containers
-            )
+            self.efficiency_window = EfficiencyWindow(self.study)
+            self.efficiency_window.thresholds_changed.connect(self.set_thresholds)
             self.efficiency_window.show()
 
+    def set_machine_results(self, study):
+        """
+        Show new machine results, e.g. as runs land in a watched folder.
+
+        Parameters:
+            study (Study): Study holding the machine results.
+        """
+        self.study = Study(
+            self.study.manual,
+            study.machine,
+            self.study.inspections if self.study.passes is None else self.study.passes,
+            self.study.title,
+            metadata=self.study.metadata,
+        )
+        self.table_model.set_columns([self.study.manual, self.study.machine])
+        if self.efficiency_window is not None:
+            self.efficiency_window.set_study(self.study)
+
+    def set_thresholds(self, accept, greyzone, reject):
+        """
+        Colour the table with the thresholds chosen in the efficiency window.
+        """
+        self.table_model.set_zone_table(zone_table(accept, greyzone, reject))
+
     def export_compare_results_data(self):
         export_table_to_csv(self.table)
 
+    def archive_study(self):
+        """
+        Add the study to the study archive with the details entered.
+        """
+        from knapp.archive import StudyArchive
+        from widgets.study_archive import ArchiveDetails
+
+        details_dialog = ArchiveDetails(self, self.study.metadata)
+        if details_dialog.exec() == QDialog.DialogCode.Accepted:
+            with StudyArchive() as archive:
+                archive.add_study(self.study, **details_dialog.details())
+
+    def save_study(self):
+        """
+        Save the study as a study file, or as a pickle for older versions.
+        """
+        fileName, _ = QFileDialog.getSaveFileName(
+            self,
+            "Save Study",
+            "",
+            "Study (*.kfqv);;Pickle (*.pkl)",
+        )
+        if fileName.endswith(".pkl"):
+            write_study_pickle(fileName, self.study)
+        elif fileName:
+            if not fileName.endswith(".kfqv"):
+                fileName += ".kfqv"
+            write_study_file(fileName, self.study)
+
 
 class EfficiencyWindow(QMainWindow):
     """
     Class for displaying a bar chart comparing manual and machine efficiency.
+
+    The thresholds can be changed to see the efficiency with a different
+    reject zone, each staying between its neighbours. The category counts are worked out once, so a change only
+    looks up the new totals before redrawing. The bootstrap intervals are
+    worked out on the thread pool and added to the chart once they are done.
+
+    Signals:
+        thresholds_changed (int, int, int): The accept, grey zone and reject
+            thresholds chosen.
     """
 
-    def __init__(self, manual_results=None, machine_results=None):
+    thresholds_changed = pyqtSignal(int, int, int)
+
+    def __init__(self, study=None):
+        # matplotlib takes a while to import, so it is only loaded once a
+        # chart is actually shown.
+        from matplotlib.backends.backend_qt5agg import (
+            FigureCanvasQTAgg as FigureCanvas,
+        )
+        from matplotlib.figure import Figure
+
         super().__init__()
 
         self.setWindowTitle("Machine vs Manual")
@@ -107,30 +189,140 @@ class EfficiencyWindow(QMainWindow):
 
         self.central_widget = QWidget(self)
         self.setCentralWidget(self.central_widget)
-        self.manual_containers = manual_results or {}
-        self.machine_containers = machine_results or {}
+        self.study = study if study is not None else Study()
+        self.cumulative_counts = CumulativeCounts(self.study.manual, self.study.machine)
+        # Bootstrap intervals by reject threshold, worked out when first shown.
+        self.intervals = {}
+        self.intervals_worker = None
 
         self.efficiency_canvas = FigureCanvas(Figure(figsize=(8, 6), dpi=100))
 
+        threshold_layout = QHBoxLayout()
+        self.accept_input = self.threshold_input(
+            threshold_layout, "Accept up to", ACCEPT_THRESHOLD
+        )
+        self.greyzone_input = self.threshold_input(
+            threshold_layout, "Grey zone up to", GREYZONE_THRESHOLD
+        )
+        self.reject_input = self.threshold_input(
+            threshold_layout, "Reject from", REJECT_THRESHOLD
+        )
+        self.limit_thresholds()
+
         self.save_chart_button = QPushButton("Save Chart", self)
         self.save_chart_button.clicked.connect(self.save_chart)
         self.close_button = QPushButton("Close", self)
         self.close_button.clicked.connect(self.close)
 
         self.central_layout = QVBoxLayout(self.central_widget)
+        self.central_layout.addLayout(threshold_layout)
         self.central_layout.addWidget(self.efficiency_canvas)
         self.central_layout.addWidget(self.save_chart_button)
         self.central_layout.addWidget(self.close_button)
 
         self.plot_bar_chart()
 
+    def threshold_input(self, layout, text, value):
+        threshold_input = QSpinBox(self)
+        threshold_input.setRange(0, MAX_RESULT)
+        threshold_input.setValue(value)
+        threshold_input.valueChanged.connect(self.update_thresholds)
+        layout.addWidget(QLabel(text))
+        layout.addWidget(threshold_input)
+        return threshold_input
+
+    def limit_thresholds(self):
+        """
+        Keep the accept threshold below the grey zone and the grey zone below
+        the reject threshold, by limiting each input to its neighbours.
+        """
+        accept, greyzone, reject = self.thresholds()
+        self.accept_input.setMaximum(greyzone - 1)
+        self.greyzone_input.setRange(accept + 1, reject - 1)
+        self.reject_input.setMinimum(greyzone + 1)
+
+    def thresholds(self):
+        """
+        Return the accept, grey zone and reject thresholds chosen.
+        """
+        return (
+            self.accept_input.value(),
+            self.greyzone_input.value(),
+            self.reject_input.value(),
+        )
+
+    def set_study(self, study):
+        """
+        Redraw the chart for a different study.
+
+        Parameters:
+            study (Study): The study to show.
+        """
+        self.study = study
+        self.cumulative_counts = CumulativeCounts(self.study.manual, self.study.machine)
+        self.intervals = {}
+        self.cancel_intervals()
+        self.efficiency_canvas.figure.clear()
+        self.plot_bar_chart()
+
+    def update_thresholds(self):
+        self.limit_thresholds()
+        self.efficiency_canvas.figure.clear()
+        self.plot_bar_chart()
+        self.thresholds_changed.emit(*self.thresholds())
+
+    def confidence_intervals(self, reject_threshold):
+        """
+        Return the bootstrap confidence intervals for a reject threshold.
+
+        Intervals that have not been worked out yet are started on the
+        thread pool, and the chart is redrawn when they are done.
+
+        Returns:
+            dict: See knapp.stats.bootstrap_efficiency, None while the
+                intervals are being worked out.
+        """
+        if reject_threshold not in self.intervals:
+            self.cancel_intervals()
+            self.intervals_worker = LoaderWorker(
+                study_intervals, self.study, reject_threshold
+            )
+            self.intervals_worker.signals.finished.connect(self.show_intervals)
+            self.intervals_worker.start()
+        return self.intervals.get(reject_threshold)
+
+    def cancel_intervals(self):
+        if self.intervals_worker is not None:
+            self.intervals_worker.cancel()
+            self.intervals_worker = None
+
+    def show_intervals(self, result):
+        """
+        Add bootstrap intervals to the chart once they are worked out.
+
+        Parameters:
+            result (tuple): Study, reject threshold and intervals, as
+                returned by study_intervals.
+        """
+        study, reject_threshold, intervals = result
+        if study is not self.study:
+            return
+        self.intervals[reject_threshold] = intervals
+        self.intervals_worker = None
+        if reject_threshold == self.reject_input.value():
+            self.efficiency_canvas.figure.clear()
+            self.plot_bar_chart()
+
     def plot_bar_chart(self):
         """
         Plot a bar chart comparing manual and machine efficiency.
         """
         ax = self.efficiency_canvas.figure.add_subplot(111)
+        accept, greyzone, reject = self.thresholds()
 
-        if not self.manual_containers or not self.machine_containers:
+        if (self.study.manual == NOT_INSPECTED).all() or (
+            self.study.machine == NOT_INSPECTED
+        ).all():
             ax.text(
                 0.5,
                 0.5,
@@ -141,17 +333,29 @@ class EfficiencyWindow(QMainWindow):
                 color="gray",
             )
         else:
-            values = list(range(11))
-            manual_counts = [
-                list(self.manual_containers.values()).count(value) for value in values
-            ]
-            machine_counts = [
-                list(self.machine_containers.values()).count(value) for value in values
-            ]
+            efficiency = {
+                key: value[0].tolist()
+                for key, value in self.cumulative_counts.efficiency(reject).items()
+            }
+            values = CATEGORIES
+            manual_counts = efficiency["manual_counts"]
+            machine_counts = efficiency["machine_counts"]
 
             bar_width = 0.35
             index = range(len(values))
 
+            # Shade the grey and reject zones behind the pairs of bars.
+            centre = bar_width / 2
+            ax.axvspan(
+                accept + centre + 0.5,
+                greyzone + centre + 0.5,
+                color="orange",
+                alpha=0.1,
+            )
+            ax.axvspan(
+                reject + centre - 0.5, MAX_RESULT + centre + 0.5, color="red", alpha=0.1
+            )
+
             for i, count in enumerate(manual_counts):
                 ax.bar(
                     i, count, bar_width, color="blue", label="Manual" if i == 0 else ""
@@ -190,23 +394,31 @@ class EfficiencyWindow(QMainWindow):
             ax.set_xticks([i + bar_width / 2 for i in index])
             ax.set_xticklabels(values)
 
-            # Calculate efficiency only for values 7 or above
-            total_manual = sum(manual_counts[7:])
-            total_machine = sum(machine_counts[7:])
-            efficacy_manual_to_machine = (
-                total_manual / total_machine * 100 if total_machine > 0 else 0
-            )
-            efficacy_machine_to_manual = (
-                total_machine / total_manual * 100 if total_manual > 0 else 0
-            )
-
+            efficacy_manual_to_machine = efficiency["manual_vs_machine"]
+            efficacy_machine_to_manual = efficiency["machine_vs_manual"]
+
+            intervals = self.confidence_intervals(reject)
+            if intervals is None:
+                pending = f" ({CONFIDENCE:.0%} CI being worked out)"
+                intervals_text = {
+                    "manual_vs_machine": pending,
+                    "machine_vs_manual": pending,
+                }
+            else:
+                confidence = f"{intervals['confidence']:.0%} CI"
+                intervals_text = {}
+                for key in ("manual_vs_machine", "machine_vs_manual"):
+                    low, high = intervals[key]
+                    intervals_text[key] = f" ({confidence} {low:.2f}% to {high:.2f}%)"
             text_manual_vs_machine = (
                 f"Manual vs Machine Efficiency: {efficacy_manual_to_machine:.2f}%"
+                + intervals_text["manual_vs_machine"]
             )
             text_machine_vs_manual = (
                 f"Machine vs Manual Efficiency: {efficacy_machine_to_manual:.2f}%"
+                + intervals_text["machine_vs_manual"]
             )
-            num_containers_inspected = len(self.manual_containers)
+            num_containers_inspected = efficiency["containers_inspected"]
             ax.annotate(
                 f"Containers Inspected: {num_containers_inspected}",
                 xy=(0.5, 0.85),
@@ -235,7 +447,7 @@ class EfficiencyWindow(QMainWindow):
                 color="orange",
             )
 
-            ax.legend()
+            ax.legend(loc="center right")
 
         self.efficiency_canvas.draw()
 
@@ -248,3 +460,7 @@ class EfficiencyWindow(QMainWindow):
 
         if file_name:
             self.efficiency_canvas.figure.savefig(file_name)
+
+    def closeEvent(self, event):
+        self.cancel_intervals()
+        super().closeEvent(event)
@@ -1,10 +1,11 @@
-import xml.etree.ElementTree as ET
+import numpy as np
+from knapp.loaders import load_fqv
+from knapp.storage import write_pickle_file
+from knapp.study import array_to_results, fit_results
 from utils import (
-    write_pickle_file,
-    read_pickle_file,
-    ColourCell,
-    handle_item_changed,
-    TableWidget,
+    PasteLabel,
+    ResultsTableModel,
+    TableView,
 )
 from PyQt6.QtWidgets import (
     QPushButton,
@@ -12,23 +13,23 @@ from PyQt6.QtWidgets import (
     QWidget,
     QLabel,
     QFileDialog,
-    QTableWidgetItem,
     QDialog,
     QDialogButtonBox,
     QSpinBox,
 )
-from constants import CONTAINER_START, CONTAINER_END
+from constants import MAX_CONTAINERS
 
 
 class ContainerInput(QDialog):
-    def __init__(self, parent=None):
+    def __init__(self, parent=None, value=0):
         super(ContainerInput, self).__init__(parent)
         self.setWindowTitle("Number of Containers")
         self.layout = QVBoxLayout(self)
 
         self.label = QLabel("Enter the number of containers:")
         self.container_input = QSpinBox(self)
-        self.container_input.setMaximum(250)
+        self.container_input.setMaximum(MAX_CONTAINERS)
+        self.container_input.setValue(value)
 
         self.buttons = QDialogButtonBox(
             QDialogButtonBox.StandardButton.Ok | QDialogButtonBox.StandardButton.Cancel
@@ -50,8 +51,6 @@ class CreateFQV(QWidget):
         super().__init__()
         self.setGeometry(600, 100, 150, 600)
         self.setWindowTitle("Create FQV Results")
-        self.manual_results = {}
-        self.fqv_containers = {}
         self.num_containers = 0
         self.CreateFQVUI()
 
@@ -77,6 +76,7 @@ class CreateFQV(QWidget):
 
         self.fqv_widget.addWidget(title)
         self.fqv_widget.addWidget(self.fqv_results_table)
+        self.fqv_widget.addWidget(self.paste_label)
         self.fqv_widget.addWidget(self.save_button)
         self.fqv_widget.addWidget(self.open_button)
         self.fqv_widget.addWidget(self.close_button)
@@ -94,32 +94,18 @@ class CreateFQV(QWidget):
         """
         Setup the table for displaying FQV results.
         """
-        self.fqv_results_table = TableWidget(self.num_containers, 1)
-        self.fqv_results_table.setHorizontalHeaderLabels(["Manual"])
-
-        for container in range(1, self.num_containers + 1):
-            self.fqv_containers[container] = QTableWidgetItem("0")
-            self.fqv_results_table.setItem(
-                container - 1, 0, self.fqv_containers[container]
-            )
-
-        for container in range(self.num_containers + 1, CONTAINER_END + 1):
-            self.fqv_containers[container] = QTableWidgetItem("-1")
-            self.fqv_results_table.setItem(
-                container - 1, 0, self.fqv_containers[container]
-            )
-
-        self.fqv_results_table.setItemDelegate(ColourCell())
-        self.fqv_results_table.itemChanged.connect(handle_item_changed)
+        self.manual = np.zeros(self.num_containers, dtype=np.uint8)
+        self.fqv_results_model = ResultsTableModel(
+            [self.manual], ["Manual"], editable=True
+        )
+        self.fqv_results_table = TableView()
+        self.fqv_results_table.setModel(self.fqv_results_model)
+        self.paste_label = PasteLabel(self.fqv_results_model)
 
     def save_fqv_results(self):
         """
         Save the created FQV results to a pickle file.
         """
-        for container in range(CONTAINER_START, CONTAINER_END + 1):
-            self.manual_results[f"container_{container}"] = int(
-                self.fqv_containers[container].text()
-            )
         fileName, _ = QFileDialog.getSaveFileName(
             self,
             "Save FQV Results",
@@ -127,7 +113,7 @@ class CreateFQV(QWidget):
             "Pickle Files (*.pkl)",
         )
 
-        if fileName and write_pickle_file(fileName, self.manual_results):
+        if fileName and write_pickle_file(fileName, array_to_results(self.manual)):
             self.close()
 
     def open_file(self):
@@ -143,38 +129,12 @@ class CreateFQV(QWidget):
 
         if fileName:
             if fileName.endswith(".pkl"):
-                pre_made_results = read_pickle_file(fileName)
-                for container in range(CONTAINER_START, CONTAINER_END + 1):
-                    result = pre_made_results.get(f"container_{container}", 0)
-                    if container <= self.num_containers:
-                        self.fqv_containers[container].setText(str(result))
-                    else:
-                        self.num_containers += 1
-                        self.fqv_results_table.setRowCount(self.num_containers)
-                        self.fqv_containers[container] = QTableWidgetItem(str(result))
-                        self.fqv_results_table.setItem(
-                            container - 1, 0, self.fqv_containers[container]
-                        )
+                self.manual = load_fqv(fileName)
             elif fileName.endswith(".xml"):
-                try:
-                    root = ET.parse(fileName).getroot()
-                    container_number = 0
-                    for type_tag in root.findall("Sample/Manual"):
-                        container_number += 1
-                        if container_number <= self.num_containers:
-                            self.fqv_containers[container_number].setText(
-                                str(type_tag.text)
-                            )
-                        else:
-                            self.num_containers += 1
-                            self.fqv_results_table.setRowCount(self.num_containers)
-                            self.fqv_containers[container_number] = QTableWidgetItem(
-                                str(type_tag.text)
-                            )
-                            self.fqv_results_table.setItem(
-                                container_number - 1,
-                                0,
-                                self.fqv_containers[container_number],
-                            )
-                except KeyError:
-                    pass
+                values = load_fqv(fileName)
+                self.manual = fit_results(
+                    self.manual, max(self.num_containers, len(values))
+                )
+                self.manual[: len(values)] = values
+            self.num_containers = len(self.manual)
+            self.fqv_results_model.set_columns([self.manual])
@@ -1,21 +1,37 @@
-import csv
-import pickle
+import numpy as np
+from knapp.export import (
+    inspector_headers,
+    pass_headers,
+    write_inspections_csv,
+    write_inspections_xml,
+)
+from knapp.loaders import load_manual_inspection_data
+from knapp.storage import write_pickle_file
+from knapp.study import (
+    INSPECTORS,
+    NOT_INSPECTED,
+    PASSES,
+    array_to_results,
+    counts_to_passes,
+    passes_to_counts,
+)
+from knapp.zones import zone_table
 from utils import (
-    write_pickle_file,
-    read_pickle_file,
-    ColourCell,
-    handle_item_changed,
-    TableWidget,
+    PasteLabel,
+    ResultsTableModel,
+    TableView,
 )
 from PyQt6.QtWidgets import (
+    QCheckBox,
     QPushButton,
     QVBoxLayout,
     QWidget,
     QLabel,
     QFileDialog,
-    QTableWidgetItem,
+    QDialog,
 )
-from constants import CONTAINER_START, CONTAINER_END
+from widgets.create_fqv import ContainerInput
+from constants import CONTAINER_END
 
 
 class CreateManualInspection(QWidget):
@@ -23,8 +39,6 @@ class CreateManualInspection(QWidget):
         super().__init__()
         self.setGeometry(600, 100, 500, 600)
         self.setWindowTitle("Create Manual Inspection Data")
-        self.inspection_results = {}
-        self.inspection_containers = {}
         self.CreateManualInspectionUI()
 
     def CreateManualInspectionUI(self):
@@ -33,22 +47,20 @@ class CreateManualInspection(QWidget):
         """
         self.inspection_widget = QVBoxLayout()
 
-        self.table = TableWidget(CONTAINER_END, 5)  # One column for each inspector
-        self.table.setHorizontalHeaderLabels(
-            ["Inspector 1", "Inspector 2", "Inspector 3", "Inspector 4", "Inspector 5"]
-        )
-
-        for container in range(CONTAINER_START, CONTAINER_END + 1):
-            self.inspection_containers[container] = [
-                QTableWidgetItem("0") for _ in range(5)
-            ]
+        self.show_container_input()
 
-            for i in range(5):
-                self.table.setItem(
-                    container - 1, i, self.inspection_containers[container][i]
-                )
-        self.table.itemChanged.connect(handle_item_changed)
-        self.table.setItemDelegate(ColourCell())
+        # One column for each inspector
+        self.inspections = np.zeros((self.num_containers, INSPECTORS), dtype=np.uint8)
+        # Passes per inspector when entering passes, as in the file opened.
+        self.num_passes = PASSES
+        self.table_model = ResultsTableModel(
+            list(self.inspections.T), inspector_headers(self.inspections), editable=True
+        )
+        self.table = TableView()
+        self.table.setModel(self.table_model)
+        self.paste_label = PasteLabel(self.table_model)
+        self.passes_input = QCheckBox("Enter each pass (1 reject, 0 accept)", self)
+        self.passes_input.toggled.connect(self.set_pass_entry)
 
         title_label = QLabel()
         title_label.setText("Create Manual Inspection Data")
@@ -62,13 +74,70 @@ class CreateManualInspection(QWidget):
         self.close_button.clicked.connect(self.close)
 
         self.inspection_widget.addWidget(title_label)
+        self.inspection_widget.addWidget(self.passes_input)
         self.inspection_widget.addWidget(self.table)
+        self.inspection_widget.addWidget(self.paste_label)
         self.inspection_widget.addWidget(self.save_button)
         self.inspection_widget.addWidget(self.open_button)
         self.inspection_widget.addWidget(self.close_button)
 
         self.setLayout(self.inspection_widget)
 
+    def show_container_input(self):
+        container_dialog = ContainerInput(value=CONTAINER_END)
+        self.num_containers = CONTAINER_END
+        if container_dialog.exec() == QDialog.DialogCode.Accepted:
+            self.num_containers = container_dialog.container_input.value()
+
+    def set_pass_entry(self, passes):
+        """
+        Switch the table between reject counts and every pass.
+
+        Counts are expanded to their first passes rejecting, and passes are
+        counted back into rejects.
+
+        Parameters:
+            passes (bool): Show one column per inspector and pass.
+        """
+        self.inspections = self.current_inspections()
+        if passes and self.inspections.ndim == 2:
+            self.inspections = counts_to_passes(self.inspections, self.num_passes)
+        elif not passes and self.inspections.ndim == 3:
+            self.inspections = passes_to_counts(self.inspections)
+        self.show_inspections()
+
+    def current_inspections(self):
+        """
+        Return the results entered in the table.
+
+        Returns:
+            numpy.ndarray: Inspection matrix (containers, inspectors) or,
+                when entering passes, a pass array (containers, inspectors,
+                passes) where any result other than 0 counts as a reject.
+        """
+        columns = np.stack(self.table_model.columns, axis=1)
+        if self.inspections.ndim == 2:
+            return columns
+        passes = np.where(
+            columns == NOT_INSPECTED, NOT_INSPECTED, np.minimum(columns, 1)
+        ).astype(np.uint8)
+        # Loaded files keep their own number of inspectors and passes.
+        return passes.reshape(len(passes), *self.inspections.shape[1:])
+
+    def show_inspections(self):
+        if self.inspections.ndim == 3:
+            self.table_model.set_columns(
+                list(self.inspections.reshape(len(self.inspections), -1).T),
+                pass_headers(self.inspections),
+            )
+            self.table_model.set_zone_table(zone_table(0, 0, 1))
+        else:
+            self.table_model.set_columns(
+                list(self.inspections.T), inspector_headers(self.inspections)
+            )
+            self.table_model.set_zone_table(zone_table())
+        self.table.resizeColumnsToContents()
+
     def openFileDialog(self):
         """
         Open a file dialog to choose the manual inspection data file.
@@ -77,7 +146,7 @@ class CreateManualInspection(QWidget):
             self,
             "Open Manual Inspection Data",
             "",
-            "All Files (*);;Pickle (*.pkl);;XML (*.xml)",
+            "All Files (*);;Pickle (*.pkl);;CSV (*.csv);;XML (*.xml)",
         )
 
         if fileName:
@@ -85,62 +154,34 @@ class CreateManualInspection(QWidget):
 
     def open_file(self, fileName):
         """
-        Open a file dialog to load existing manual inspection data.
+        Load existing manual inspection data into the table.
         """
-        if fileName.endswith(".pkl"):
-            try:
-                manual_results = read_pickle_file(fileName)
-                for container in range(CONTAINER_START, CONTAINER_END + 1):
-                    inspector_results = manual_results.get(
-                        f"container_{container}", [0, 0, 0, 0, 0]
-                    )
-                    for i in range(5):
-                        item = QTableWidgetItem(str(inspector_results[i]))
-                        self.table.setItem(container - 1, i, item)
-            except (pickle.UnpicklingError, KeyError):
-                pass
-        elif fileName.endswith(".csv"):
-            self.table.clearContents()
-            self.table.setRowCount(0)
-            self.manual_inspection_results = {}
-            with open(fileName, "rt") as csvfile:
-                reader = csv.reader(csvfile)
-                header = next(reader)
-                self.table.setColumnCount(len(header))
-                self.table.setHorizontalHeaderLabels(header)
-                for row, values in enumerate(reader):
-                    self.table.insertRow(row)
-                    container_key = f"container_{row + 1}"
-                    inspector_results = []
-                    for value in values:
-                        try:
-                            inspector_results.append(int(value))
-                        except ValueError:
-                            inspector_results.append(0)
-
-                    self.manual_inspection_results[container_key] = inspector_results
-                    for column, value in enumerate(values):
-                        item = QTableWidgetItem(str(value))
-                        self.table.setItem(row, column, item)
-            self.table.itemChanged.disconnect(handle_item_changed)
-            self.table.itemChanged.connect(handle_item_changed)
+        if fileName.endswith((".pkl", ".csv", ".xml")):
+            self.inspections = load_manual_inspection_data(fileName)
+            self.num_containers = len(self.inspections)
+            if self.inspections.ndim == 3:
+                self.num_passes = self.inspections.shape[2]
+            self.passes_input.blockSignals(True)
+            self.passes_input.setChecked(self.inspections.ndim == 3)
+            self.passes_input.blockSignals(False)
+            self.show_inspections()
 
     def save_inspection_results(self):
         """
-        Save the created manual inspection results to a pickle file.
+        Save the created manual inspection results to a pickle, csv or xml
+        file, with every pass when entering passes.
         """
-        for container in range(CONTAINER_START, CONTAINER_END + 1):
-            inspector_results = [
-                int(self.table.item(container - 1, i).text()) for i in range(5)
-            ]
-            self.inspection_results[f"container_{container}"] = inspector_results
-
         fileName, _ = QFileDialog.getSaveFileName(
             self,
             "Save Manual Inspection Results",
             "",
-            "Pickle Files (*.pkl)",
+            "Pickle Files (*.pkl);;CSV Files (*.csv);;XML Files (*.xml)",
         )
 
-        if fileName and write_pickle_file(fileName, self.inspection_results):
+        inspections = self.current_inspections()
+        if fileName.endswith(".csv"):
+            write_inspections_csv(fileName, inspections)
+        elif fileName.endswith(".xml"):
+            write_inspections_xml(fileName, inspections)
+        elif fileName and write_pickle_file(fileName, array_to_results(inspections)):
             self.close()
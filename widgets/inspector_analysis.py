@@ -0,0 +1,83 @@
+from knapp.export import inspector_headers
+from knapp.inspectors import REPORT_HEADERS, report_rows, write_inspector_report
+from utils import fill_table
+from PyQt6.QtWidgets import (
+    QPushButton,
+    QVBoxLayout,
+    QWidget,
+    QLabel,
+    QFileDialog,
+    QTableWidget,
+)
+from PyQt6.QtGui import QBrush, QColor
+
+OUTLIER_BRUSH = QBrush(QColor(255, 0, 0))
+
+
+class InspectorAnalysis(QWidget):
+    """
+    Class for showing the qualification figures of every inspector.
+
+    Shows the reject rate, agreement and outlier flag of each inspector,
+    the Fleiss' kappa of the group and the Cohen's kappa of every pair.
+    """
+
+    def __init__(self, analysis, title=""):
+        super().__init__()
+        self.setGeometry(650, 150, 700, 500)
+        self.setWindowTitle("Inspector Analysis")
+        self.analysis = analysis
+        self.title = title
+        self.headers = inspector_headers(analysis["pairwise_kappa"])
+        self.InspectorAnalysisUI()
+
+    def InspectorAnalysisUI(self):
+        layout = QVBoxLayout()
+
+        summary_label = QLabel()
+        summary_label.setText(
+            (f"{self.title}\n" if self.title else "")
+            + f"Fleiss' kappa: {self.analysis['fleiss_kappa']:.3f} over "
+            f"{self.analysis['complete']} containers inspected by every inspector"
+        )
+        layout.addWidget(summary_label)
+
+        self.inspector_table = QTableWidget()
+        rows = report_rows(self.analysis, self.headers)
+        fill_table(self.inspector_table, REPORT_HEADERS, rows)
+        for row, outlier in enumerate(self.analysis["outliers"].tolist()):
+            if outlier:
+                self.inspector_table.item(row, len(REPORT_HEADERS) - 1).setBackground(
+                    OUTLIER_BRUSH
+                )
+        layout.addWidget(self.inspector_table)
+
+        layout.addWidget(QLabel("Cohen's kappa of each pair of inspectors"))
+        self.kappa_table = QTableWidget()
+        fill_table(
+            self.kappa_table,
+            self.headers,
+            [
+                [f"{value:.3f}" for value in values]
+                for values in self.analysis["pairwise_kappa"].tolist()
+            ],
+            self.headers,
+        )
+        layout.addWidget(self.kappa_table)
+
+        self.export_button = QPushButton("Export (csv)", self)
+        self.export_button.clicked.connect(self.export_report)
+        self.close_button = QPushButton("Close", self)
+        self.close_button.clicked.connect(self.close)
+        layout.addWidget(self.export_button)
+        layout.addWidget(self.close_button)
+
+        self.setLayout(layout)
+
+    def export_report(self):
+        """
+        Export the per-inspector figures to a CSV file.
+        """
+        fileName, _ = QFileDialog.getSaveFileName(self, "Save CSV", "", "CSV(*.csv)")
+        if fileName:
+            write_inspector_report(fileName, self.analysis, self.headers)
@@ -1,11 +1,11 @@
-import csv
 import os
-import pickle
-import xml.etree.ElementTree as ET
+from knapp.cache import ParseCache
+from knapp.loaders import load_study
+from knapp.study import Study
 from utils import (
-    read_pickle_file,
     setup_results_table,
 )
+from PyQt6.QtCore import pyqtSignal
 from PyQt6.QtWidgets import (
     QPushButton,
     QVBoxLayout,
@@ -13,45 +13,50 @@ from PyQt6.QtWidgets import (
     QLabel,
     QFileDialog,
 )
-from widgets.compare_results import CompareResults
-from constants import CONTAINER_START, CONTAINER_END
+from widgets.workers import LoaderWorker, LoadProgress
 
 
 class LoadFQV(QWidget):
     """
     Class for loading FQV results.
+
+    The file is loaded on a worker thread, study_loaded is emitted with the
+    study once it is ready.
     """
 
+    study_loaded = pyqtSignal(object)
+
     def __init__(self):
         super().__init__()
         self.setGeometry(600, 100, 150, 600)
         self.setWindowTitle("FQV Results")
-        self.manual_results = {}
-        self.fqv_containers = {}
+        self.study = Study()
+        self.is_loaded = False
+        self.worker = None
         self.LoadFQVUI()
 
     def LoadFQVUI(self):
         """
         Setup the UI for loading FQV results.
         """
-        self.openFileDialog()
         self.fqv_widget = QVBoxLayout()
-        title_label = QLabel()
-        self.fqv_widget.addWidget(title_label)
+        self.title_label = QLabel()
+        self.fqv_widget.addWidget(self.title_label)
+        self.load_progress = LoadProgress(self)
+        self.fqv_widget.addWidget(self.load_progress)
 
-        self.results_table, self.fqv_containers = setup_results_table(
-            self.manual_results, "Manual"
+        self.results_table, self.results_model = setup_results_table(
+            self.study.manual, "Manual"
         )
 
-        title_label.setText(f"{self.results_title}")
         self.close_button = QPushButton("Close", self)
         self.close_button.clicked.connect(self.close)
         button_layout = QVBoxLayout()
         button_layout.addWidget(self.close_button)
         self.fqv_widget.addWidget(self.results_table)
         self.fqv_widget.addLayout(button_layout)
-        self.compare_window = CompareResults(self.manual_results)
         self.setLayout(self.fqv_widget)
+        self.openFileDialog()
 
     def openFileDialog(self):
         """
@@ -61,61 +66,45 @@ class LoadFQV(QWidget):
             self,
             "Open FQV or Machine results",
             "",
-            "All Files (*);;Pickle (*.pkl);;XML (*.xml);;CSV (*.csv)",
+            "All Files (*);;Pickle (*.pkl);;XML (*.xml);;CSV (*.csv);;Study (*.kfqv)",
         )
 
         self.results_title = ""
         if fileName:
             self.load_fqv(fileName)
-            self.results_title = os.path.basename(fileName)
 
     def load_fqv(self, fileName):
         """
-        Load FQV results from a pickle, csv or xml file.
+        Start loading FQV results from a pickle, csv, xml or study file.
 
         Parameters:
             fileName (str): Path to the FQV results file.
+
+        Returns:
+            LoaderWorker: The worker loading the file.
         """
         self.results_title = os.path.basename(fileName)
-        if fileName.endswith(".pkl"):
-            try:
-                self.fqv = read_pickle_file(fileName)
-                for container in range(CONTAINER_START, CONTAINER_END + 1):
-                    key = f"container_{container}"
-                    value = self.fqv.get(key, None)
-                    if value is not None:
-                        if isinstance(value, list):
-                            avg_value = round((sum(value) / 50) * 10)
-                            self.manual_results[key] = avg_value
-                        else:
-                            self.manual_results[key] = value
-            except (pickle.UnpicklingError, KeyError):
-                pass
-        elif fileName.endswith(".xml"):
-            try:
-                root = ET.parse(fileName).getroot()
-                container_number = 0
-                for type_tag in root.findall("Sample/Manual"):
-                    container_number += 1
-                    self.manual_results[f"container_{container_number}"] = int(
-                        type_tag.text
-                    )
-            except KeyError:
-                pass
-        elif fileName.endswith(".csv"):
-            self.manual_results = {}
-            with open(fileName, "rt") as csvfile:
-                reader = csv.reader(csvfile)
-                next(reader)
-                for row, values in enumerate(reader):
-                    container_key = f"container_{row + 1}"
-                    inspector_results = []
-                    for value in values:
-                        try:
-                            inspector_results.append(int(value))
-                        except ValueError:
-                            inspector_results.append(0)
-
-                    avg_value = round((sum(inspector_results) / 5))
-                    self.manual_results[container_key] = avg_value
-        return self.manual_results
+        self.worker = LoaderWorker(load_study, fqv_path=fileName, cache=ParseCache())
+        self.worker.signals.finished.connect(self.show_study)
+        self.load_progress.track(self.worker)
+        self.worker.start()
+        return self.worker
+
+    def show_study(self, study):
+        """
+        Show a study once its FQV results have been loaded.
+
+        Parameters:
+            study (Study): The loaded study.
+        """
+        study.title = self.results_title
+        self.study = study
+        self.is_loaded = True
+        self.title_label.setText(self.results_title)
+        self.results_model.set_columns([self.study.manual])
+        self.study_loaded.emit(self.study)
+
+    def closeEvent(self, event):
+        if self.worker is not None:
+            self.worker.cancel()
+        super().closeEvent(event)
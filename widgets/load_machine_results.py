@@ -1,53 +1,115 @@
 import os
-import xml.etree.ElementTree as ET
+from knapp.cache import ParseCache
+from knapp.layout import DEFAULT_SPINDLES, SPINDLE_CHOICES, MachineLayout, run_problems
+from knapp.loaders import load_study
+from knapp.study import Study
+from knapp.watch import RunFolderWatcher
 from utils import (
     setup_results_table,
+    show_confirmation,
 )
+from PyQt6.QtCore import QFileSystemWatcher, QTimer, pyqtSignal
 from PyQt6.QtWidgets import (
+    QComboBox,
+    QHBoxLayout,
     QPushButton,
     QVBoxLayout,
     QWidget,
     QLabel,
     QFileDialog,
 )
-from constants import CONTAINER_END
+from widgets.workers import LoaderWorker, LoadProgress
+
+# Interval (ms) between looks at a watched folder for runs still being
+# written, which do not change the folder itself.
+WATCH_INTERVAL = 1000
+
+
+def poll_watcher(watcher, progress=None):
+    """
+    Poll a RunFolderWatcher on a LoaderWorker.
+
+    Parameters:
+        watcher (RunFolderWatcher): The watcher to poll.
+        progress (function): See RunFolderWatcher.poll.
+
+    Returns:
+        tuple: The watcher, the files ingested by the poll, a copy of the
+            machine results and every file ingested so far.
+    """
+    file_paths = watcher.poll(progress)
+    return watcher, file_paths, watcher.machine.copy(), list(watcher.ingested)
 
 
 class LoadMachineResults(QWidget):
     """
     Class for loading machine inspection results.
+
+    The files are loaded on a worker thread, several runs being parsed on a
+    process pool, and study_loaded is emitted with the study once it is
+    ready. Watching a folder instead ingests each KnappRun
+    file as the machine exports it, polling on a worker thread, and emits
+    study_loaded after every run.
     """
 
+    study_loaded = pyqtSignal(object)
+
     def __init__(self):
         super().__init__()
         self.setGeometry(600, 100, 150, 600)
         self.setWindowTitle("Machine Results")
-        self.machine_results = {f"container_{i}": -1 for i in range(1, CONTAINER_END + 1)}
-        self.machine_containers = {}
+        self.study = Study()
         self.results_title = ""
+        self.fileNames = []
+        self.is_loaded = False
+        self.worker = None
+        self.watcher = None
+        self.folder_watcher = None
+        self.poll_worker = None
+        # Whether the folder changed while a poll was running.
+        self.poll_again = False
+        self.watched_files = []
+        self.analysis_worker = None
+        self.analysis_window = None
         self.LoadMachineResultsUI()
 
     def LoadMachineResultsUI(self):
         """
         Setup the UI for loading machine results.
         """
-        self.openFileDialog()
         self.machine_results_widget = QVBoxLayout()
-        title_label = QLabel()
-        self.machine_results_widget.addWidget(title_label)
+        self.title_label = QLabel()
+        self.machine_results_widget.addWidget(self.title_label)
+        self.load_progress = LoadProgress(self)
+        self.machine_results_widget.addWidget(self.load_progress)
+        spindles_layout = QHBoxLayout()
+        self.spindles_input = QComboBox(self)
+        self.spindles_input.addItems([str(spindles) for spindles in SPINDLE_CHOICES])
+        self.spindles_input.setCurrentText(str(DEFAULT_SPINDLES))
+        self.spindles_input.currentTextChanged.connect(self.change_layout)
+        spindles_layout.addWidget(QLabel("Spindles"))
+        spindles_layout.addWidget(self.spindles_input)
+        self.machine_results_widget.addLayout(spindles_layout)
 
-        self.results_table, self.machine_containers = setup_results_table(
-            self.machine_results, "Machine"
+        self.results_table, self.results_model = setup_results_table(
+            self.study.machine, "Machine"
         )
 
-        title_label.setText(f"{self.results_title}")
+        self.analyse_button = QPushButton("Analyse spindles", self)
+        self.analyse_button.setEnabled(False)
+        self.analyse_button.clicked.connect(self.show_station_analysis)
+        self.watch_button = QPushButton("Watch folder", self)
+        self.watch_button.clicked.connect(self.toggle_watch)
         self.close_button = QPushButton("Close", self)
         self.close_button.clicked.connect(self.close)
         button_layout = QVBoxLayout()
+        button_layout.addWidget(self.analyse_button)
+        button_layout.addWidget(self.watch_button)
         button_layout.addWidget(self.close_button)
         self.machine_results_widget.addWidget(self.results_table)
         self.machine_results_widget.addLayout(button_layout)
         self.setLayout(self.machine_results_widget)
+        self.openFileDialog()
 
     def openFileDialog(self):
         """
@@ -57,34 +119,229 @@ class LoadMachineResults(QWidget):
             self,
             "Open FQV or Machine results",
             "",
-            "All Files (*);;Pickle (*.pkl);;XML (*.xml)",
+            "All Files (*);;Pickle (*.pkl);;XML (*.xml);;Study (*.kfqv)",
         )
         if fileNames:
+            self.stop_watching()
+            self.fileNames = fileNames
+            self.results_title = ""
             for fileName in fileNames:
-                self.load_results(fileName)
                 self.results_title += f"{os.path.basename(fileName)}\n"
+            self.load_machine_results(fileNames)
+
+    def machine_layout(self):
+        """
+        Return the machine layout of the spindles chosen.
+        """
+        return MachineLayout(int(self.spindles_input.currentText()))
+
+    def change_layout(self):
+        """
+        Reload the runs shown with the spindles chosen.
+        """
+        if self.watcher is not None:
+            self.watch_folder(self.watcher.directory)
+        elif self.fileNames:
+            self.load_machine_results(self.fileNames)
 
-    def load_results(self, fileName):
+    def load_machine_results(self, fileNames):
         """
-        Load machine inspection results from xml files.
+        Start loading machine inspection results from xml or study files.
+
+        Runs that are missing, loaded twice or outside the layout are
+        listed first, and the files are only loaded if that is confirmed.
+
+        Parameters:
+            fileNames (list): Paths to the machine results files.
+
+        Returns:
+            LoaderWorker: The worker loading the files, None if not loaded.
+        """
+        layout = self.machine_layout()
+        problems = run_problems(
+            layout.check_runs([name for name in fileNames if name.endswith(".xml")])
+        )
+        if problems and not show_confirmation(self, f"{problems} Load anyway?"):
+            return None
+        if self.worker is not None:
+            self.worker.cancel()
+        self.worker = LoaderWorker(
+            load_study,
+            machine_paths=fileNames,
+            cache=ParseCache(),
+            layout=layout,
+        )
+        self.worker.signals.finished.connect(self.show_study)
+        self.load_progress.track(self.worker)
+        self.worker.start()
+        return self.worker
+
+    def show_study(self, study):
+        """
+        Show a study once its machine results have been loaded.
 
         Parameters:
-            fileName (str): Path to the machine results file.
-        """
-        if fileName.endswith(".xml"):
-            root = ET.parse(fileName).getroot()
-            container_number = 0
-            for run_number in range(1, 12):
-                run_prefix = f"KnappRun_{run_number}_"
-                if run_prefix in fileName:
-                    container_number += (run_number - 1) * 24
-                    for type_tag in root.findall(
-                        "ParticlesInspection/Sample/TotReject"
-                    ):
-                        container_number += 1
-                        if container_number > CONTAINER_END:
-                            break
-                        self.machine_results[f"container_{container_number}"] = int(
-                            type_tag.text
-                        )
-        return self.machine_results
+            study (Study): The loaded study.
+        """
+        study.title = self.results_title
+        study.metadata["spindles"] = int(self.spindles_input.currentText())
+        self.study = study
+        self.is_loaded = True
+        self.title_label.setText(self.results_title)
+        self.results_model.set_columns([self.study.machine])
+        self.analyse_button.setEnabled(bool(self.run_files()))
+        self.study_loaded.emit(self.study)
+
+    def run_files(self):
+        """
+        Return the KnappRun files shown, in a watched folder or loaded.
+        """
+        if self.watcher is not None:
+            return self.watched_files
+        return [fileName for fileName in self.fileNames if fileName.endswith(".xml")]
+
+    def show_station_analysis(self):
+        """
+        Start analysing the spindles and cameras of the runs shown.
+
+        Returns:
+            LoaderWorker: The worker reading and analysing the runs.
+        """
+        from widgets.station_analysis import analyse_runs
+
+        if self.analysis_worker is not None:
+            self.analysis_worker.cancel()
+        self.analysis_worker = LoaderWorker(
+            analyse_runs, self.run_files(), self.machine_layout()
+        )
+        self.analysis_worker.signals.finished.connect(self.show_analysis_window)
+        self.load_progress.track(self.analysis_worker)
+        self.analysis_worker.start()
+        return self.analysis_worker
+
+    def show_analysis_window(self, analysis):
+        """
+        Show the reject rates of the spindles and cameras once analysed.
+
+        Parameters:
+            analysis (dict): See knapp.stations.analyse_stations.
+        """
+        from widgets.station_analysis import StationAnalysis
+
+        self.analysis_worker = None
+        self.analysis_window = StationAnalysis(analysis, self.results_title)
+        self.analysis_window.show()
+
+    def toggle_watch(self):
+        """
+        Choose a folder to watch, or stop watching the current one.
+        """
+        if self.watcher is not None:
+            self.stop_watching()
+            return
+        directory = QFileDialog.getExistingDirectory(
+            self, "Watch folder for KnappRun files"
+        )
+        if directory:
+            self.watch_folder(directory)
+
+    def watch_folder(self, directory):
+        """
+        Ingest the KnappRun files of a folder as the machine exports them.
+
+        Runs already in the folder are loaded straight away. A poll follows
+        every change to the folder and every WATCH_INTERVAL, and only parses
+        the runs that have not been ingested yet, on a worker thread.
+
+        Parameters:
+            directory (str): The machine export folder.
+
+        Returns:
+            RunFolderWatcher: The watcher following the folder.
+        """
+        self.stop_watching()
+        if self.worker is not None:
+            self.worker.cancel()
+        self.watcher = RunFolderWatcher(
+            directory, cache=ParseCache(), layout=self.machine_layout()
+        )
+        self.results_title = ""
+        self.watched_files = []
+        self.title_label.setText(f"Watching {directory}")
+        self.folder_watcher = QFileSystemWatcher([directory], self)
+        self.folder_watcher.directoryChanged.connect(self.poll_folder)
+        self.poll_timer = QTimer(self)
+        self.poll_timer.timeout.connect(self.poll_folder)
+        self.poll_timer.start(WATCH_INTERVAL)
+        self.watch_button.setText("Stop watching")
+        self.poll_folder()
+        return self.watcher
+
+    def poll_folder(self):
+        """
+        Start parsing any runs that have landed since the last poll.
+
+        Only one poll runs at a time, a change seen during a poll starts
+        another once it is done.
+        """
+        if self.watcher is None:
+            return
+        if self.poll_worker is not None:
+            self.poll_again = True
+            return
+        self.poll_again = False
+        self.poll_worker = LoaderWorker(poll_watcher, self.watcher)
+        self.poll_worker.signals.finished.connect(self.show_polled_runs)
+        self.poll_worker.signals.failed.connect(self.show_poll_error)
+        self.poll_worker.start()
+
+    def show_polled_runs(self, result):
+        """
+        Show the machine results with the runs ingested by a poll.
+
+        Parameters:
+            result (tuple): As returned by poll_watcher.
+        """
+        watcher, file_paths, machine, ingested = result
+        if watcher is not self.watcher:
+            return
+        self.poll_worker = None
+        self.watched_files = ingested
+        if file_paths:
+            for file_path in file_paths:
+                self.results_title += f"{os.path.basename(file_path)}\n"
+            self.show_study(Study(machine=machine))
+        if watcher.skipped:
+            skipped = "".join(
+                f"Skipped {os.path.basename(file_path)}: {message}\n"
+                for file_path, (_, message) in watcher.skipped.items()
+            )
+            self.title_label.setText(self.results_title + skipped)
+        if self.poll_again:
+            self.poll_folder()
+
+    def show_poll_error(self, message):
+        if self.poll_worker is None or self.sender() is not self.poll_worker.signals:
+            return
+        self.poll_worker = None
+        self.title_label.setText(f"Watching {self.watcher.directory}: {message}")
+
+    def stop_watching(self):
+        if self.watcher is None:
+            return
+        if self.poll_worker is not None:
+            self.poll_worker.cancel()
+            self.poll_worker = None
+        self.poll_timer.stop()
+        self.folder_watcher.directoryChanged.disconnect(self.poll_folder)
+        self.folder_watcher = None
+        self.watcher = None
+        self.watch_button.setText("Watch folder")
+
+    def closeEvent(self, event):
+        if self.worker is not None:
+            self.worker.cancel()
+        if self.analysis_worker is not None:
+            self.analysis_worker.cancel()
+        self.stop_watching()
+        super().closeEvent(event)
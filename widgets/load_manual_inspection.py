@@ -1,78 +1,67 @@
-import csv
 import os
-import pickle
+from knapp.cache import ParseCache
+from knapp.export import inspector_headers
+from knapp.loaders import load_study
+from knapp.study import Study
 from utils import (
-    read_pickle_file,
     export_table_to_csv,
-    ColourCell,
+    ResultsTableModel,
 )
+from PyQt6.QtCore import pyqtSignal
 from PyQt6.QtWidgets import (
     QPushButton,
     QVBoxLayout,
     QWidget,
     QLabel,
     QFileDialog,
-    QTableWidget,
-    QTableWidgetItem,
+    QTableView,
 )
-from PyQt6.QtCore import Qt
-from constants import CONTAINER_START, CONTAINER_END
+from widgets.workers import LoaderWorker, LoadProgress
 
 
 class LoadManualInspection(QWidget):
+    study_loaded = pyqtSignal(object)
+
     def __init__(self):
         super().__init__()
         self.setGeometry(600, 100, 500, 600)
         self.setWindowTitle("Manual Inspection Data")
-        self.manual_inspection_results = {}
-        self.manual_inspection_containers = {}
-        self.table = QTableWidget()
+        self.study = Study()
+        self.table = QTableView()
         self.results_title = ""
+        self.is_loaded = False
+        self.worker = None
+        self.analysis_window = None
         self.LoadManualInspectionUI()
 
     def LoadManualInspectionUI(self):
         self.manual_inspection_widget = QVBoxLayout()
 
-        self.openFileDialog()
-        title_label = QLabel()
-        self.manual_inspection_widget.addWidget(title_label)
-        self.table.setRowCount(CONTAINER_END - CONTAINER_START + 1)
-        self.table.setColumnCount(5)  # One column for each inspector
-        self.table.setHorizontalHeaderLabels(
-            ["Inspector 1", "Inspector 2", "Inspector 3", "Inspector 4", "Inspector 5"]
+        self.title_label = QLabel()
+        self.manual_inspection_widget.addWidget(self.title_label)
+        self.load_progress = LoadProgress(self)
+        self.manual_inspection_widget.addWidget(self.load_progress)
+        # One column for each inspector
+        self.table_model = ResultsTableModel(
+            list(self.study.inspections.T), inspector_headers(self.study.inspections)
         )
-
-        for container in range(CONTAINER_START, CONTAINER_END + 1):
-            inspector_results = self.manual_inspection_results.get(
-                f"container_{container}", [0, 0, 0, 0, 0]
-            )
-            self.manual_inspection_containers[container] = [
-                QTableWidgetItem(str(result)) for result in inspector_results
-            ]
-
-            for i in range(5):
-                self.table.setItem(
-                    container - 1, i, self.manual_inspection_containers[container][i]
-                )
-
-                self.manual_inspection_containers[container][i].setFlags(
-                    self.manual_inspection_containers[container][i].flags()
-                    & ~Qt.ItemFlag.ItemIsEditable
-                )
-
-        self.table.setItemDelegate(ColourCell())
-        title_label.setText(f"{self.results_title}")
+        self.table.setModel(self.table_model)
         self.export_button = QPushButton("Export (csv)")
         self.close_button = QPushButton("Close", self)
         self.close_button.clicked.connect(self.close)
         self.export_button.clicked.connect(self.export_manual_inspection_data)
+        self.analyse_button = QPushButton("Analyse inspectors", self)
+        self.analyse_button.setEnabled(False)
+        self.analyse_button.clicked.connect(self.show_inspector_analysis)
         button_layout = QVBoxLayout()
+        button_layout.addWidget(self.analyse_button)
         button_layout.addWidget(self.export_button)
         button_layout.addWidget(self.close_button)
         self.manual_inspection_widget.addWidget(self.table)
         self.manual_inspection_widget.addLayout(button_layout)
         self.table.resizeColumnsToContents()
         self.setLayout(self.manual_inspection_widget)
+        self.openFileDialog()
 
     def openFileDialog(self):
         """
@@ -82,61 +71,68 @@ class LoadManualInspection(QWidget):
             self,
             "Open Manual Inspection Data",
             "",
-            "All Files (*);;Pickle (*.pkl);;XML (*.xml)",
+            "All Files (*);;Pickle (*.pkl);;XML (*.xml);;Study (*.kfqv)",
         )
 
         if fileName:
             self.load_manual_inspection_data(fileName)
-            self.results_title = os.path.basename(fileName)
 
     def load_manual_inspection_data(self, fileName):
         """
-        Load manual inspection data from a pickle or csv file.
+        Start loading manual inspection data from a pickle, csv or study file.
 
         Parameters:
             fileName (str): Path to the manual inspection data file.
+
+        Returns:
+            LoaderWorker: The worker loading the file.
         """
         self.results_title = os.path.basename(fileName)
-        if fileName.endswith(".pkl"):
-            try:
-                self.manual_inspection_results = read_pickle_file(fileName)
-                for container_key, values in self.manual_inspection_results.items():
-                    if not isinstance(values, list):
-                        self.manual_inspection_results[container_key] = [values] * 5
-            except (pickle.UnpicklingError, KeyError):
-                pass
-        elif fileName.endswith(".csv"):
-            self.table.clearContents()
-            self.table.setRowCount(0)
-            self.manual_inspection_results = {}
-
-            with open(fileName, "rt") as csvfile:
-                reader = csv.reader(csvfile)
-                header = next(reader)
-                self.table.setColumnCount(len(header))
-                self.table.setHorizontalHeaderLabels(header)
-
-                for row, values in enumerate(reader):
-                    self.table.insertRow(row)
-                    container_key = f"container_{row + 1}"
-
-                    inspector_results = []
-                    for value in values:
-                        try:
-                            inspector_results.append(int(value))
-                        except ValueError:
-                            inspector_results.append(0)
-
-                    self.manual_inspection_results[container_key] = inspector_results
-
-                    for column, value in enumerate(values):
-                        item = QTableWidgetItem(str(value))
-                        self.table.setItem(row, column, item)
-                        item.setFlags(item.flags() & ~Qt.ItemFlag.ItemIsEditable)
+        self.worker = LoaderWorker(
+            load_study, inspection_path=fileName, cache=ParseCache()
+        )
+        self.worker.signals.finished.connect(self.show_study)
+        self.load_progress.track(self.worker)
+        self.worker.start()
+        return self.worker
+
+    def show_study(self, study):
+        """
+        Show a study once its manual inspection data has been loaded.
+
+        Parameters:
+            study (Study): The loaded study.
+        """
+        study.title = self.results_title
+        self.study = study
+        self.is_loaded = True
+        self.analyse_button.setEnabled(True)
+        self.title_label.setText(self.results_title)
+        self.table_model.set_columns(
+            list(self.study.inspections.T), inspector_headers(self.study.inspections)
+        )
+        self.table.resizeColumnsToContents()
+        self.study_loaded.emit(self.study)
 
+    def show_inspector_analysis(self):
+        """
+        Show the reject rates, agreement and outliers of the inspectors.
+        """
+        from knapp.inspectors import analyse_inspectors
+        from widgets.inspector_analysis import InspectorAnalysis
+
+        self.analysis_window = InspectorAnalysis(
+            analyse_inspectors(self.study.inspections), self.results_title
+        )
+        self.analysis_window.show()
 
     def export_manual_inspection_data(self):
         """
         Export the manual inspection data to a CSV file.
         """
         export_table_to_csv(self.table)
+
+    def closeEvent(self, event):
+        if self.worker is not None:
+            self.worker.cancel()
+        super().closeEvent(event)
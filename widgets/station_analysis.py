@@ -0,0 +1,95 @@
+from knapp.stations import (
+    REPORT_HEADERS,
+    SampleTable,
+    analyse_stations,
+    report_rows,
+    write_station_report,
+)
+from utils import fill_table
+from widgets.inspector_analysis import OUTLIER_BRUSH
+from PyQt6.QtWidgets import (
+    QPushButton,
+    QVBoxLayout,
+    QWidget,
+    QLabel,
+    QFileDialog,
+    QTableWidget,
+)
+
+
+def analyse_runs(file_paths, layout, progress=None):
+    """
+    Read and analyse the KnappRun files of one set on a LoaderWorker.
+
+    Camera drift is checked run by run, as there is a single study.
+
+    Parameters:
+        file_paths (list): Paths to the KnappRun files.
+        layout (MachineLayout): Layout of the machine.
+        progress (function): Called with (files done, total files).
+
+    Returns:
+        dict: See knapp.stations.analyse_stations.
+    """
+    table = SampleTable.from_studies(
+        [("", file_paths)],
+        layout,
+        progress=progress,
+    )
+    return analyse_stations(table, drift_by="run")
+
+
+class StationAnalysis(QWidget):
+    """
+    Class for showing the reject rates of every spindle and camera.
+
+    Lists each spindle and camera with its deviation, followed by the
+    spindles deviating at a single camera and the runs a camera drifted in.
+    """
+
+    def __init__(self, analysis, title=""):
+        super().__init__()
+        self.setGeometry(650, 150, 600, 500)
+        self.setWindowTitle("Spindle Analysis")
+        self.analysis = analysis
+        self.title = title
+        self.StationAnalysisUI()
+
+    def StationAnalysisUI(self):
+        layout = QVBoxLayout()
+
+        summary_label = QLabel()
+        summary_label.setText(
+            (f"{self.title}\n" if self.title else "")
+            + f"{self.analysis['samples']} samples from {self.analysis['runs']} "
+            f"runs, {len(self.analysis['spindles'])} spindles and "
+            f"{len(self.analysis['cameras'])} cameras"
+        )
+        layout.addWidget(summary_label)
+
+        self.station_table = QTableWidget()
+        rows = report_rows(self.analysis)
+        fill_table(self.station_table, REPORT_HEADERS, rows)
+        for row, values in enumerate(rows):
+            if values[-1] == "Yes":
+                self.station_table.item(row, len(REPORT_HEADERS) - 1).setBackground(
+                    OUTLIER_BRUSH
+                )
+        layout.addWidget(self.station_table)
+
+        self.export_button = QPushButton("Export (csv)", self)
+        self.export_button.clicked.connect(self.export_report)
+        self.close_button = QPushButton("Close", self)
+        self.close_button.clicked.connect(self.close)
+        layout.addWidget(self.export_button)
+        layout.addWidget(self.close_button)
+
+        self.setLayout(layout)
+
+    def export_report(self):
+        """
+        Export the spindle and camera figures to a CSV file.
+        """
+        fileName, _ = QFileDialog.getSaveFileName(self, "Save CSV", "", "CSV(*.csv)")
+        if fileName:
+            write_station_report(fileName, self.analysis)
@@ -0,0 +1,270 @@
+from knapp.archive import COLUMNS, StudyArchive
+from knapp.layout import DEFAULT_SPINDLES
+from utils import fill_table, show_confirmation
+from PyQt6.QtCore import QDate
+from PyQt6.QtWidgets import (
+    QAbstractItemView,
+    QComboBox,
+    QDateEdit,
+    QDialog,
+    QDialogButtonBox,
+    QDoubleSpinBox,
+    QFormLayout,
+    QGridLayout,
+    QHBoxLayout,
+    QLabel,
+    QLineEdit,
+    QPushButton,
+    QSpinBox,
+    QTableWidget,
+    QVBoxLayout,
+    QWidget,
+)
+
+DATE_FORMAT = "yyyy-MM-dd"
+# Earliest date that can be picked, shown as the special text of a date input
+# to mean no date.
+NO_DATE = QDate(2000, 1, 1)
+COLUMN_HEADERS = [
+    "Id",
+    "Title",
+    "Product",
+    "Machine",
+    "Recipe",
+    "Date",
+    "Spindles",
+    "Containers",
+    "FQV(7,10)",
+    "FQA(7,10)",
+    "Manual vs Machine (%)",
+    "Machine vs Manual (%)",
+    "Added",
+]
+
+
+def date_input(parent, text, date=""):
+    """
+    Return a date input that shows text until a date is picked.
+
+    Parameters:
+        parent (QWidget): Parent of the input.
+        text (str): Text shown while no date is picked.
+        date (str): ISO date to start with, empty for none.
+
+    Returns:
+        QDateEdit: The input.
+    """
+    date_edit = QDateEdit(parent)
+    date_edit.setCalendarPopup(True)
+    date_edit.setDisplayFormat(DATE_FORMAT)
+    date_edit.setMinimumDate(NO_DATE)
+    date_edit.setSpecialValueText(text)
+    date = QDate.fromString(date or "", DATE_FORMAT)
+    date_edit.setDate(date if date.isValid() else NO_DATE)
+    return date_edit
+
+
+def date_text(date_edit):
+    """
+    Return the ISO date picked in a date_input, None if none was.
+    """
+    date = date_edit.date()
+    return None if date == NO_DATE else date.toString(DATE_FORMAT)
+
+
+def cell_text(value):
+    if value is None:
+        return ""
+    if isinstance(value, float):
+        return f"{value:.2f}"
+    return str(value)
+
+
+class ArchiveDetails(QDialog):
+    """
+    Dialog asking for the details a study is archived with.
+    """
+
+    def __init__(self, parent=None, metadata=None):
+        super(ArchiveDetails, self).__init__(parent)
+        metadata = metadata or {}
+        self.setWindowTitle("Add to Archive")
+        self.layout = QFormLayout(self)
+
+        self.product_input = QLineEdit(metadata.get("product", ""), self)
+        self.machine_input = QLineEdit(metadata.get("machine", ""), self)
+        self.recipe_input = QLineEdit(metadata.get("recipe", ""), self)
+        self.date_input = date_input(self, "Not set", metadata.get("date"))
+        self.spindles_input = QSpinBox(self)
+        self.spindles_input.setRange(1, 1000)
+        self.spindles_input.setValue(int(metadata.get("spindles", DEFAULT_SPINDLES)))
+
+        self.buttons = QDialogButtonBox(
+            QDialogButtonBox.StandardButton.Ok | QDialogButtonBox.StandardButton.Cancel
+        )
+        self.buttons.accepted.connect(self.accept)
+        self.buttons.rejected.connect(self.reject)
+
+        self.layout.addRow("Product", self.product_input)
+        self.layout.addRow("Machine", self.machine_input)
+        self.layout.addRow("Recipe", self.recipe_input)
+        self.layout.addRow("Date", self.date_input)
+        self.layout.addRow("Spindles", self.spindles_input)
+        self.layout.addRow(self.buttons)
+
+    def details(self):
+        """
+        Return the details entered, leaving out empty text.
+
+        The date is None when it is not set, so that a date in the study's
+        metadata that could not be shown is not archived either.
+
+        Returns:
+            dict: Keyword arguments for StudyArchive.add_study.
+        """
+        details = {
+            "product": self.product_input.text().strip(),
+            "machine": self.machine_input.text().strip(),
+            "recipe": self.recipe_input.text().strip(),
+        }
+        details = {key: value for key, value in details.items() if value}
+        details["date"] = date_text(self.date_input)
+        details["spindles"] = self.spindles_input.value()
+        return details
+
+
+class StudyArchiveWindow(QWidget):
+    """
+    Class for searching the study archive and opening the studies found.
+    """
+
+    def __init__(self, archive=None):
+        super().__init__()
+        self.setGeometry(500, 100, 900, 600)
+        self.setWindowTitle("Study Archive")
+        self.archive = archive if archive is not None else StudyArchive()
+        self.studies = []
+        self.windows = []
+        self.StudyArchiveUI()
+        self.search()
+
+    def StudyArchiveUI(self):
+        layout = QVBoxLayout()
+
+        filter_layout = QGridLayout()
+        self.product_input = self.detail_input("product")
+        self.machine_input = self.detail_input("machine")
+        self.recipe_input = self.detail_input("recipe")
+        self.date_from_input = date_input(self, "Any")
+        self.date_to_input = date_input(self, "Any")
+        self.efficiency_input = QDoubleSpinBox(self)
+        self.efficiency_input.setRange(0, 1000)
+        self.efficiency_input.setSpecialValueText("Any")
+        for column, (text, widget) in enumerate(
+            [
+                ("Product", self.product_input),
+                ("Machine", self.machine_input),
+                ("Recipe", self.recipe_input),
+                ("Date from", self.date_from_input),
+                ("Date to", self.date_to_input),
+                ("Machine vs Manual below (%)", self.efficiency_input),
+            ]
+        ):
+            filter_layout.addWidget(QLabel(text), 0, column)
+            filter_layout.addWidget(widget, 1, column)
+        layout.addLayout(filter_layout)
+
+        self.search_button = QPushButton("Search", self)
+        self.search_button.clicked.connect(self.search)
+        layout.addWidget(self.search_button)
+
+        self.count_label = QLabel()
+        layout.addWidget(self.count_label)
+        self.table = QTableWidget()
+        self.table.setSelectionBehavior(QAbstractItemView.SelectionBehavior.SelectRows)
+        self.table.setEditTriggers(QAbstractItemView.EditTrigger.NoEditTriggers)
+        self.table.doubleClicked.connect(self.open_compare)
+        layout.addWidget(self.table)
+
+        button_layout = QHBoxLayout()
+        self.compare_button = QPushButton("Compare Results", self)
+        self.compare_button.clicked.connect(self.open_compare)
+        self.efficiency_button = QPushButton("Efficiency", self)
+        self.efficiency_button.clicked.connect(self.open_efficiency)
+        self.remove_button = QPushButton("Remove", self)
+        self.remove_button.clicked.connect(self.remove_study)
+        self.close_button = QPushButton("Close", self)
+        self.close_button.clicked.connect(self.close)
+        button_layout.addWidget(self.compare_button)
+        button_layout.addWidget(self.efficiency_button)
+        button_layout.addWidget(self.remove_button)
+        button_layout.addWidget(self.close_button)
+        layout.addLayout(button_layout)
+
+        self.setLayout(layout)
+
+    def detail_input(self, column):
+        detail_input = QComboBox(self)
+        detail_input.setEditable(True)
+        detail_input.addItems([""] + self.archive.distinct(column))
+        return detail_input
+
+    def search(self):
+        """
+        Show the archived studies matching the filters.
+        """
+        efficiency = self.efficiency_input.value()
+        self.studies = self.archive.find_studies(
+            product=self.product_input.currentText().strip() or None,
+            machine=self.machine_input.currentText().strip() or None,
+            recipe=self.recipe_input.currentText().strip() or None,
+            date_from=date_text(self.date_from_input),
+            date_to=date_text(self.date_to_input),
+            efficiency_below=efficiency if efficiency > 0 else None,
+        )
+        fill_table(
+            self.table,
+            COLUMN_HEADERS,
+            [
+                [cell_text(study[column]) for column in COLUMNS]
+                for study in self.studies
+            ],
+        )
+        self.count_label.setText(f"{len(self.studies)} studies")
+
+    def selected_study(self):
+        """
+        Read the study selected in the table.
+
+        Returns:
+            Study: The study, or None if no study is selected.
+        """
+        row = self.table.currentRow()
+        if not 0 <= row < len(self.studies):
+            return None
+        return self.archive.open_study(self.studies[row]["id"])
+
+    def open_compare(self):
+        from widgets.compare_results import CompareResults
+
+        study = self.selected_study()
+        if study is not None:
+            window = CompareResults(study)
+            window.show()
+            self.windows.append(window)
+            return window
+
+    def open_efficiency(self):
+        window = self.open_compare()
+        if window is not None:
+            window.show_efficiency()
+        return window
+
+    def remove_study(self):
+        row = self.table.currentRow()
+        if not 0 <= row < len(self.studies):
+            return
+        title = self.studies[row]["title"] or "this study"
+        if show_confirmation(self, f"Remove {title} from the archive?"):
+            self.archive.remove_study(self.studies[row]["id"])
+            self.search()
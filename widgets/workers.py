@@ -0,0 +1,127 @@
+from knapp.loaders import LoadCancelled
+from PyQt6.QtCore import QObject, QRunnable, QThreadPool, pyqtSignal
+from PyQt6.QtWidgets import (
+    QHBoxLayout,
+    QLabel,
+    QProgressBar,
+    QPushButton,
+    QWidget,
+)
+
+
+class LoaderSignals(QObject):
+    """
+    Signals of a LoaderWorker, delivered on the GUI thread.
+    """
+
+    progress = pyqtSignal(int, int)
+    finished = pyqtSignal(object)
+    failed = pyqtSignal(str)
+    cancelled = pyqtSignal()
+
+
+class LoaderWorker(QRunnable):
+    """
+    Run a loader on the global thread pool so the GUI stays responsive.
+
+    The loader is called as function(*args, progress=..., **kwargs) and
+    reports its progress through the progress callback, which is also where
+    a cancelled load is stopped.
+
+    Attributes:
+        signals (LoaderSignals): Progress, result, error and cancellation.
+        is_cancelled (bool): Whether cancel has been called.
+    """
+
+    def __init__(self, function, *args, **kwargs):
+        super().__init__()
+        self.function = function
+        self.args = args
+        self.kwargs = kwargs
+        self.signals = LoaderSignals()
+        self.is_cancelled = False
+
+    def run(self):
+        try:
+            result = self.function(
+                *self.args, progress=self.report_progress, **self.kwargs
+            )
+        except LoadCancelled:
+            self.signals.cancelled.emit()
+            return
+        except Exception as error:
+            self.signals.failed.emit(str(error))
+            return
+        if self.is_cancelled:
+            self.signals.cancelled.emit()
+        else:
+            self.signals.finished.emit(result)
+
+    def report_progress(self, done, total):
+        if self.is_cancelled:
+            raise LoadCancelled()
+        self.signals.progress.emit(done, total)
+
+    def cancel(self):
+        """
+        Stop the load at the next progress report and drop its result.
+        """
+        self.is_cancelled = True
+
+    def start(self):
+        QThreadPool.globalInstance().start(self)
+
+
+class LoadProgress(QWidget):
+    """
+    Progress bar and cancel button following a LoaderWorker.
+    """
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.worker = None
+        self.label = QLabel()
+        self.progress_bar = QProgressBar()
+        self.cancel_button = QPushButton("Cancel")
+        self.cancel_button.clicked.connect(self.cancel)
+
+        layout = QHBoxLayout(self)
+        layout.setContentsMargins(0, 0, 0, 0)
+        layout.addWidget(self.label)
+        layout.addWidget(self.progress_bar)
+        layout.addWidget(self.cancel_button)
+        self.hide()
+
+    def track(self, worker):
+        """
+        Show the progress of a worker until it finishes, fails or is cancelled.
+
+        Parameters:
+            worker (LoaderWorker): The worker to follow.
+        """
+        self.worker = worker
+        self.label.setText("Loading")
+        # No maximum shows a busy indicator until the first file is done.
+        self.progress_bar.setRange(0, 0)
+        self.cancel_button.setEnabled(True)
+        worker.signals.progress.connect(self.update_progress)
+        worker.signals.finished.connect(self.hide)
+        worker.signals.failed.connect(self.show_error)
+        worker.signals.cancelled.connect(self.hide)
+        self.show()
+
+    def update_progress(self, done, total):
+        self.label.setText(f"Loading file {min(done + 1, total)} of {total}")
+        self.progress_bar.setRange(0, total)
+        self.progress_bar.setValue(done)
+
+    def show_error(self, message):
+        self.label.setText(f"Loading failed: {message}")
+        self.progress_bar.hide()
+        self.cancel_button.hide()
+
+    def cancel(self):
+        if self.worker is not None:
+            self.worker.cancel()
+            self.label.setText("Cancelling")
+            self.cancel_button.setEnabled(False)